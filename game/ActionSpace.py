@@ -0,0 +1,88 @@
+import numpy as np
+from GameConstants import *
+from Topology import getTopology
+
+class ActionSpace:
+  """
+  Class: ActionSpace
+  ---------------------------
+  A fixed discrete space of the actions on a board, so that policies can
+  index actions by an integer id:
+
+    id = (ACTION - 1) * numCells + cellId   for SETTLE, CITY and ROAD
+    id = len(BUILD_ACTIONS) * numCells      to pass
+
+  Action spaces are shared by every board of the same size (see
+  getActionSpace).  GameState.getLegalActionMask fills masks of this space.
+  ---------------------------
+  """
+
+  def __init__(self, size_x=6, size_y=11):
+    self.topology = getTopology(size_x, size_y)
+    self.numCells = self.topology.numCells
+    self.numActions = len(BUILD_ACTIONS) * self.numCells + 1
+    self.passAction = self.numActions - 1
+
+  def encode(self, action):
+    """
+    Method: encode
+    ---------------------------
+    Parameters:
+      action: an (ACTION, Tile) tuple, or None to pass
+    Returns: the id of the action
+    ---------------------------
+    """
+    if action == None:
+      return self.passAction
+    return (int(action[0]) - 1) * self.numCells + action[1].id
+
+  def decode(self, actionId, board):
+    """
+    Method: decode
+    ---------------------------
+    Parameters:
+      actionId: the id of an action
+      board: the Board whose tiles the action refers to
+    Returns: the (ACTION, Tile) tuple of the action, or None to pass
+    ---------------------------
+    """
+    if actionId == self.passAction:
+      return None
+    return (actionId // self.numCells + 1, board.getTileById(actionId % self.numCells))
+
+  def getActionType(self, actionId):
+    return None if actionId == self.passAction else actionId // self.numCells + 1
+
+  def getCell(self, actionId):
+    return None if actionId == self.passAction else actionId % self.numCells
+
+  def newMask(self, numMasks=None):
+    """
+    Method: newMask
+    ---------------------------
+    Parameters:
+      numMasks: an optional number of masks to stack
+    Returns: a boolean array with room for a mask of legal actions
+      ([numMasks][numActions] if numMasks is given)
+    ---------------------------
+    """
+    shape = self.numActions if numMasks is None else (numMasks, self.numActions)
+    return np.zeros(shape, dtype=bool)
+
+
+_actionSpaces = {}
+
+def getActionSpace(size_x=6, size_y=11):
+  """
+  Method: getActionSpace
+  ---------------------------
+  Parameters:
+    size_x: the number of rows of the board
+    size_y: the number of columns of the board
+  Returns: the shared ActionSpace for a board of that size
+  ---------------------------
+  """
+  key = (size_x, size_y)
+  if key not in _actionSpaces:
+    _actionSpaces[key] = ActionSpace(size_x, size_y)
+  return _actionSpaces[key]
@@ -1,8 +1,11 @@
 from Board import *
 from GameConstants import *
+from TranspositionTable import *
+from ActionSpace import getActionSpace
 from collections import Counter
-import copy
-from random import randint
+import numpy as np
+import random
+import time
 
 class DiceAgent:
   """
@@ -12,12 +15,34 @@ class DiceAgent:
   roll of the dice for resources each turn.  It generates a
   number from 1-12 with the correct probability distribution
   corresponding to rolling 2 6-sided dice.
+
+  Rolls come from the agent's own NumPy generator, which draws them
+  in blocks of bufferSize rolls, so games with the same seed roll the
+  same dice in any process.
   ---------------------
   """
 
-  def __init__(self, numDiceSides = 6):
+  def __init__(self, numDiceSides = 6, rng=None, bufferSize=256):
     self.agentType = AGENT[0]
     self.NUM_DICE_SIDES = numDiceSides
+    self.rng = rng if rng is not None else np.random.default_rng()
+    self.bufferSize = bufferSize
+    self.rolls = []
+    self.position = 0
+
+  def fillRolls(self):
+    """
+    Method: fillRolls
+    ----------------------
+    Parameters: NA
+    Returns: NA
+
+    Draws the next block of rolls.
+    ----------------------
+    """
+    dice = self.rng.integers(1, self.NUM_DICE_SIDES + 1, size=(self.bufferSize, 2))
+    self.rolls = dice.sum(axis=1).tolist()
+    self.position = 0
 
   def rollDice(self):
     """
@@ -28,7 +53,11 @@ class DiceAgent:
       roll of 2 6-sided dice
     ----------------------
     """
-    return randint(1, self.NUM_DICE_SIDES) + randint(1, self.NUM_DICE_SIDES)
+    if self.position >= len(self.rolls):
+      self.fillRolls()
+    roll = self.rolls[self.position]
+    self.position += 1
+    return roll
 
   def getRollDistribution(self):
     """
@@ -58,11 +87,35 @@ class DiceAgent:
     Parameters: NA
     Returns: a new DiceAgent object
 
-    Returns a copy of this agent (which is essentially just a new DiceAgent).
+    Returns a copy of this agent, with its own generator in the same
+    state, so the copy rolls the same dice as this agent would.
     -------------------------
     """
-    return DiceAgent()
+    rng = np.random.default_rng()
+    rng.bit_generator.state = self.rng.bit_generator.state
+    copy = DiceAgent(self.NUM_DICE_SIDES, rng, self.bufferSize)
+    copy.rolls = self.rolls
+    copy.position = self.position
+    return copy
+
+
+def getAffordabilityMask(resources):
+  """
+  Method: getAffordabilityMask
+  -------------------------
+  Parameters:
+    resources - an integer array of shape [..., NUM_RESOURCES], e.g. the
+      resources of one player, of all the players of a game ([P, 5]) or of
+      the players of many games at once ([N, P, 5])
+  Returns: a boolean array of shape [..., len(BUILD_ACTIONS)] telling which
+    build actions (SETTLE, CITY, ROAD) each of them can afford
+  -------------------------
+  """
+  return (np.asarray(resources)[..., np.newaxis, :] >= COST_MATRIX).all(axis=-1)
+
 
+# Names of the piece lists of a player, indexed by Structure
+PIECE_LISTS = ("roads", "settlements", "cities")
 
 class PlayerAgent(object):
   """
@@ -71,7 +124,7 @@ class PlayerAgent(object):
   PlayerAgent defines a generic player agent in Settlers consisting of a name,
   player index, and player stats/game-specific information like number
   of victory points, lists of all roads, settlements, and cities owned by the
-  player, and a counter of resources that the player has.
+  player, and the amount of each resource that the player has.
 
   Instance Variables:
   ---
@@ -82,7 +135,8 @@ class PlayerAgent(object):
   roads = a list of Tiles objects representing the roads a player has
   settlements = a list of Tiles objects representing the settlements a player has
   cities = a list of Tiles objects representing the cities a player has
-  resources = a Counter containing the count of each resource type (in ResourceTypes) the player has
+  resources = an integer array with the count of each resource type (in ResourceTypes) the player has
+  openingBook = an optional OpeningBook the initial placements are taken from
   ---------------------
   """
 
@@ -90,8 +144,21 @@ class PlayerAgent(object):
     self.agentType = AGENT[1]
     self.name = name
     self.agentIndex = agentIndex
-    self.victoryPoints = 0
+    self.openingBook = None
+    self.reset()
 
+  def reset(self):
+    """
+    Method: reset
+    ---------------------
+    Parameters: NA
+    Returns: NA
+
+    Clears the pieces, resources and victory points of the player so the
+    same agent can play a new game.
+    ---------------------
+    """
+    self.victoryPoints = 0
 
     # List of roads
     self.roads = []
@@ -102,8 +169,14 @@ class PlayerAgent(object):
     # List of Cities owned
     self.cities = []
 
-    # Counter of resources initialized to zero
-    self.resources = Counter({i: 0 for i in range(5)})
+    # Resources initialized to zero, one slot per resource type
+    self.resources = np.zeros(NUM_RESOURCES, dtype=np.int32)
+
+    # Zobrist hash of the resources and victory points
+    self.hash = 0
+
+    # Cells the piece lists are built from on first use (see loadPieces)
+    self.pieceCells = None
     
   def __repr__(self):
     """
@@ -120,6 +193,18 @@ class PlayerAgent(object):
     return s
 
 
+  def getAffordableMask(self):
+    """
+    Method: getAffordableMask
+    ---------------------
+    Parameters: NA
+    Returns: a boolean array with one entry per build action (in
+      BUILD_ACTIONS order: SETTLE, CITY, ROAD) telling whether or not
+      this PlayerAgent has enough resources to build it
+    ---------------------
+    """
+    return (self.resources >= COST_MATRIX).all(axis=1)
+
   def canSettle(self):
     """
     Method: canSettle
@@ -129,15 +214,7 @@ class PlayerAgent(object):
       resources to build a new settlement (based on the SETTLEMENT_COST constant)
     ---------------------
     """
-    modifiedResources = copy.deepcopy(self.resources)
-    modifiedResources.subtract(SETTLEMENT_COST)
-
-    # If any resource counts dip below 0, we don't have enough
-    for resourceType in modifiedResources:
-      if modifiedResources[resourceType] < 0:
-        return False
-
-    return True
+    return bool((self.resources >= COST_MATRIX[Actions["SETTLE"] - 1]).all())
 
   def canBuildCity(self):
     """
@@ -148,15 +225,7 @@ class PlayerAgent(object):
       resources to build a new city (based on the CITY_COST constant)
     ----------------------
     """
-    modifiedResources = copy.deepcopy(self.resources)
-    modifiedResources.subtract(CITY_COST)
-
-    # If any resource counts dip below 0, we don't have enough
-    for resourceType in modifiedResources:
-      if modifiedResources[resourceType] < 0:
-        return False
-
-    return True
+    return bool((self.resources >= COST_MATRIX[Actions["CITY"] - 1]).all())
 
   def canBuildRoad(self):
     """
@@ -167,15 +236,7 @@ class PlayerAgent(object):
       resources to build a new road (based on the ROAD_COST constant)
     ----------------------
     """
-    modifiedResources = copy.deepcopy(self.resources)
-    modifiedResources.subtract(ROAD_COST)
-
-    # If any resource counts dip below 0, we don't have enough
-    for resourceType in modifiedResources:
-      if modifiedResources[resourceType] < 0:
-        return False
-
-    return True
+    return bool((self.resources >= COST_MATRIX[Actions["ROAD"] - 1]).all())
 
   def deepCopy(self, board):
     """
@@ -189,12 +250,51 @@ class PlayerAgent(object):
     """
     newCopy = PlayerAgent(self.name, self.agentIndex)
     newCopy.victoryPoints = self.victoryPoints
-    newCopy.roads = [board.getTile(road.X, road.Y) for road in self.roads]
-    newCopy.settlements = [board.getTile(settlement.X, settlement.Y) for settlement in self.settlements]
-    newCopy.resources = copy.deepcopy(self.resources)
-    newCopy.cities = [board.getTile(city.X, city.Y) for city in self.cities]
+    if self.pieceCells is not None:
+      newCopy.loadPieces(board, self.pieceCells[1], self.pieceCells[2])
+    else:
+      newCopy.roads = [board.getTile(road.x, road.y) for road in self.roads]
+      newCopy.settlements = [board.getTile(settlement.x, settlement.y) for settlement in self.settlements]
+      newCopy.cities = [board.getTile(city.x, city.y) for city in self.cities]
+    newCopy.resources = self.resources.copy()
+    newCopy.hash = self.hash
     return newCopy
 
+  def loadPieces(self, board, structure, owner):
+    """
+    Method: loadPieces
+    ----------------------
+    Parameters:
+      board - the board the pieces are on
+      structure - an array with the Structure of every cell of the board
+      owner - an array with the player owning every cell of the board
+    Returns: NA
+
+    Replaces the roads, settlements and cities of this PlayerAgent with
+    the cells it owns, listed in cell order.  The lists are only built,
+    with np.flatnonzero, the first time one of them is used (see
+    __getattr__), so a state that is decoded only to be hashed or searched
+    from its board never builds them.  The arrays must not be changed
+    afterwards.
+    ----------------------
+    """
+    for name in PIECE_LISTS:
+      self.__dict__.pop(name, None)
+    self.pieceCells = (board, structure, owner)
+
+  def __getattr__(self, name):
+    # Only called when name isn't set: the piece lists of a PlayerAgent
+    # whose pieces were loaded but not used yet
+    pieceCells = self.__dict__.get("pieceCells")
+    if pieceCells is None or name not in PIECE_LISTS:
+      raise AttributeError(name)
+    board, structure, owner = pieceCells
+    owned = owner == self.agentIndex
+    for cellStructure, pieceList in enumerate(PIECE_LISTS):
+      setattr(self, pieceList, board.getTilesById(np.flatnonzero(owned & (structure == cellStructure)).tolist()))
+    self.pieceCells = None
+    return self.__dict__[name]
+
   def applyAction(self, action, board):
     """
     Method: applyAction
@@ -211,7 +311,7 @@ class PlayerAgent(object):
     if action == None:
       return
 
-    action[0] = int(action[0])
+    action = (int(action[0]), action[1])
     # Settling
     if action[0] == Actions["SETTLE"]:
       if not self.canSettle():
@@ -222,8 +322,8 @@ class PlayerAgent(object):
       tile = action[1]
       board.applyAction(self.agentIndex, action)
       self.settlements.append(tile)
-      self.resources.subtract(SETTLEMENT_COST)
-      self.victoryPoints += SETTLEMENT_VICTORY_POINTS
+      self.addResources(COST_MATRIX[Actions["SETTLE"] - 1], -1)
+      self.addVictoryPoints(SETTLEMENT_VICTORY_POINTS)
 
     # Building a road
     if action[0] == Actions["ROAD"]:
@@ -234,7 +334,7 @@ class PlayerAgent(object):
       road = action[1]
       board.applyAction(self.agentIndex, action)
       self.roads.append(road)
-      self.resources.subtract(ROAD_COST)
+      self.addResources(COST_MATRIX[Actions["ROAD"] - 1], -1)
 
     # Building a city
     if action[0] == Actions["CITY"]:
@@ -252,8 +352,77 @@ class PlayerAgent(object):
           break
 
       # and update victory points and resources
-      self.resources.subtract(CITY_COST)
-      self.victoryPoints += CITY_VICTORY_POINTS
+      self.addResources(COST_MATRIX[Actions["CITY"] - 1], -1)
+      self.addVictoryPoints(CITY_VICTORY_POINTS)
+
+  def undoAction(self, action, board, settlementIndex=-1):
+    """
+    Method: undoAction
+    -----------------------
+    Parameters:
+      action - the action tuple (ACTION, LOCATION) this player applied last
+      board - the Board the action was applied to
+      settlementIndex - for cities, the position the upgraded settlement
+        had in the settlements list
+    Returns: NA
+
+    Reverts applyAction: gives back the resources and victory points and
+    removes the piece from the board and from the player's lists.
+    -----------------------
+    """
+    if action == None:
+      return
+
+    action = (int(action[0]), action[1])
+    board.undoAction(self.agentIndex, action)
+
+    if action[0] == Actions["SETTLE"]:
+      self.settlements.pop()
+      self.addResources(COST_MATRIX[Actions["SETTLE"] - 1])
+      self.addVictoryPoints(-SETTLEMENT_VICTORY_POINTS)
+
+    elif action[0] == Actions["ROAD"]:
+      self.roads.pop()
+      self.addResources(COST_MATRIX[Actions["ROAD"] - 1])
+
+    elif action[0] == Actions["CITY"]:
+      tile = self.cities.pop()
+      self.settlements.insert(settlementIndex, tile)
+      self.addResources(COST_MATRIX[Actions["CITY"] - 1])
+      self.addVictoryPoints(-CITY_VICTORY_POINTS)
+
+  def addResources(self, resources, sign=1):
+    """
+    Method: addResources
+    -----------------------
+    Parameters:
+      resources - an array with the amount of each resource type
+      sign - 1 to add the resources, -1 to take them away
+    Returns: NA
+
+    Updates the player's resources and keeps the hash up to date.
+    -----------------------
+    """
+    if sign > 0:
+      self.resources += resources
+    else:
+      self.resources -= resources
+    h = self.hash
+    for key, amount in zip(RESOURCE_KEYS[self.agentIndex], resources.tolist()):
+      h += sign * amount * key
+    self.hash = h & HASH_MASK
+
+  def addVictoryPoints(self, points):
+    """
+    Method: addVictoryPoints
+    -----------------------
+    Parameters:
+      points - the victory points to add (negative to take them away)
+    Returns: NA
+    -----------------------
+    """
+    self.victoryPoints += points
+    self.hash = (self.hash + points * VICTORY_POINT_KEYS[self.agentIndex]) & HASH_MASK
 
   def printResources(self):
     """
@@ -266,9 +435,8 @@ class PlayerAgent(object):
     -----------------------
     """
     c = ""
-    for resource in self.resources:
-      if resource != -1:
-        c += value2key(ResourceTypes, resource) + ": " + str(self.resources[resource]) + " "
+    for resource in range(NUM_RESOURCES):
+      c += value2key(ResourceTypes, resource) + ": " + str(self.resources[resource]) + " "
     return c
 
   def updateResources(self, diceRoll, board):
@@ -278,17 +446,17 @@ class PlayerAgent(object):
     Parameters:
       diceRoll - the sum of the two dice Rolled
       board - a Board object representing the current board state
-    Returns: a Counter containing the number of each resource gained
+    Returns: an array containing the number of each resource gained
 
     Takes the current dice roll and board setup, and awards
     the current player resources depending on built settlements on the board.
     Returns the count of each resource that the player gained.
     -----------------------------
     """
-    newResources = board.getResourcesFromDieRoll(self.agentIndex, diceRoll)
-    for resource in newResources:
-      if resource != -1:
-        self.resources[resource] += newResources[resource]
+    if not MIN_ROLL <= diceRoll <= MAX_ROLL:
+      return np.zeros(NUM_RESOURCES, dtype=np.int32)
+    newResources = board.getProductionTable()[diceRoll - MIN_ROLL, self.agentIndex]
+    self.addResources(newResources)
     return newResources
 
 
@@ -308,6 +476,7 @@ class PlayerAgent(object):
     --------------------------------
     """
     # Get resources for each settlement
+    newResources = np.zeros(NUM_RESOURCES, dtype=np.int32)
     for settlement in self.settlements:
       # Find all tiles bordering this settlement and
       # take 1 resource of each of the surrounding tile types
@@ -315,7 +484,8 @@ class PlayerAgent(object):
       for hexagonid in tile.hexagonids:
         hexagon = board.hexagons[hexagonid]
         if hexagon.resource != -1:
-          self.resources[hexagon.resource] += 1
+          newResources[hexagon.resource] += 1
+    self.addResources(newResources)
 
 
   def hasWon(self):
@@ -342,3 +512,702 @@ class PlayerAgent(object):
     -----------------------------
     """
     raise Exception("Cannot get action for superclass - must implement getAction in PlayerAgent subclass!")
+
+  def seed(self, seed):
+    """
+    Method: seed
+    -----------------------------
+    Parameters:
+      seed - the seed for the random choices of this agent
+    Returns: NA
+
+    Called before every game so that games can be reproduced.  Agents
+    that do not make random choices ignore it.
+    -----------------------------
+    """
+    pass
+
+  def getInitialPlacement(self, state, placementIndex):
+    """
+    Method: getInitialPlacement
+    -----------------------------
+    Parameters:
+      state - a GameState object containing information about the current state of the game
+      placementIndex - which of the NUM_INITIAL_SETTLEMENTS placements this is (0-based)
+    Returns: a (SETTLEMENT_TILE, ROAD_TILE) tuple with where this player places
+      its initial settlement and road
+
+    The placements come from the opening book of the agent if it has one
+    (see OpeningBook), and from the predefined LAYOUT otherwise.
+    -----------------------------
+    """
+    if self.openingBook is not None:
+      return self.openingBook.getPlacement(state, placementIndex, self.agentIndex)
+    (settleX, settleY), (roadX, roadY) = LAYOUT[placementIndex][self.agentIndex]
+    return (state.board.getTile(settleX, settleY), state.board.getTile(roadX, roadY))
+
+
+class RandomAgent(PlayerAgent):
+  """
+  Class: RandomAgent
+  ---------------------
+  A PlayerAgent that takes one of its legal actions at random every turn.
+  ---------------------
+  """
+
+  def __init__(self, name, agentIndex, seed=None):
+    super(RandomAgent, self).__init__(name, agentIndex)
+    self.random = random.Random(seed)
+
+  def seed(self, seed):
+    self.random.seed(seed)
+
+  def getAction(self, state):
+    legalActions = state.getLegalActions(self.agentIndex)
+    if len(legalActions) == 0:
+      return None
+    return self.random.choice(legalActions)
+
+
+# Probability of every roll, indexed by ROLL - MIN_ROLL
+ROLL_PROBABILITIES = np.zeros(MAX_ROLL - MIN_ROLL + 1)
+for roll, probability in DiceAgent().getRollDistribution():
+  ROLL_PROBABILITIES[roll - MIN_ROLL] = probability
+
+class PipIndex:
+  """
+  Class: PipIndex
+  ---------------------
+  What every cell of a board is worth to settle on, computed once from
+  the numbers and resources of the hexagons around it.
+
+  Instance Variables:
+  ---
+  cellYield = an array [cell][resource] with the resources a settlement on
+    the cell is expected to receive per roll
+  resourceWeights = how much every resource is worth: the less the board
+    produces of a resource, the more it is worth (1 on average)
+  cellScores = a list with the scarcity-weighted expected yield of every cell
+  ---------------------
+  """
+
+  def __init__(self, board):
+    topology = board.topology
+    self.cellYield = np.zeros((topology.numCells, NUM_RESOURCES))
+    for cell in topology.landCells:
+      for hexagonid in topology.cellHexagons[cell]:
+        hexagon = board.hexagons[hexagonid]
+        if hexagon.resource != -1:
+          self.cellYield[cell, hexagon.resource] += ROLL_PROBABILITIES[hexagon.number - MIN_ROLL]
+
+    supply = self.cellYield.sum(axis=0)
+    weights = np.zeros(NUM_RESOURCES)
+    weights[supply > 0] = 1.0 / supply[supply > 0]
+    self.resourceWeights = weights / weights.mean()
+    self.cellScores = self.cellYield.dot(self.resourceWeights).tolist()
+    self.resourceWeightList = self.resourceWeights.tolist()
+
+
+def getPipIndex(board):
+  """
+  Method: getPipIndex
+  ---------------------
+  Parameters:
+    board - a Board (or ArrayBoard)
+  Returns: the PipIndex of the board, which is built the first time and
+    shared by the copies of the board
+  ---------------------
+  """
+  if board.pipIndex is None:
+    board.pipIndex = PipIndex(board)
+  return board.pipIndex
+
+
+# Search values lie in [-WIN_VALUE, WIN_VALUE].  Scores stay well below
+# it, and the tighter the bound the more chance nodes can be pruned
+WIN_VALUE = 20.0
+
+# Order in which the actions of a player are searched
+ACTION_ORDER = {Actions["CITY"]: 0, Actions["SETTLE"]: 1, Actions["ROAD"]: 2}
+
+
+def scorePlayer(victoryPoints, production, held, numRoads):
+  """
+  Method: scorePlayer
+  ---------------------
+  Parameters:
+    victoryPoints - the victory points of the player
+    production - the scarcity-weighted yield of its settlements and cities
+    held - the scarcity-weighted sum of the resources it holds
+    numRoads - the number of roads it has
+  Returns: the score of the player used by evaluate
+  ---------------------
+  """
+  return victoryPoints + production + 0.05 * min(held, 20.0) + 0.1 * min(numRoads, 15)
+
+
+def evaluate(state, agentIndex):
+  """
+  Method: evaluate
+  ---------------------
+  Parameters:
+    state - a GameState
+    agentIndex - the player the state is evaluated for
+  Returns: how good the state is for the player: its score minus the
+    best score of the other players, in [-WIN_VALUE, WIN_VALUE]
+
+  The score of a player is its victory points, plus the expected yield
+  of its settlements and cities (twice for cities) and small bonuses for
+  the resources it holds and its roads.  Yields and resources are
+  weighted by scarcity.  Only the pip index of the board and the
+  holdings of the players are read, so the cost grows with the number
+  of pieces and not with the size of the board.
+  ---------------------
+  """
+  index = getPipIndex(state.board)
+  cellScores = index.cellScores
+  weights = index.resourceWeightList
+  best = -WIN_VALUE
+  value = 0.0
+  for agent in state.playerAgents:
+    if agent.victoryPoints >= VICTORY_POINTS_TO_WIN:
+      return WIN_VALUE if agent.agentIndex == agentIndex else -WIN_VALUE
+    production = 0.0
+    for settlement in agent.settlements:
+      production += cellScores[settlement.id]
+    for city in agent.cities:
+      production += 2 * cellScores[city.id]
+    held = 0.0
+    for weight, amount in zip(weights, agent.resources.tolist()):
+      held += weight * amount
+    score = scorePlayer(agent.victoryPoints, production, held, len(agent.roads))
+    if agent.agentIndex == agentIndex:
+      value = score
+    elif score > best:
+      best = score
+  return max(-WIN_VALUE, min(WIN_VALUE, value - best))
+
+
+class ExpectimaxAgent(PlayerAgent):
+  """
+  Class: ExpectimaxAgent
+  ---------------------
+  A PlayerAgent that searches depth turns ahead (its own action and the
+  actions of the players after it).  Between two actions there is a
+  chance node over the dice roll of the next player, whose outcomes are
+  weighted with DiceAgent.getRollDistribution.  Rolls that produce the
+  same resources for everybody lead to the same state, so they are
+  searched once with their probabilities added up.
+
+  The other players are assumed to play against this one, which lets
+  action nodes be pruned alpha-beta style and chance nodes be pruned
+  with the bounds of the evaluation (Star1).  Actions are searched city
+  first, then settlements, roads and passing, after the best action
+  found for the state in the transposition table.  The last roll and
+  action of the search are worked out together from the scores of the
+  players, without applying any move (see searchLastRoll).
+
+  The search deepens one turn at a time.  The first depth turns are
+  always searched to the end; deeper searches, up to maxDepth turns, go
+  on while the decision has taken less than timeLimit seconds, keeping
+  the action of the deepest search finished.
+  ---------------------
+  """
+
+  def __init__(self, name, agentIndex, depth=DEPTH, maxDepth=None, timeLimit=0.05, tableBits=16):
+    self.depth = depth
+    self.maxDepth = depth if maxDepth is None else maxDepth
+    self.timeLimit = timeLimit
+    self.table = TranspositionTable(tableBits)
+    super(ExpectimaxAgent, self).__init__(name, agentIndex)
+
+  def reset(self):
+    super(ExpectimaxAgent, self).reset()
+    # Hashes don't include the board layout, so they can't be shared between games
+    self.table.clear()
+
+  def evaluate(self, state):
+    return evaluate(state, self.agentIndex)
+
+  def encodeMove(self, state, action):
+    return getActionSpace(state.board.size_x, state.board.size_y).encode(action)
+
+  def orderActions(self, state, agentIndex, tableMove):
+    """
+    Method: orderActions
+    ---------------------
+    Parameters:
+      state - a GameState
+      agentIndex - the player to move
+      tableMove - the encoded best move stored for the state, or -1
+    Returns: the legal actions of the player and passing (None), in the
+      order they should be searched
+    ---------------------
+    """
+    actions = state.getLegalActions(agentIndex)
+    actions.sort(key=lambda action: ACTION_ORDER[int(action[0])])
+    actions.append(None)
+    if tableMove >= 0:
+      for i, action in enumerate(actions):
+        if self.encodeMove(state, action) == tableMove:
+          actions.insert(0, actions.pop(i))
+          break
+    return actions
+
+  def searchAction(self, state, depth, alpha, beta):
+    """
+    Method: searchAction
+    ---------------------
+    Parameters:
+      state - the GameState, with the player to move about to act
+      depth - the number of actions left to search
+      alpha, beta - the window of values that matter to the caller
+    Returns: a (VALUE, ACTION) tuple with the value of the state and the
+      best action found for the player to move
+    ---------------------
+    """
+    self.nodes += 1
+    if self.deadline is not None and time.perf_counter() > self.deadline:
+      self.outOfBudget = True
+      return (0.0, None)
+    if depth == 0 or state.gameOver() >= 0:
+      return (self.evaluate(state), None)
+    if depth == 1:
+      return self.searchLastAction(state, alpha, beta)
+
+    key = state.getHash()
+    entry = self.table.probe(key)
+    tableMove = -1
+    if entry is not None:
+      value, storedDepth, bound, tableMove = entry
+      # The root always searches its actions, so it has one to return
+      if storedDepth >= depth and depth < self.searchDepth:
+        if bound == BoundTypes["EXACT"] or \
+           (bound == BoundTypes["LOWER"] and value >= beta) or \
+           (bound == BoundTypes["UPPER"] and value <= alpha):
+          return (value, None)
+
+    agentIndex = state.currentAgentIndex
+    maximizing = agentIndex == self.agentIndex
+    alphaOriginal, betaOriginal = alpha, beta
+    bestValue = -WIN_VALUE - 1 if maximizing else WIN_VALUE + 1
+    bestAction = None
+    for action in self.orderActions(state, agentIndex, tableMove):
+      record = state.makeMove(agentIndex, action)
+      value = self.searchRoll(state, depth - 1, alpha, beta)
+      state.unmakeMove(record)
+      if self.outOfBudget:
+        return (0.0, None)
+
+      if maximizing:
+        if value > bestValue:
+          bestValue, bestAction = value, action
+          alpha = max(alpha, value)
+      elif value < bestValue:
+        bestValue, bestAction = value, action
+        beta = min(beta, value)
+      if alpha >= beta:
+        break
+
+    if bestValue <= alphaOriginal:
+      bound = BoundTypes["UPPER"]
+    elif bestValue >= betaOriginal:
+      bound = BoundTypes["LOWER"]
+    else:
+      bound = BoundTypes["EXACT"]
+    self.table.store(key, depth, bestValue, bound, self.encodeMove(state, bestAction))
+    return (bestValue, bestAction)
+
+  def searchLastAction(self, state, alpha, beta):
+    """
+    Method: searchLastAction
+    ---------------------
+    Parameters:
+      state - the GameState, with the player to move about to act
+      alpha, beta - the window of values that matter to the caller
+    Returns: a (VALUE, ACTION) tuple like searchAction, for the last
+      action of the search
+
+    Every action is evaluated right away; these nodes are too cheap to
+    go through the transposition table.  evaluate doesn't look at where
+    the roads are, so a single road is evaluated, and a player that can
+    only pass leaves the value of the state as it is.
+    ---------------------
+    """
+    agentIndex = state.currentAgentIndex
+    actions = self.orderActions(state, agentIndex, -1)
+    if len(actions) == 1:
+      return (self.evaluate(state), None)
+
+    maximizing = agentIndex == self.agentIndex
+    bestValue = -WIN_VALUE - 1 if maximizing else WIN_VALUE + 1
+    bestAction = None
+    roadSearched = False
+    for action in actions:
+      if action != None and action[0] == Actions["ROAD"]:
+        if roadSearched:
+          continue
+        roadSearched = True
+      self.nodes += 1
+      record = state.makeMove(agentIndex, action)
+      value = self.evaluate(state)
+      state.unmakeMove(record)
+
+      if maximizing:
+        if value > bestValue:
+          bestValue, bestAction = value, action
+          if value >= beta:
+            break
+      elif value < bestValue:
+        bestValue, bestAction = value, action
+        if value <= alpha:
+          break
+    return (bestValue, bestAction)
+
+  def searchRoll(self, state, depth, alpha, beta):
+    """
+    Method: searchRoll
+    ---------------------
+    Parameters:
+      state - the GameState, with the player to move about to roll the dice
+      depth - the number of actions left to search
+      alpha, beta - the window of values that matter to the caller
+    Returns: the expected value of the state over the dice roll
+    ---------------------
+    """
+    if depth == 0 or state.gameOver() >= 0:
+      self.nodes += 1
+      return self.evaluate(state)
+    if depth == 1:
+      return self.searchLastRoll(state)
+
+    # Rolls with the same production lead to the same state.  Every
+    # outcome keeps the rows of the players that receive something
+    production = state.board.getProductionTable()
+    outcomes = {}
+    for rollIndex, probability in enumerate(ROLL_PROBABILITIES):
+      key = production[rollIndex].tobytes()
+      if key in outcomes:
+        outcomes[key][0] += probability
+      else:
+        gained = production[rollIndex]
+        receivers = [(agent, gained[agent.agentIndex]) for agent in state.playerAgents
+                     if key[agent.agentIndex * NUM_RESOURCES:(agent.agentIndex + 1) * NUM_RESOURCES].strip(b"\0")]
+        outcomes[key] = [probability, receivers]
+
+    # Star1: stop as soon as the expected value is known to be outside the
+    # window.  Likely outcomes go first, as they narrow the window the most
+    expected = 0.0
+    remaining = 1.0
+    for probability, receivers in sorted(outcomes.values(), key=lambda outcome: -outcome[0]):
+      remaining -= probability
+      childAlpha = max(-WIN_VALUE, (alpha - expected - remaining * WIN_VALUE) / probability)
+      childBeta = min(WIN_VALUE, (beta - expected + remaining * WIN_VALUE) / probability)
+
+      for agent, gained in receivers:
+        agent.addResources(gained)
+      value = self.searchAction(state, depth, childAlpha, childBeta)[0]
+      for agent, gained in receivers:
+        agent.addResources(gained, -1)
+      if self.outOfBudget:
+        return 0.0
+
+      expected += probability * value
+      if expected - remaining * WIN_VALUE >= beta:
+        return expected - remaining * WIN_VALUE
+      if expected + remaining * WIN_VALUE <= alpha:
+        return expected + remaining * WIN_VALUE
+    return expected
+
+  def getRollOutcomes(self, board):
+    """
+    Method: getRollOutcomes
+    ---------------------
+    Parameters:
+      board - the Board of the searched state
+    Returns: a list with the (PROBABILITY, RECEIVERS, GAINED) of every
+      distinct outcome of the dice: RECEIVERS has the (PLAYER,
+      WEIGHTED_GAIN) of the players that receive something, weighted by
+      scarcity, and GAINED the resources of every player
+
+    Rolls with the same production are merged.  Outcomes only depend on
+    the production table, which roads don't change, so they are kept by
+    table for the rest of the search.
+    ---------------------
+    """
+    table = board.getProductionTable()
+    key = table.tobytes()
+    outcomes = self.rollOutcomes.get(key)
+    if outcomes is not None:
+      return outcomes
+
+    rows = table.tolist()
+    gainedHelds = table.dot(getPipIndex(board).resourceWeights).tolist()
+    merged = {}
+    for rollIndex, probability in enumerate(ROLL_PROBABILITIES):
+      rowKey = table[rollIndex].tobytes()
+      if rowKey in merged:
+        merged[rowKey][0] += probability
+      else:
+        merged[rowKey] = [probability, rollIndex]
+
+    outcomes = []
+    for probability, rollIndex in merged.values():
+      gained = rows[rollIndex]
+      receivers = [(player, gainedHelds[rollIndex][player]) for player, playerGained in enumerate(gained) if any(playerGained)]
+      outcomes.append((probability, receivers, gained))
+    self.rollOutcomes[key] = outcomes
+    return outcomes
+
+  def getLastBuilds(self, state, agentIndex):
+    """
+    Method: getLastBuilds
+    ---------------------
+    Parameters:
+      state - the searched GameState
+      agentIndex - the player to move
+    Returns: a (PRODUCTIONS, BUILDS, KEY) tuple with the scarcity-weighted
+      yield of the settlements and cities of every player, the (COST,
+      WEIGHTED_COST, VICTORY_POINTS, PRODUCTION, ROADS) of the best city,
+      settlement and road the player could build, whatever they cost, and
+      a key with what the value of the state depends on in both
+
+    Both only depend on the pieces on the board, so they are kept by
+    board hash for the rest of the search.
+    ---------------------
+    """
+    key = (state.board.hash, agentIndex)
+    entry = self.lastBuilds.get(key)
+    if entry is not None:
+      return entry
+
+    index = getPipIndex(state.board)
+    cellScores = index.cellScores
+    weights = index.resourceWeightList
+    productions = []
+    for agent in state.playerAgents:
+      production = 0.0
+      for settlement in agent.settlements:
+        production += cellScores[settlement.id]
+      for city in agent.cities:
+        production += 2 * cellScores[city.id]
+      productions.append(production)
+
+    canRoad = False
+    bestSettlement = None
+    bestCity = None
+    for action, tile in state.getBuildableActions(agentIndex):
+      if action == Actions["ROAD"]:
+        canRoad = True
+      elif action == Actions["SETTLE"]:
+        if bestSettlement is None or cellScores[tile.id] > bestSettlement:
+          bestSettlement = cellScores[tile.id]
+      elif bestCity is None or cellScores[tile.id] > bestCity:
+        bestCity = cellScores[tile.id]
+
+    builds = []
+    for action, points, production, roads in ((Actions["CITY"], CITY_VICTORY_POINTS, bestCity, 0),
+                                              (Actions["SETTLE"], SETTLEMENT_VICTORY_POINTS, bestSettlement, 0),
+                                              (Actions["ROAD"], 0, 0.0 if canRoad else None, 1)):
+      if production is not None:
+        cost = COST_MATRIX[action - 1].tolist()
+        builds.append((cost, sum(weight * amount for weight, amount in zip(weights, cost)), points, production, roads))
+
+    entry = (productions, builds, (tuple(productions),) + tuple(build[2:] for build in builds))
+    self.lastBuilds[key] = entry
+    return entry
+
+  def searchLastRoll(self, state):
+    """
+    Method: searchLastRoll
+    ---------------------
+    Parameters:
+      state - the GameState, with the player to move about to roll the
+        dice before the last action of the search
+    Returns: the expected value of the state over the dice roll, as
+      searchRoll and searchLastAction would find it
+
+    A build only changes the score of the player making it (see
+    scorePlayer), so the best last action is the one that scores highest
+    for the player to move, whether it is this player or an opponent: a
+    win, or the best of passing, a road, a settlement on its best free
+    cell and a city on its best settlement that it can afford.  The
+    locations don't depend on the roll, so every roll is worked out from
+    the scores of the players without applying any move.  The values are
+    those of the module's evaluate.
+    ---------------------
+    """
+    agentIndex = state.currentAgentIndex
+    agents = state.playerAgents
+    board = state.board
+    weights = getPipIndex(board).resourceWeightList
+    productions, builds, buildKey = self.getLastBuilds(state, agentIndex)
+    holdings = [agent.resources.tolist() for agent in agents]
+    outcomes = self.getRollOutcomes(board)
+    self.nodes += len(outcomes)
+
+    # States that differ in where the roads are but not in what the player
+    # to move can build (e.g. after a road of the previous player) have the
+    # same value
+    key = (board.getProductionTable().tobytes(), agentIndex, buildKey,
+           tuple((agent.victoryPoints, len(agent.roads)) for agent in agents), tuple(map(tuple, holdings)))
+    value = self.lastRolls.get(key)
+    if value is not None:
+      return value
+
+    # Score terms of every player, as evaluate finds them.  Only the held
+    # resources change with the roll, so the rest is added up once in the
+    # order of scorePlayer
+    helds = []
+    fixedScores = []
+    roadScores = []
+    baseScores = []
+    for agent, production, holding in zip(agents, productions, holdings):
+      held = 0.0
+      for weight, amount in zip(weights, holding):
+        held += weight * amount
+      helds.append(held)
+      fixedScores.append(agent.victoryPoints + production)
+      roadScores.append(0.1 * min(len(agent.roads), 15))
+      baseScores.append(scorePlayer(agent.victoryPoints, production, held, len(agent.roads)))
+    mover = agents[agentIndex]
+    victoryPoints, production, held, numRoads = mover.victoryPoints, productions[agentIndex], helds[agentIndex], len(mover.roads)
+    resources = holdings[agentIndex]
+
+    # The (RESOURCE, AMOUNT) the player to move is short of for every build
+    checks = []
+    for build in builds:
+      checks.append((build, [(resource, cost - amount) for resource, (cost, amount) in enumerate(zip(build[0], resources))
+                             if cost > amount]))
+
+    others = [other for other in range(len(agents)) if other != self.agentIndex]
+    expected = 0.0
+    for probability, receivers, gained in outcomes:
+      scores = list(baseScores)
+      heldAfterRoll = held
+      for receiver, gainedHeld in receivers:
+        scores[receiver] = fixedScores[receiver] + 0.05 * min(helds[receiver] + gainedHeld, 20.0) + roadScores[receiver]
+        if receiver == agentIndex:
+          heldAfterRoll += gainedHeld
+
+      # The best last action of the player to move
+      won = False
+      moverGained = gained[agentIndex]
+      for build, short in checks:
+        for resource, amount in short:
+          if moverGained[resource] < amount:
+            break
+        else:
+          cost, weightedCost, points, buildProduction, roads = build
+          if victoryPoints + points >= VICTORY_POINTS_TO_WIN:
+            won = True
+            break
+          score = scorePlayer(victoryPoints + points, production + buildProduction, heldAfterRoll - weightedCost,
+                              numRoads + roads)
+          if score > scores[agentIndex]:
+            scores[agentIndex] = score
+
+      if won:
+        value = WIN_VALUE if agentIndex == self.agentIndex else -WIN_VALUE
+      else:
+        best = -WIN_VALUE
+        for other in others:
+          if scores[other] > best:
+            best = scores[other]
+        value = max(-WIN_VALUE, min(WIN_VALUE, scores[self.agentIndex] - best))
+      expected += probability * value
+    self.lastRolls[key] = expected
+    return expected
+
+  def getAction(self, state):
+    """
+    Method: getAction
+    ---------------------
+    Parameters:
+      state - a GameState object containing information about the current state of the game
+    Returns: the action found by the deepest search finished
+
+    Searches a copy of the state, walking it with makeMove/unmakeMove.
+    The searches up to depth always finish; deeper ones are given up once
+    the decision has taken timeLimit seconds.
+    ---------------------
+    """
+    if state.currentAgentIndex != self.agentIndex:
+      raise Exception("getAction - it is the turn of player " + str(state.currentAgentIndex) + ", not of player " +
+                      str(self.agentIndex) + "!")
+    deadline = time.perf_counter() + self.timeLimit
+    self.deadline = None
+    self.nodes = 0
+    self.completedDepth = 0
+    self.outOfBudget = False
+    if len(state.getLegalActions(self.agentIndex)) == 0:
+      return None
+
+    searchState = state.deepCopy()
+    self.table.newSearch()
+    self.rollOutcomes = {}
+    self.lastBuilds = {}
+    self.lastRolls = {}
+    bestAction = self.orderActions(searchState, self.agentIndex, -1)[0]
+    for depth in range(1, self.maxDepth + 1):
+      if depth > self.depth:
+        if time.perf_counter() >= deadline:
+          break
+        self.deadline = deadline
+      self.searchDepth = depth
+      value, action = self.searchAction(searchState, depth, -WIN_VALUE, WIN_VALUE)
+      if self.outOfBudget:
+        break
+      bestAction = action
+      self.completedDepth = depth
+
+    # The action found refers to the tiles of the copy
+    if bestAction == None:
+      return None
+    return (bestAction[0], state.board.getTileById(bestAction[1].id))
+
+
+class HumanAgent(PlayerAgent):
+  """
+  Class: HumanAgent
+  ---------------------
+  A PlayerAgent controlled from the terminal.  Every turn it shows the
+  board and the legal actions, and asks for the action to take.
+  ---------------------
+  """
+
+  def getAction(self, state):
+    legalActions = state.getLegalActions(self.agentIndex)
+    if len(legalActions) == 0:
+      print("No legal actions for " + str(self.name) + ". Skipping turn.")
+      return None
+
+    print("LEGAL ACTIONS:")
+    for action in legalActions:
+      print(value2key(Actions, action[0]) + " at (" + str(action[1].x) + ", " + str(action[1].y) + ")")
+    state.board.printBoard()
+
+    while True:
+      a = input("Enter your action: \n 'SETTLE': 1 \n 'CITY': 2 \n 'ROAD': 3 \n 'TRADE': 4 \n")
+      x = input("Enter x: ")
+      y = input("Enter y: ")
+      for action in legalActions:
+        if action[0] == int(a) and action[1].x == int(x) and action[1].y == int(y):
+          return action
+      print("That action is not legal, try again.")
+
+  def getInitialPlacement(self, state, placementIndex):
+    if LAYOUT_n != 0:
+      return super(HumanAgent, self).getInitialPlacement(state, placementIndex)
+
+    print("It's " + str(self.name) + "'s turn!. Where do you want to place your settlement? \n")
+    state.board.printBoard()
+    x = input("Enter x: ")
+    y = input("Enter y: ")
+    settlement = state.board.getTile(int(x), int(y))
+
+    print("Where do you want to place your road?")
+    state.board.printBoard()
+    x = input("Enter x: ")
+    y = input("Enter y: ")
+    return (settlement, state.board.getTile(int(x), int(y)))
@@ -0,0 +1,400 @@
+import numpy as np
+from Board import *
+
+# Number of layouts whose hexagons ArrayBoard.fromLayout keeps
+MAX_CACHED_LAYOUTS = 256
+
+# Resources a cell gets from every hexagon around it, indexed by Structure
+STRUCTURE_PRODUCTION = np.array([0, 1, 2, 0])
+
+class TileView(Tile):
+  """
+  Class: TileView
+  ---------------------------
+  A TileView is a light Tile that does not hold any state of its own.
+  Its structure and player are read from and written to the arrays of
+  the ArrayBoard it belongs to, so every Tile method (settle, upgrade,
+  buildRoad, strRepresentation...) works on it unchanged.
+  ---------------------------
+  """
+
+  # x, y and id are slots of Tile, structure, player and hexagonids are
+  # properties over the arrays of the board
+  __slots__ = ("arrayBoard",)
+
+  def __init__(self, arrayBoard, id):
+    self.arrayBoard = arrayBoard
+    self.id = id
+    self.x, self.y = arrayBoard.topology.cellCoordinates[id]
+
+  @property
+  def structure(self):
+    return int(self.arrayBoard.structure[self.id])
+
+  @structure.setter
+  def structure(self, structure):
+    self.arrayBoard.structure[self.id] = structure
+
+  @property
+  def player(self):
+    owner = int(self.arrayBoard.owner[self.id])
+    return None if owner < 0 else owner
+
+  @player.setter
+  def player(self, playerIndex):
+    self.arrayBoard.owner[self.id] = -1 if playerIndex is None else playerIndex
+
+  @property
+  def hexagonids(self):
+    return self.arrayBoard.topology.cellHexagons[self.id]
+
+  def isWater(self):
+    return self.arrayBoard.topology.waterMask[self.id]
+
+  def __reduce__(self):
+    # Pickled as a lookup on its board: restoring the slots would write
+    # through the properties before the planes of the board exist
+    return (ArrayBoard.getTileById, (self.arrayBoard, self.id))
+
+
+class ArrayBoard(Board):
+  """
+  Class: ArrayBoard
+  ---------------------------
+  An ArrayBoard is a Board whose state is stored in a single int8 buffer
+  with two planes indexed by cell id: the structure built on every cell
+  and the player that owns it (-1 if nobody).  The resource and number
+  of every hexagon are kept as arrays as well, and the hexagons and the
+  topology are shared with every copy of the board.
+
+  Tiles are handed out as TileViews over the buffer, so the rest of the
+  game (PlayerAgent, GameState) can use an ArrayBoard as any other Board.
+  Copying an ArrayBoard copies a single buffer holding the cells and
+  the production table.
+  ---------------------------
+  """
+
+  def __init__(self, size_x=6, size_y=11, hexagons=None, rng=None):
+    self.size_x = size_x
+    self.size_y = size_y
+    self.topology = getTopology(size_x, size_y)
+
+    # Hexagons never change during a game, so they can be shared
+    if hexagons is None:
+      hexagons = createHexagons(rng)
+    self.hexagons = hexagons
+    self.hexResources = np.array([hexagon.resource for hexagon in hexagons], dtype=np.int8)
+    self.hexNumbers = np.array([hexagon.number for hexagon in hexagons], dtype=np.int8)
+
+    self._newBuffer()
+    self.hash = 0
+    self.pipIndex = None
+    self.productionMatrix = None
+
+
+  _layouts = {}
+
+  """
+  Method: fromLayout
+  ---------------------------
+  Parameters:
+    size_x, size_y: the size of the board
+    resources: the resource of every hexagon, by id
+    numbers: the number of every hexagon, by id
+  Returns: a new empty ArrayBoard with that layout
+
+  The hexagons (and production matrix) of the last MAX_CACHED_LAYOUTS
+  layouts are kept and shared by the boards built from them, as copies of a board share
+  them, so decoding many states of the same game builds them once.
+  ---------------------------
+  """
+  @classmethod
+  def fromLayout(cls, size_x, size_y, resources, numbers):
+    key = (size_x, size_y, tuple(resources), tuple(numbers))
+    shared = cls._layouts.get(key)
+    if shared is None:
+      if len(cls._layouts) >= MAX_CACHED_LAYOUTS:
+        cls._layouts.clear()
+      board = cls(size_x, size_y, [Hexagon(resources[i], numbers[i], i) for i in range(len(resources))])
+      cls._layouts[key] = (board.hexagons, board.hexResources, board.hexNumbers, board.getProductionMatrix())
+      return board
+
+    board = cls.__new__(cls)
+    board.size_x = size_x
+    board.size_y = size_y
+    board.topology = getTopology(size_x, size_y)
+    board.hexagons, board.hexResources, board.hexNumbers, board.productionMatrix = shared
+    board._newBuffer()
+    board.hash = 0
+    board.pipIndex = None
+    return board
+
+
+  def _newBuffer(self):
+    # Structure and owner planes followed by the production table
+    numCells = self.topology.numCells
+    self.buffer = np.zeros(2 * numCells + (MAX_ROLL - MIN_ROLL + 1) * MAX_PLAYERS * NUM_RESOURCES, dtype=np.int8)
+    self._bindPlanes()
+    self.structure[:] = Structure["NONE"]
+    self.owner[:] = -1
+
+
+  """
+  Method: _bindPlanes
+  ---------------------------
+  Parameters: NA
+  Returns: NA
+
+  Points the structure and owner planes and the production table to the
+  current buffer and drops the views of the tiles built over the previous one.
+  ---------------------------
+  """
+  def _bindPlanes(self):
+    numCells = self.topology.numCells
+    self.cells = self.buffer[:2 * numCells].reshape(2, numCells)
+    self.structure = self.cells[0]
+    self.owner = self.cells[1]
+    self.production = self.buffer[2 * numCells:].reshape(MAX_ROLL - MIN_ROLL + 1, MAX_PLAYERS, NUM_RESOURCES)
+    self._views = [None] * numCells
+    self._allViews = False
+
+
+  """
+  Method: __getstate__
+  ---------------------------
+  Parameters: NA
+  Returns: the attributes to pickle
+
+  The planes, the production table and the views are views over the
+  buffer, so only the buffer is pickled and __setstate__ binds them again.
+  ---------------------------
+  """
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    for name in ("cells", "structure", "owner", "production", "_views", "_allViews"):
+      del state[name]
+    return state
+
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._bindPlanes()
+
+
+  """
+  Method: getTileById
+  ---------------------------
+  Parameters:
+    cell: the id of the cell
+  Returns: the TileView over that cell
+
+  Views are built the first time a cell is requested and reused after that.
+  ---------------------------
+  """
+  def getTileById(self, cell):
+    view = self._views[cell]
+    if view is None:
+      view = TileView(self, cell)
+      self._views[cell] = view
+    return view
+
+
+  def getTilesById(self, cells):
+    views = self._views
+    tiles = []
+    for cell in cells:
+      view = views[cell]
+      if view is None:
+        view = views[cell] = TileView(self, cell)
+      tiles.append(view)
+    return tiles
+
+
+  def getTile(self, x, y):
+    if 0 <= x < self.size_x and 0 <= y < self.size_y:
+      return self.getTileById(x * self.size_y + y)
+    return None
+
+
+  """
+  Method: tiles
+  ---------------------------
+  The TileViews of every cell, by id, as in Board.  The first access
+  builds the views that weren't requested yet, later ones return the
+  same list, so the list must not be modified.  Use getTileById to get a
+  single tile.
+  ---------------------------
+  """
+  @property
+  def tiles(self):
+    if not self._allViews:
+      for cell in range(self.topology.numCells):
+        self.getTileById(cell)
+      self._allViews = True
+    return self._views
+
+
+  @property
+  def board(self):
+    tiles = self.tiles
+    return [tiles[x * self.size_y:(x + 1) * self.size_y] for x in range(self.size_x)]
+
+
+  @property
+  def settlements(self):
+    occupied = np.flatnonzero((self.structure == Structure["SETTLEMENT"]) | (self.structure == Structure["CITY"]))
+    return [self.getTileById(int(cell)) for cell in occupied]
+
+
+  @property
+  def roads(self):
+    return [self.getTileById(int(cell)) for cell in np.flatnonzero(self.structure == Structure["ROAD"])]
+
+
+  """
+  Method: deepCopy
+  ---------------------------
+  Parameters: NA
+  Returns: a copy of this board
+
+  The copy shares the topology and the hexagons with this board and
+  only duplicates the buffer with the cells and the production table.
+  ---------------------------
+  """
+  def deepCopy(self):
+    copy = ArrayBoard.__new__(ArrayBoard)
+    copy.size_x = self.size_x
+    copy.size_y = self.size_y
+    copy.topology = self.topology
+    copy.hexagons = self.hexagons
+    copy.hexResources = self.hexResources
+    copy.hexNumbers = self.hexNumbers
+    copy.buffer = self.buffer.copy()
+    copy._bindPlanes()
+    copy.hash = self.hash
+    copy.pipIndex = self.pipIndex
+    copy.productionMatrix = self.productionMatrix
+    return copy
+
+
+  def applyAction(self, playerIndex, action):
+    if action == None: return
+    tile = self.getTileById(action[1].id)
+
+    if action[0] == Actions["SETTLE"]:
+      tile.settle(playerIndex)
+      self.addProduction(tile, playerIndex)
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["SETTLEMENT"]][playerIndex]
+    elif action[0] == Actions["ROAD"]:
+      tile.buildRoad(playerIndex)
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["ROAD"]][playerIndex]
+    elif action[0] == Actions["CITY"]:
+      tile.upgrade(playerIndex)
+      self.addProduction(tile, playerIndex)
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["SETTLEMENT"]][playerIndex] ^ STRUCTURE_KEYS[tile.id][Structure["CITY"]][playerIndex]
+
+
+  def getCells(self):
+    return self.structure.tolist(), self.owner.tolist()
+
+
+  """
+  Method: loadCells
+  ---------------------------
+  Parameters:
+    structure: the Structure of every cell
+    owner: the index of the player owning every cell (ignored for cells
+      with no structure)
+    production: the production table of the board with those cells, if
+      it is known
+    boardHash: the hash of the board with those cells, if it is known
+  Returns: NA
+
+  Copies the cells into the planes.  The hash and the production table
+  are copied as well when they are given, and are built otherwise with
+  array operations, without building any TileViews or walking the cells
+  in Python.  The board must be empty.
+  ---------------------------
+  """
+  def loadCells(self, structure, owner, production=None, boardHash=None):
+    structure = np.asarray(structure, dtype=np.int8)
+    self.structure[:] = structure
+    self.owner[:] = owner
+    self.owner[structure == Structure["NONE"]] = -1
+    # Empty cells have zero keys and produce nothing
+    if boardHash is None or production is None:
+      cellIds = np.arange(self.topology.numCells)
+    if boardHash is None:
+      boardHash = int(np.bitwise_xor.reduce(STRUCTURE_KEY_ARRAY[cellIds, structure, self.owner]))
+    if production is None:
+      amounts = np.zeros((MAX_PLAYERS, len(cellIds)))
+      amounts[self.owner, cellIds] = STRUCTURE_PRODUCTION[structure]
+      production = amounts.dot(self.getProductionMatrix()).reshape(MAX_PLAYERS, MAX_ROLL - MIN_ROLL + 1, NUM_RESOURCES)
+      production = production.transpose(1, 0, 2)
+    self.hash ^= boardHash
+    self.production[:] = production
+
+
+  """
+  Method: getProductionMatrix
+  ---------------------------
+  Parameters: NA
+  Returns: an array with, for every cell, the resources a settlement on
+    the cell gets on every roll, as a flattened [roll][resource] row
+
+  Built once per layout and shared like the hexagons.
+  ---------------------------
+  """
+  def getProductionMatrix(self):
+    if self.productionMatrix is None:
+      matrix = np.zeros((self.topology.numCells, (MAX_ROLL - MIN_ROLL + 1) * NUM_RESOURCES))
+      for cell, hexagonids in enumerate(self.topology.cellHexagons):
+        for hexagonid in hexagonids:
+          hexagon = self.hexagons[hexagonid]
+          if hexagon.resource != -1:
+            matrix[cell, (hexagon.number - MIN_ROLL) * NUM_RESOURCES + hexagon.resource] += 1
+      self.productionMatrix = matrix
+    return self.productionMatrix
+
+
+  def undoAction(self, playerIndex, action):
+    if action == None: return
+    tile = self.getTileById(action[1].id)
+
+    if action[0] == Actions["SETTLE"] or action[0] == Actions["ROAD"]:
+      if action[0] == Actions["SETTLE"]:
+        self.addProduction(tile, playerIndex, -1)
+      self.hash ^= STRUCTURE_KEYS[tile.id][tile.structure][playerIndex]
+      tile.player = None
+      tile.structure = Structure["NONE"]
+    elif action[0] == Actions["CITY"]:
+      self.addProduction(tile, playerIndex, -1)
+      tile.structure = Structure["SETTLEMENT"]
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["SETTLEMENT"]][playerIndex] ^ STRUCTURE_KEYS[tile.id][Structure["CITY"]][playerIndex]
+
+
+  def getNeighborTiles(self, tile, diagonals=False):
+    return [self.getTileById(cell) for cell in self.topology.getNeighbors(tile.id, diagonals)]
+
+
+  def getUnoccupiedNeighbors(self, tile, diagonals=True):
+    structure = self.structure
+    return [self.getTileById(cell) for cell in self.topology.getNeighbors(tile.id, diagonals) if structure[cell] == Structure["NONE"]]
+
+
+  def getOccupiedNeighbors(self, tile, diagonals=True):
+    structure = self.structure
+    return [self.getTileById(cell) for cell in self.topology.getNeighbors(tile.id, diagonals) if structure[cell] != Structure["NONE"]]
+
+
+  def isValidSettlementLocation(self, tile):
+    structure = self.structure
+    neighbors = self.topology.orthogonalNeighbors
+    for cell in neighbors[tile.id]:
+      if structure[cell] == Structure["NONE"]: continue
+      if structure[cell] == Structure["SETTLEMENT"]:
+        return False
+      for cell2 in neighbors[cell]:
+        if structure[cell2] == Structure["SETTLEMENT"]:
+          return False
+    return True
@@ -1,5 +1,7 @@
-import random
+import numpy as np
 from GameConstants import *
+from Topology import *
+from Zobrist import *
 
 class Hexagon:
 
@@ -32,10 +34,13 @@ class Tile:
   ---------------------------
   """
 
+  # Boards hold a Tile per cell, so tiles don't carry an instance dict
+  __slots__ = ("x", "y", "id", "player", "structure", "hexagonids")
 
-  def __init__(self, x, y):
+  def __init__(self, x, y, id=None):
     self.x = x
     self.y = y
+    self.id = id
     self.player = None
     self.structure = Structure["NONE"] # Settlement, vertical road, or horizontal road
     self.hexagonids = []
@@ -135,8 +140,7 @@ class Tile:
   
 
   def isWater(self):
-    if (self.x == 0 and self.y == 0) or (self.x == 0 and self.y == 1) or (self.x == 1 and self.y == 0) or (self.x == 4 and self.y == 0) or (self.x == 5 and self.y == 1) or (self.x == 5 and self.y == 0) or (self.x == 0 and self.y == 9) or (self.x == 0 and self.y == 10) or (self.x == 1 and self.y == 10) or (self.x == 4 and self.y == 10) or (self.x == 5 and self.y == 9) or (self.x == 5 and self.y == 10): return True
-    return False
+    return (self.x, self.y) in WATER_TILES
 
 
   """
@@ -164,6 +168,42 @@ class Tile:
     raise Exception("strRepresentation - invalid tile")
   
 
+def createHexagons(rng=None):
+  """
+  Method: createHexagons
+  ---------------------------
+  Parameters:
+    rng: an optional NumPy Generator the board is shuffled with (an
+      unseeded one by default)
+  Returns: a list of the 19 Hexagons of a new board
+
+  Shuffles the resources and numbers of the hexagons.  The desert is
+  always the hexagon in the middle of the board.
+  ---------------------------
+  """
+  if rng is None:
+    rng = np.random.default_rng()
+
+  possibleResources = [4,4,4,4,1,1,1,1,3,3,3,3,2,2,2,0,0,0] 
+  rng.shuffle(possibleResources)
+
+  possiblenumbers = [2,3,3,4,4,5,5,5,6,6,8,8,9,9,10,10,11,11,12]
+  rng.shuffle(possiblenumbers)
+
+  hexagons = []
+
+  for i in range (19):
+    if i == 9:
+      hexagon = Hexagon(-1, 7, 9)
+    elif i == 18:
+      hexagon = Hexagon(possibleResources[9], possiblenumbers[9], 18)
+    else:
+      hexagon = Hexagon(possibleResources[i], possiblenumbers[i], i)
+    hexagons.append(hexagon)
+
+  return hexagons
+
+
 class Board:
   """
   Class: BasicBoard
@@ -176,63 +216,74 @@ class Board:
   ---------------------------
   """
 
-  def __init__(self, size_x=6, size_y=11):
+  def __init__(self, size_x=6, size_y=11, hexagons=None, rng=None):
 
     self.size_x = size_x
     self.size_y = size_y
 
-    possibleResources = [4,4,4,4,1,1,1,1,3,3,3,3,2,2,2,0,0,0] 
-    random.shuffle(possibleResources)
-
-    possiblenumbers = [2,3,3,4,4,5,5,5,6,6,8,8,9,9,10,10,11,11,12]
-    random.shuffle(possiblenumbers)
+    if hexagons is None:
+      hexagons = createHexagons(rng)
+    self.hexagons = hexagons
 
-    self.hexagons = []
+    # Neighbors, water and hexagon membership are shared by all boards of this size
+    self.topology = getTopology(size_x, size_y)
 
-    for i in range (19):
-      if i == 9:
-        hexagon = Hexagon(-1, 7, 9)
-      elif i == 18:
-        hexagon = Hexagon(possibleResources[9], possiblenumbers[9], 18)
-      else:
-        hexagon = Hexagon(possibleResources[i], possiblenumbers[i], i)
-      self.hexagons.append(hexagon)
+    self.tiles = [Tile(i, j, i * size_y + j) for i in range(size_x) for j in range(size_y)]
+    self.board = [self.tiles[i * size_y:(i + 1) * size_y] for i in range(size_x)]
 
-    
-    self.hexagons[0].addTiles([Tile(0, 2), Tile(0, 3), Tile(0, 4), Tile(1, 2), Tile(1, 3), Tile(1, 4)])
-    self.hexagons[1].addTiles([Tile(0, 4), Tile(0, 5), Tile(0, 6), Tile(1, 4), Tile(1, 5), Tile(1, 6)]) 
-    self.hexagons[2].addTiles([Tile(0, 6), Tile(0, 7), Tile(0, 8), Tile(1, 6), Tile(1, 7), Tile(1, 8)])
-    self.hexagons[3].addTiles([Tile(1, 1), Tile(1, 2), Tile(1, 3), Tile(2, 1), Tile(2, 2), Tile(2, 3)])
-    self.hexagons[4].addTiles([Tile(1, 3), Tile(1, 4), Tile(1, 5), Tile(2, 3), Tile(2, 4), Tile(2, 5)])
-    self.hexagons[5].addTiles([Tile(1, 5), Tile(1, 6), Tile(1, 7), Tile(2, 5), Tile(2, 6), Tile(2, 7)])
-    self.hexagons[6].addTiles([Tile(1, 7), Tile(1, 8), Tile(1, 9), Tile(2, 7), Tile(2, 8), Tile(2, 9)])
-    self.hexagons[7].addTiles([Tile(2, 0), Tile(2, 1), Tile(2, 2), Tile(3, 0), Tile(3, 1), Tile(3, 2)])
-    self.hexagons[8].addTiles([Tile(2, 2), Tile(2, 3), Tile(2, 4), Tile(3, 2), Tile(3, 3), Tile(3, 4)])
-    self.hexagons[9].addTiles([Tile(2, 4), Tile(2, 5), Tile(2, 6), Tile(3, 4), Tile(3, 5), Tile(3, 6)])
-    self.hexagons[10].addTiles([Tile(2, 6), Tile(2, 7), Tile(2, 8), Tile(3, 6), Tile(3, 7), Tile(3, 8)])
-    self.hexagons[11].addTiles([Tile(2, 8), Tile(2, 9), Tile(2, 10), Tile(3, 8), Tile(3, 9), Tile(3, 10)])
-    self.hexagons[12].addTiles([Tile(3, 1), Tile(3, 2), Tile(3, 3), Tile(4, 1), Tile(4, 2), Tile(4, 3)])
-    self.hexagons[13].addTiles([Tile(3, 3), Tile(3, 4), Tile(3, 5), Tile(4, 3), Tile(4, 4), Tile(4, 5)])
-    self.hexagons[14].addTiles([Tile(3, 5), Tile(3, 6), Tile(3, 7), Tile(4, 5), Tile(4, 6), Tile(4, 7)])
-    self.hexagons[15].addTiles([Tile(3, 7), Tile(3, 8), Tile(3, 9), Tile(4, 7), Tile(4, 8), Tile(4, 9)])
-    self.hexagons[16].addTiles([Tile(4, 2), Tile(4, 3), Tile(4, 4), Tile(5, 2), Tile(5, 3), Tile(5, 4)])
-    self.hexagons[17].addTiles([Tile(4, 4), Tile(4, 5), Tile(4, 6), Tile(5, 4), Tile(5, 5), Tile(5, 6)])
-    self.hexagons[18].addTiles([Tile(4, 6), Tile(4, 7), Tile(4, 8), Tile(5, 6), Tile(5, 7), Tile(5, 8)])
-
-    self.board = []
-    for i in range(size_x):
-      boardRow = []
-      for j in range(size_y):
-          boardRow.append(Tile(i, j))
-      self.board.append(boardRow)
-
-    for i in range(19):
-      for tile in self.hexagons[i].tiles:
-        self.getTile(tile.x, tile.y).addHexagon(self.hexagons[i])
+    # Link the hexagons and the tiles with the tables of the topology
+    for hexagon in self.hexagons:
+      hexagon.addTiles([self.tiles[cell] for cell in self.topology.hexagonCells[hexagon.id]])
+    for tile, hexagonids in zip(self.tiles, self.topology.cellHexagons):
+      tile.hexagonids = list(hexagonids)
 
     self.settlements = []
     self.roads = []
 
+    # Resources produced for every roll, player and resource type
+    self.production = np.zeros((MAX_ROLL - MIN_ROLL + 1, MAX_PLAYERS, NUM_RESOURCES), dtype=np.int8)
+
+    # Zobrist hash of the structures on the board
+    self.hash = 0
+
+    # Expected yield of every cell (see getPipIndex), built on first use
+    self.pipIndex = None
+
+
+  """
+  Method: fromLayout
+  ---------------------------
+  Parameters:
+    size_x, size_y: the size of the board
+    resources: the resource of every hexagon, by id
+    numbers: the number of every hexagon, by id
+  Returns: a new empty board with that layout
+  ---------------------------
+  """
+  @classmethod
+  def fromLayout(cls, size_x, size_y, resources, numbers):
+    return cls(size_x, size_y, [Hexagon(resources[i], numbers[i], i) for i in range(len(resources))])
+
+  """
+  Method: deepCopy
+  ---------------------------
+  Parameters: NA
+  Returns: a copy of this board, with the same hexagons and new tiles
+    holding the same structures and owners
+  ---------------------------
+  """
+  def deepCopy(self):
+    hexagons = [Hexagon(hexagon.resource, hexagon.number, hexagon.id) for hexagon in self.hexagons]
+    copy = Board(self.size_x, self.size_y, hexagons)
+    for tile, copyTile in zip(self.tiles, copy.tiles):
+      copyTile.player = tile.player
+      copyTile.structure = tile.structure
+    copy.settlements = [copy.tiles[tile.id] for tile in self.settlements]
+    copy.roads = [copy.tiles[tile.id] for tile in self.roads]
+    copy.production = self.production.copy()
+    copy.hash = self.hash
+    copy.pipIndex = self.pipIndex
+    return copy
 
   """
   Method: getTile
@@ -251,6 +302,29 @@ class Board:
       return self.board[x][y]
     return None
 
+  """
+  Method: getTileById
+  ---------------------------
+  Parameters:
+    cell: the id of the cell
+  Returns: the Tile object of that cell
+  ---------------------------
+  """
+  def getTileById(self, cell):
+    return self.tiles[cell]
+
+  """
+  Method: getTilesById
+  ---------------------------
+  Parameters:
+    cells: the ids of the cells
+  Returns: a list with the Tile object of every cell
+  ---------------------------
+  """
+  def getTilesById(self, cells):
+    tiles = self.tiles
+    return [tiles[cell] for cell in cells]
+
   """
   Method: printBoard
   ---------------------------
@@ -350,17 +424,141 @@ class Board:
       tile = action[1]
       tile.settle(playerIndex)
       self.settlements.append(tile)
+      self.addProduction(tile, playerIndex)
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["SETTLEMENT"]][playerIndex]
 
     # Or mark the tile as a road
     elif action[0] == Actions["ROAD"]:
       tile = action[1]
       tile.buildRoad(playerIndex)
       self.roads.append(tile)
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["ROAD"]][playerIndex]
 
     # Or mark the tile as a city
     elif action[0] == Actions["CITY"]:
       tile = action[1]
       tile.upgrade(playerIndex)
+      self.addProduction(tile, playerIndex)
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["SETTLEMENT"]][playerIndex] ^ STRUCTURE_KEYS[tile.id][Structure["CITY"]][playerIndex]
+
+  """
+  Method: undoAction
+  ---------------------------
+  Parameters:
+    playerIndex: the index of the player that took the action
+    action: the (ACTION_TYPE, Tile) tuple that was last applied to the board
+  Returns: NA
+
+  Reverts applyAction: settlements and roads are removed from their tiles
+  and cities go back to being settlements.
+  ---------------------------
+  """
+  def undoAction(self, playerIndex, action):
+    if action == None: return
+    tile = action[1]
+
+    if action[0] == Actions["SETTLE"]:
+      self.addProduction(tile, playerIndex, -1)
+      tile.player = None
+      tile.structure = Structure["NONE"]
+      self.settlements.remove(tile)
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["SETTLEMENT"]][playerIndex]
+
+    elif action[0] == Actions["ROAD"]:
+      tile.player = None
+      tile.structure = Structure["NONE"]
+      self.roads.remove(tile)
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["ROAD"]][playerIndex]
+
+    elif action[0] == Actions["CITY"]:
+      self.addProduction(tile, playerIndex, -1)
+      tile.structure = Structure["SETTLEMENT"]
+      self.hash ^= STRUCTURE_KEYS[tile.id][Structure["SETTLEMENT"]][playerIndex] ^ STRUCTURE_KEYS[tile.id][Structure["CITY"]][playerIndex]
+
+  """
+  Method: getCells
+  ---------------------------
+  Parameters: NA
+  Returns: a (structure, owner) pair of lists with the Structure of every
+    cell and the index of the player owning it (-1 if nobody)
+  ---------------------------
+  """
+  def getCells(self):
+    return ([tile.structure for tile in self.tiles],
+            [-1 if tile.player is None else tile.player for tile in self.tiles])
+
+  """
+  Method: loadCells
+  ---------------------------
+  Parameters:
+    structure: the Structure of every cell
+    owner: the index of the player owning every cell, as returned by
+      getCells (ignored for cells with no structure)
+    production: the production table of the board with those cells, if
+      it is known (it is worked out from the cells otherwise)
+    boardHash: the hash of the board with those cells, if it is known
+  Returns: NA
+
+  Builds all the structures on an empty board at once, without the
+  checks of applyAction, and brings the production table and the hash
+  up to date.  Settlements and roads are listed in cell order.
+  ---------------------------
+  """
+  def loadCells(self, structure, owner, production=None, boardHash=None):
+    if isinstance(structure, np.ndarray):
+      structure = structure.tolist()
+    if isinstance(owner, np.ndarray):
+      owner = owner.tolist()
+    h = 0
+    for tile, cellStructure, playerIndex in zip(self.tiles, structure, owner):
+      if cellStructure == Structure["NONE"]:
+        continue
+      tile.structure = cellStructure
+      tile.player = playerIndex
+      h ^= STRUCTURE_KEYS[tile.id][cellStructure][playerIndex]
+      if cellStructure == Structure["ROAD"]:
+        self.roads.append(tile)
+      else:
+        self.settlements.append(tile)
+        if production is None:
+          self.addProduction(tile, playerIndex, 2 if cellStructure == Structure["CITY"] else 1)
+    self.hash ^= h if boardHash is None else boardHash
+    if production is not None:
+      self.production[:] = production
+
+  """
+  Method: addProduction
+  ---------------------------
+  Parameters:
+    tile: the tile where a settlement was built or upgraded to a city
+    playerIndex: the index of the player that owns the tile
+    amount: the number of resources the tile now yields on top of
+      what it already did
+  Returns: NA
+
+  Updates the production table with the hexagons surrounding the tile.
+  Settling adds 1 resource per hexagon and upgrading to a city adds
+  another one.
+  ---------------------------
+  """
+  def addProduction(self, tile, playerIndex, amount=1):
+    for hexagonid in self.topology.cellHexagons[tile.id]:
+      hexagon = self.hexagons[hexagonid]
+      if hexagon.resource != -1:
+        self.production[hexagon.number - MIN_ROLL, playerIndex, hexagon.resource] += amount
+
+  """
+  Method: getProductionTable
+  ---------------------------
+  Parameters: NA
+  Returns: a read-only array of shape [roll][player][resource] with the
+    resources every player receives for every roll (row 0 is a roll of 2)
+  ---------------------------
+  """
+  def getProductionTable(self):
+    table = self.production.view()
+    table.flags.writeable = False
+    return table
 
   """
   Method: getNeighborTiles
@@ -374,27 +572,8 @@ class Board:
   ---------------------------
   """
   def getNeighborTiles(self, tile, diagonals=False):
-    neighbors = []
-    for dx in range(-1, 2):
-      for dy in range(-1, 2):
-
-        # Ignore the original tile
-        if dx == 0 and dy == 0: continue
-
-        # Optionally ignore diagonals
-        if not diagonals and (dx != 0 and dy != 0): continue
-
-        # If this location is in bounds, add the tile to our list
-        currTile = self.getTile(tile.x + dx, tile.y + dy)
-        if currTile != None:
-          # Remove false neighbors
-          if currTile.isWater(): continue
-          if tile.x % 2 == 0:
-            if currTile.y % 2 == 1:
-              continue
-          neighbors.append(currTile)
-
-    return neighbors
+    tiles = self.tiles
+    return [tiles[cell] for cell in self.topology.getNeighbors(tile.id, diagonals)]
 
 
   """
@@ -408,36 +587,28 @@ class Board:
   ---------------------------
   """
   def getUnoccupiedNeighbors(self, tile, diagonals=True):
-    neighbors = self.getNeighborTiles(tile, diagonals=diagonals)
-
-    unoccupied = []
-    for neighbor in neighbors:
-      if not neighbor.isOccupied():
-        unoccupied.append(neighbor)
-    return unoccupied
+    tiles = self.tiles
+    return [tiles[cell] for cell in self.topology.getNeighbors(tile.id, diagonals) if tiles[cell].structure == Structure["NONE"]]
 
   """
   Method: getResourcesFromDieRoll
   ---------------------------
   Parameters:
-    tile: the tile to return the neighbors for
-  Returns: a list of all the unoccupied neighbors for this tile
+    playerIndex: the index of the player receiving the resources
+    dieRoll: the sum of the two dice rolled
+  Returns: a Counter with the resources the player receives for that roll
 
-  Returns a list of all of the unoccupied tiles adjacent to this tile
+  Reads the row of the production table for that roll and player.
   ---------------------------
   """
   def getResourcesFromDieRoll(self, playerIndex, dieRoll):
-    resources = Counter() 
-    
-    for settlement in self.settlements:
-      for hexagonid in settlement.hexagonids:
-        hexagon = self.hexagons[hexagonid]
-        if hexagon.number == dieRoll and settlement.player == playerIndex:
-            if settlement.structure == Structure["CITY"]:
-              resources[hexagon.resource] += 2
-            else:
-              resources[hexagon.resource] += 1
-                
+    resources = Counter()
+    if not MIN_ROLL <= dieRoll <= MAX_ROLL: return resources
+
+    row = self.production[dieRoll - MIN_ROLL, playerIndex]
+    for resource in range(NUM_RESOURCES):
+      if row[resource] > 0:
+        resources[resource] = int(row[resource])
     return resources
 
   """
@@ -451,14 +622,8 @@ class Board:
   ---------------------------
   """
   def getOccupiedNeighbors(self, tile, diagonals=True):
-    neighbors = self.getNeighborTiles(tile, diagonals=diagonals)
-
-    occupied = []
-    for neighbor in neighbors:
-      if neighbor.isOccupied():
-        occupied.append(neighbor)
-
-    return occupied
+    tiles = self.tiles
+    return [tiles[cell] for cell in self.topology.getNeighbors(tile.id, diagonals) if tiles[cell].structure != Structure["NONE"]]
 
 
   """
@@ -474,13 +639,15 @@ class Board:
   def isValidSettlementLocation(self, tile):
     # It's a valid settlement location if there are no other settlements
     # within 1 space of this one
-    occupiedNeighbors = self.getOccupiedNeighbors(tile, diagonals=False)
-    for neighbor in occupiedNeighbors:
-      if neighbor.structure == Structure["SETTLEMENT"]:
+    tiles = self.tiles
+    neighbors = self.topology.orthogonalNeighbors
+    for cell in neighbors[tile.id]:
+      structure = tiles[cell].structure
+      if structure == Structure["NONE"]: continue
+      if structure == Structure["SETTLEMENT"]:
         return False
-      occupiedNeighbors2 = self.getOccupiedNeighbors(neighbor, diagonals=False)
-      for neighbor2 in occupiedNeighbors2:
-        if neighbor2.structure == Structure["SETTLEMENT"]:
+      for cell2 in neighbors[cell]:
+        if tiles[cell2].structure == Structure["SETTLEMENT"]:
           return False
     return True
 
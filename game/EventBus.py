@@ -0,0 +1,284 @@
+import sys
+import json
+from collections import Counter
+from GameConstants import *
+
+# Event kinds, as plain integers so the engine can check for listeners cheaply
+ROLL = Events["ROLL"]
+PRODUCTION = Events["PRODUCTION"]
+BUILD = Events["BUILD"]
+TURN_END = Events["TURN_END"]
+GAME_OVER = Events["GAME_OVER"]
+
+
+class RollEvent:
+  """
+  Class: RollEvent
+  ---------------------------
+  The player whose turn it is rolled the dice.
+  ---------------------------
+  """
+  __slots__ = ("turnNumber", "agentIndex", "diceRoll")
+  kind = ROLL
+
+  def __init__(self, turnNumber, agentIndex, diceRoll):
+    self.turnNumber = turnNumber
+    self.agentIndex = agentIndex
+    self.diceRoll = diceRoll
+
+  def toDict(self):
+    return {"event": "ROLL", "turn": self.turnNumber, "player": self.agentIndex, "roll": self.diceRoll}
+
+
+class ProductionEvent:
+  """
+  Class: ProductionEvent
+  ---------------------------
+  A player received resources from a dice roll.  resources is an array
+  with the amount of every resource type received.
+  ---------------------------
+  """
+  __slots__ = ("turnNumber", "agentIndex", "resources")
+  kind = PRODUCTION
+
+  def __init__(self, turnNumber, agentIndex, resources):
+    self.turnNumber = turnNumber
+    self.agentIndex = agentIndex
+    self.resources = resources
+
+  def toDict(self):
+    return {"event": "PRODUCTION", "turn": self.turnNumber, "player": self.agentIndex,
+            "resources": [int(amount) for amount in self.resources]}
+
+
+class BuildEvent:
+  """
+  Class: BuildEvent
+  ---------------------------
+  A player built a settlement, city or road (action) on a Tile.
+  ---------------------------
+  """
+  __slots__ = ("turnNumber", "agentIndex", "action", "tile")
+  kind = BUILD
+
+  def __init__(self, turnNumber, agentIndex, action, tile):
+    self.turnNumber = turnNumber
+    self.agentIndex = agentIndex
+    self.action = action
+    self.tile = tile
+
+  def toDict(self):
+    return {"event": "BUILD", "turn": self.turnNumber, "player": self.agentIndex,
+            "action": value2key(Actions, self.action), "cell": self.tile.id}
+
+
+class TurnEndEvent:
+  """
+  Class: TurnEndEvent
+  ---------------------------
+  The turn of a player ended.  passed is True if the player took no action.
+  ---------------------------
+  """
+  __slots__ = ("turnNumber", "agentIndex", "passed")
+  kind = TURN_END
+
+  def __init__(self, turnNumber, agentIndex, passed):
+    self.turnNumber = turnNumber
+    self.agentIndex = agentIndex
+    self.passed = passed
+
+  def toDict(self):
+    return {"event": "TURN_END", "turn": self.turnNumber, "player": self.agentIndex, "passed": self.passed}
+
+
+class GameOverEvent:
+  """
+  Class: GameOverEvent
+  ---------------------------
+  The game ended.  winner and margin are -1 if the game was cut off.
+  ---------------------------
+  """
+  __slots__ = ("turnNumber", "winner", "margin")
+  kind = GAME_OVER
+
+  def __init__(self, turnNumber, winner, margin):
+    self.turnNumber = turnNumber
+    self.winner = winner
+    self.margin = margin
+
+  def toDict(self):
+    return {"event": "GAME_OVER", "turn": self.turnNumber, "winner": self.winner, "margin": self.margin}
+
+
+class EventBus:
+  """
+  Class: EventBus
+  ---------------------------
+  Delivers the events of a game to the subscribers of their kind.
+  listeners[kind] is the list of callbacks subscribed to that kind, so a
+  publisher can skip building an event nobody listens to:
+
+    if bus.listeners[ROLL]:
+      bus.publish(RollEvent(turnNumber, agentIndex, diceRoll))
+
+  A subscriber is any callable taking the event.
+  ---------------------------
+  """
+
+  def __init__(self):
+    self.listeners = [[] for kind in range(len(Events))]
+
+  def subscribe(self, subscriber, kinds=None):
+    """
+    Method: subscribe
+    ---------------------------
+    Parameters:
+      subscriber: a callable taking an event
+      kinds: the event kinds to receive (all of them by default)
+    Returns: the subscriber, so it can be unsubscribed later
+    ---------------------------
+    """
+    if kinds is None:
+      kinds = range(len(Events))
+    for kind in kinds:
+      self.listeners[kind].append(subscriber)
+    return subscriber
+
+  def unsubscribe(self, subscriber):
+    for listeners in self.listeners:
+      while subscriber in listeners:
+        listeners.remove(subscriber)
+
+  def hasListeners(self):
+    return any(self.listeners)
+
+  def publish(self, event):
+    for subscriber in self.listeners[event.kind]:
+      subscriber(event)
+
+
+class ConsolePrinter:
+  """
+  Class: ConsolePrinter
+  ---------------------------
+  Subscriber that prints the events in the format of the terminal game.
+  ---------------------------
+  """
+
+  def __init__(self, playerNames, out=None):
+    self.playerNames = playerNames
+    self.out = out if out is not None else sys.stdout
+    self.rolled = False
+    self.someoneReceived = False
+
+  def __call__(self, event):
+    write = self.out.write
+    if event.kind == ROLL:
+      write("---------- TURN " + str(event.turnNumber) + " --------------\n")
+      write("It's " + self.playerNames[event.agentIndex] + "'s turn!\n")
+      write("Rolled a " + str(event.diceRoll) + "\n")
+      self.rolled = True
+      self.someoneReceived = False
+
+    elif event.kind == PRODUCTION:
+      write(self.playerNames[event.agentIndex] + " received: \n")
+      for resource in range(NUM_RESOURCES):
+        if event.resources[resource] > 0:
+          write(value2key(ResourceTypes, resource) + ": " + str(event.resources[resource]) + "\n")
+      self.someoneReceived = True
+
+    elif event.kind == BUILD:
+      write(self.playerNames[event.agentIndex] + " took action " + value2key(Actions, event.action) +
+            " at (" + str(event.tile.x) + ", " + str(event.tile.y) + ")\n\n")
+
+    elif event.kind == GAME_OVER and event.winner >= 0:
+      write(self.playerNames[event.winner] + " won the game\n")
+
+  def flush(self):
+    """
+    Method: flush
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Ends the output of a dice roll, once all its production is printed.
+    ---------------------------
+    """
+    if self.rolled and not self.someoneReceived:
+      self.out.write("No one received resources this turn\n")
+    self.rolled = False
+    self.out.flush()
+
+
+class JsonLinesSink:
+  """
+  Class: JsonLinesSink
+  ---------------------------
+  Subscriber that writes every event as a line of JSON, for tools that
+  consume the events of a simulation.  Lines are buffered by the file.
+  ---------------------------
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self.file = open(path, "a")
+
+  def __call__(self, event):
+    self.file.write(json.dumps(event.toDict()) + "\n")
+
+  def close(self):
+    if not self.file.closed:
+      self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    self.close()
+
+
+class EventCounter:
+  """
+  Class: EventCounter
+  ---------------------------
+  Subscriber that keeps running totals: events of every kind, dice rolls,
+  resources produced per player and pieces built per player and action.
+  ---------------------------
+  """
+
+  def __init__(self):
+    self.events = Counter()
+    self.rolls = Counter()
+    self.production = [[0] * NUM_RESOURCES for player in range(MAX_PLAYERS)]
+    self.builds = Counter()
+    self.passes = 0
+
+  def __call__(self, event):
+    kind = event.kind
+    self.events[kind] += 1
+    if kind == ROLL:
+      self.rolls[event.diceRoll] += 1
+    elif kind == PRODUCTION:
+      produced = self.production[event.agentIndex]
+      for resource in range(NUM_RESOURCES):
+        produced[resource] += int(event.resources[resource])
+    elif kind == BUILD:
+      self.builds[(event.agentIndex, event.action)] += 1
+    elif kind == TURN_END and event.passed:
+      self.passes += 1
+
+  def getStats(self):
+    """
+    Method: getStats
+    ---------------------------
+    Parameters: NA
+    Returns: a dict with the totals counted so far
+    ---------------------------
+    """
+    return {
+      "events": {value2key(Events, kind): count for kind, count in self.events.items()},
+      "rolls": dict(self.rolls),
+      "production": [list(produced) for produced in self.production],
+      "builds": {(player, value2key(Actions, action)): count for (player, action), count in self.builds.items()},
+      "passes": self.passes
+    }
@@ -1,6 +1,43 @@
 from Board import *
 from GameConstants import *
 from Agents import *
+from Replay import *
+from EventBus import *
+from ActionSpace import *
+import struct
+
+# Serialized GameStates (see GameState.toBytes): a header with the format
+# version, number of players, player to move and board size, the layout
+# of the hexagons (as in replays), the structure and owner planes of the
+# cells and the production table of the board as int8 arrays (the buffer
+# of an ArrayBoard), the hash of the board and the resources, victory
+# points and hash of every player
+STATE_VERSION = 2
+STATE_HEADER = struct.Struct("<BBBBB")
+BOARD_HASH_FORMAT = struct.Struct("<Q")
+PLAYER_FORMAT = struct.Struct("<" + str(NUM_RESOURCES) + "hhQ")
+# The same player layout, to read all the players at once
+PLAYER_DTYPE = np.dtype([("resources", "<i2", (NUM_RESOURCES,)), ("victoryPoints", "<i2"), ("hash", "<u8")])
+PRODUCTION_SIZE = (MAX_ROLL - MIN_ROLL + 1) * MAX_PLAYERS * NUM_RESOURCES
+
+# Affordable mask of a player that can pay for anything
+ALL_AFFORDABLE = [True] * len(BUILD_ACTIONS)
+
+# Generator of the states decoded without a seed (see GameState.fromBytes)
+_unseededGenerator = None
+
+def getStateSize(numCells, numPlayers):
+  """
+  Method: getStateSize
+  -----------------------------------------
+  Parameters:
+    numCells - the number of cells of the board
+    numPlayers - the number of players
+  Returns: the size in bytes of a state serialized with GameState.toBytes
+  -----------------------------------------
+  """
+  return (STATE_HEADER.size + LAYOUT_FORMAT.size + 2 * numCells + PRODUCTION_SIZE + BOARD_HASH_FORMAT.size +
+          numPlayers * PLAYER_FORMAT.size)
 
 class GameState:
   """
@@ -12,15 +49,19 @@ class GameState:
   -------------------------------
   """
 
-  def __init__(self):
+  def __init__(self, board=None, playerAgents=None, seed=None):
     """
     Method: __init__
     -----------------------------
     Parameters:
-      prevState - an optional GameState object to pass in.  If this is passed
-        in, this new GameState object will instead be cloned from prevState
-      layout - an optional board layout to pass in to define the layout
-        of the game board
+      board - an optional Board object (e.g. an ArrayBoard) to play on.
+        If one isn't passed in, a new Board is created
+      playerAgents - an optional list of PlayerAgents (or subclasses) playing
+        the game, indexed by agentIndex.  If it isn't passed in, four
+        PlayerAgents are created
+      seed - an optional seed for the random generator of the game, which
+        shuffles the new board and rolls the dice.  Games with the same
+        seed are identical in any process
 
     Returns: NA
 
@@ -31,18 +72,53 @@ class GameState:
     ------------------------------
     """
     
-    self.board = Board()
-    self.playerAgents = [PlayerAgent("yera", 0), PlayerAgent("krati", 1), PlayerAgent("juan", 2), PlayerAgent("isi", 3)]
+    # Random generator of this game, shared by the board and the dice
+    self.rng = np.random.default_rng(seed)
+
+    self.board = board if board is not None else Board(rng=self.rng)
+    if playerAgents is None:
+      playerAgents = [PlayerAgent("yera", 0), PlayerAgent("krati", 1), PlayerAgent("juan", 2), PlayerAgent("isi", 3)]
+    self.playerAgents = playerAgents
 
     # Make the dice agent
-    self.diceAgent = DiceAgent()
+    self.diceAgent = DiceAgent(rng=self.rng)
+
+    # Index of the player to move
+    self.currentAgentIndex = 0
 
   def deepCopy(self):
-    copy = GameState()
+    """
+    Method: deepCopy
+    ----------------------------
+    Parameters: NA
+    Returns: a copy of this GameState with its own board and players
+    ----------------------------
+    """
+    copy = GameState.__new__(GameState)
     copy.board = self.board.deepCopy()
     copy.playerAgents = [playerAgent.deepCopy(copy.board) for playerAgent in self.playerAgents]
+    copy.diceAgent = self.diceAgent.deepCopy()
+    copy.rng = copy.diceAgent.rng
+    copy.currentAgentIndex = self.currentAgentIndex
     return copy
 
+  def getHash(self):
+    """
+    Method: getHash
+    ----------------------------
+    Parameters: NA
+    Returns: a 64 bit Zobrist hash of this state
+
+    Mixes the hash the board keeps of its structures, the hashes the
+    players keep of their resources and victory points, and the player
+    to move.  All of them are updated incrementally as actions are applied.
+    ----------------------------
+    """
+    h = self.board.hash ^ SIDE_TO_MOVE_KEYS[self.currentAgentIndex]
+    for agent in self.playerAgents:
+      h ^= agent.hash
+    return h
+
 
   def getLegalActions(self, agentIndex):
     """
@@ -55,45 +131,103 @@ class GameState:
       representing all the valid actions that the given agent/player can take
     ------------------------------
     """
-    legalActions = set()
-    if self.gameOver() >= 0: return legalActions
+    if self.gameOver() >= 0: return []
+    # A dict keeps the actions unique and in the order they were found,
+    # so the same state always gives the same list
+    legalActions = {}
+    for action in self._iterLegalActions(agentIndex):
+      legalActions[action] = None
+    return list(legalActions)
+
+  def getLegalActionMask(self, agentIndex, out=None):
+    """
+    Method: getLegalActionMask
+    ------------------------------
+    Parameters:
+      agentIndex - the index of the agent to return legal actions for
+      out - an optional boolean array of ActionSpace.numActions entries
+        to fill (e.g. a row of a preallocated batch of masks)
+
+    Returns: the mask of the ActionSpace with True for every legal action
+      of the agent, passing included.  Every entry is False once the game
+      is over
+    ------------------------------
+    """
+    space = getActionSpace(self.board.size_x, self.board.size_y)
+    if out is None:
+      out = space.newMask()
+    else:
+      out[:] = False
+    if self.gameOver() >= 0: return out
+
+    numCells = space.numCells
+    for actionType, tile in self._iterLegalActions(agentIndex):
+      out[(actionType - 1) * numCells + tile.id] = True
+    out[space.passAction] = True
+    return out
+
+  def getBuildableActions(self, agentIndex):
+    """
+    Method: getBuildableActions
+    ------------------------------
+    Parameters:
+      agentIndex - the index of the agent to return the actions for
+
+    Returns: a list of the action tuples (ACTION, LOCATION) the agent could
+      take with enough resources, as getLegalActions would give them.
+      The same action may come up more than once
+    ------------------------------
+    """
+    return list(self._iterLegalActions(agentIndex, ignoreCost=True))
+
+  def _iterLegalActions(self, agentIndex, ignoreCost=False):
+    """
+    Method: _iterLegalActions
+    ------------------------------
+    Parameters:
+      agentIndex - the index of the agent to return legal actions for
+      ignoreCost - whether or not to give the actions the agent can't
+        afford too
+
+    Returns: an iterator of the (ACTION, LOCATION) tuples the agent can
+      take, roads first, then settlements and cities.  The same action
+      may come up more than once
+    ------------------------------
+    """
     agent = self.playerAgents[agentIndex]
+    affordable = ALL_AFFORDABLE if ignoreCost else agent.getAffordableMask()
 
     # If they can build a road...
-    if agent.canBuildRoad():
+    if affordable[Actions["ROAD"] - 1]:
       # Look at all unoccupied edges coming from the player's existing settlements and cities
       agentSettlements = []; agentSettlements.extend(agent.settlements); agentSettlements.extend(agent.cities)
       for settlement in agentSettlements:
         tiles = self.board.getUnoccupiedNeighbors(settlement, diagonals=False)
         for tile in tiles:
             if not tile.isOccupied(): 
-              if (Actions["ROAD"], tile) not in legalActions:
-                legalActions.add((Actions["ROAD"], tile)) 
+              yield (Actions["ROAD"], tile)
 
       # Look at all unoccupied edges coming from the player's existing roads
       for road in agent.roads:
         tiles = self.board.getUnoccupiedRoadEndpoints(road)
         for tile in tiles:
             if not tile.isOccupied(): 
-              if (Actions["ROAD"], tile) not in legalActions:
-                legalActions.add((Actions["ROAD"], tile)) 
+              yield (Actions["ROAD"], tile)
 
     # If they can settle...
-    if agent.canSettle():
+    if affordable[Actions["SETTLE"] - 1]:
       # Look at all unoccupied endpoints of the player's existing roads
       for road in agent.roads:
         tiles = self.board.getUnoccupiedRoadEndpoints(road)
         for tile in tiles:
           if not tile.isOccupied() and self.board.isValidSettlementLocation(tile): 
-            if (Actions["SETTLE"], tile) not in legalActions:
-              legalActions.add((Actions["SETTLE"], tile))
+            yield (Actions["SETTLE"], tile)
 
     # If they can build a city...
-    if agent.canBuildCity():
+    if affordable[Actions["CITY"] - 1]:
       # All current settlements are valid city locations
       for settlement in agent.settlements:
-        legalActions.add((Actions["CITY"], settlement))
-    return list(legalActions)
+        yield (Actions["CITY"], settlement)
 
   def generateSuccessor(self, playerIndex, action):
     """
@@ -116,8 +250,10 @@ class GameState:
     # Create a copy of the current state, and perform the given action
     # for the given player
     copy = self.deepCopy()
+    if action != None:
+      action = (action[0], copy.board.getTile(action[1].x, action[1].y))
     copy.playerAgents[playerIndex].applyAction(action, copy.board)
-    copy.board.applyAction(playerIndex, action)
+    copy.currentAgentIndex = (playerIndex + 1) % copy.getNumPlayerAgents()
     return copy
 
   def makeMove(self, playerIndex, action):
@@ -128,11 +264,48 @@ class GameState:
       playerIndex - the number of the player that is about to take an action
       action - the action that the player is about to take
 
+    Returns: an undo record (PLAYER_INDEX, ACTION, SETTLEMENT_INDEX, AGENT_TO_MOVE)
+      to pass to unmakeMove
+
     Modifies the current game state to reflect the action that is passed in
+    and hands the turn to the next player.
+    Unlike generateSuccessor nothing is copied, so search can walk a single
+    state by pairing every makeMove with an unmakeMove.
+    ----------------------------
+    """
+    agent = self.playerAgents[playerIndex]
+
+    # Remember where the settlement being upgraded was
+    settlementIndex = -1
+    if action != None and int(action[0]) == Actions["CITY"]:
+      for i, settlement in enumerate(agent.settlements):
+        if settlement.x == action[1].x and settlement.y == action[1].y:
+          settlementIndex = i
+          break
+
+    agent.applyAction(action, self.board)
+    record = (playerIndex, action, settlementIndex, self.currentAgentIndex)
+    self.currentAgentIndex = (playerIndex + 1) % self.getNumPlayerAgents()
+    return record
+
+  def unmakeMove(self, record):
+    """
+    Method: unmakeMove
+    ----------------------------
+    Parameters:
+      record - the undo record returned by makeMove
+
+    Returns: NA
+
+    Restores the board tiles, the player's roads, settlements and cities,
+    resources and victory points and the player to move to what they were
+    before the move.  Moves
+    must be unmade in the reverse order they were made.
     ----------------------------
     """
-    self.playerAgents[playerIndex].applyAction(action, self.board)
-    self.board.applyAction(playerIndex, action)
+    playerIndex, action, settlementIndex, agentToMove = record
+    self.playerAgents[playerIndex].undoAction(action, self.board, settlementIndex)
+    self.currentAgentIndex = agentToMove
 
   def getNumPlayerAgents(self):
     """
@@ -165,34 +338,392 @@ class GameState:
     Parameters:
       diceRoll - the dice total of the 2 rolled 6-sided dice
         to use to distribute more resources
-    Returns: NA
+    Returns: a list with the array of resources each agent gained
 
     Updates the resource counts of all agents based on the
     given dice roll.
     -----------------------------------------
     """
-    someone_received = False
+    return [agent.updateResources(diceRoll, self.board) for agent in self.playerAgents]
+
+  def loadPieces(self, structure, owner, production=None, boardHash=None):
+    """
+    Method: loadPieces
+    -----------------------------------------
+    Parameters:
+      structure - the Structure of every cell of the board
+      owner - the player owning every cell of the board, as returned by
+        Board.getCells (ignored for cells with no structure)
+      production - the production table of the board with those cells,
+        if it is known (it is worked out from the cells otherwise)
+      boardHash - the hash of the board with those cells, if it is known
+    Returns: NA
+
+    Builds the pieces on an empty board (see Board.loadCells) and hands
+    them to their players (see PlayerAgent.loadPieces).  The pieces of
+    every player are listed in cell order, which may not be the order they
+    were built in, when the player first uses them.
+    -----------------------------------------
+    """
+    self.board.loadCells(structure, owner, production, boardHash)
+    structure = np.asarray(structure)
+    owner = np.asarray(owner)
     for agent in self.playerAgents:
-      gainedResources = agent.updateResources(diceRoll, self.board)
-      if VERBOSE:
-        if gainedResources != Counter():
-          print(str(agent.name) + " received: " )
-          for resource in gainedResources:
-            print(value2key(ResourceTypes, resource) + ": " + str(gainedResources[resource]))
-          someone_received = True
-    if VERBOSE:
-      if not someone_received:
-        print("No one received resources this turn")
+      agent.loadPieces(self.board, structure, owner)
+
+  def toBytes(self):
+    """
+    Method: toBytes
+    -----------------------------------------
+    Parameters: NA
+    Returns: the state as a short bytes object (about 500 bytes for four
+      players, see getStateSize), to send to other processes instead of
+      pickling it
+
+    The layout of the board, the pieces, the resources and victory points
+    of the players and the player to move are kept, along with the
+    production table and the hash of the board so they don't have to be
+    worked out again.  The names and classes of the players and the state
+    of the dice are not.
+    -----------------------------------------
+    """
+    board = self.board
+    data = bytearray(STATE_HEADER.pack(STATE_VERSION, len(self.playerAgents), self.currentAgentIndex,
+                                       board.size_x, board.size_y))
+    data += LAYOUT_FORMAT.pack(*([hexagon.resource for hexagon in board.hexagons] +
+                                 [hexagon.number for hexagon in board.hexagons]))
+    data += np.array(board.getCells(), dtype=np.int8).tobytes()
+    data += board.production.tobytes()
+    data += BOARD_HASH_FORMAT.pack(board.hash)
+    for agent in self.playerAgents:
+      data += PLAYER_FORMAT.pack(*agent.resources.tolist(), agent.victoryPoints, agent.hash)
+    return bytes(data)
+
+  @staticmethod
+  def fromBytes(data, boardClass=Board, seed=None):
+    """
+    Method: fromBytes
+    -----------------------------------------
+    Parameters:
+      data - a state serialized with toBytes
+      boardClass - the Board class (e.g. ArrayBoard) of the new state
+      seed - an optional seed (or NumPy Generator) for the dice of the
+        new state.  States decoded without one share a single unseeded
+        Generator per process, which is much cheaper than a new one
+    Returns: a new GameState with plain PlayerAgents, equal to the
+      serialized one (same hash and legal actions)
+
+    The cells and the production table are read straight from the bytes
+    as arrays, which an ArrayBoard copies into its buffer (see
+    ArrayBoard.loadCells and ArrayBoard.fromLayout).  The piece lists of
+    the players are only built when they are first used (see
+    PlayerAgent.loadPieces).
+    -----------------------------------------
+    """
+    global _unseededGenerator
+    version, numPlayers, currentAgentIndex, size_x, size_y = STATE_HEADER.unpack_from(data, 0)
+    if version != STATE_VERSION:
+      raise Exception("fromBytes - unknown state version " + str(version) + "!")
+    position = STATE_HEADER.size
+    layout = LAYOUT_FORMAT.unpack_from(data, position)
+    position += LAYOUT_FORMAT.size
+    board = boardClass.fromLayout(size_x, size_y, layout[:NUM_HEXAGONS], layout[NUM_HEXAGONS:])
+
+    if seed is None:
+      if _unseededGenerator is None:
+        _unseededGenerator = np.random.default_rng()
+      seed = _unseededGenerator
+    agents = [PlayerAgent("Player " + str(i), i) for i in range(numPlayers)]
+    state = GameState(board, agents, seed)
+    numCells = board.topology.numCells
+    cells = np.frombuffer(data, dtype=np.int8, count=2 * numCells + PRODUCTION_SIZE, offset=position)
+    position += cells.size
+    boardHash, = BOARD_HASH_FORMAT.unpack_from(data, position)
+    position += BOARD_HASH_FORMAT.size
+    state.loadPieces(cells[:numCells], cells[numCells:2 * numCells],
+                     cells[2 * numCells:].reshape(board.production.shape), boardHash)
+
+    players = np.frombuffer(data, dtype=PLAYER_DTYPE, count=numPlayers, offset=position)
+    for agent, resources, victoryPoints, h in zip(agents, players["resources"].astype(np.int32),
+                                                  players["victoryPoints"].tolist(), players["hash"].tolist()):
+      agent.resources = resources
+      agent.victoryPoints = victoryPoints
+      agent.hash = h
+    state.currentAgentIndex = currentAgentIndex
+    return state
+
+
+class GameEngine:
+  """
+  Class: GameEngine
+  ------------------------
+  Controls the flow of a game without any terminal I/O, so it can be
+  driven by bots.  The engine places the initial settlements, rolls the
+  dice and hands out resources, and every call to step applies the action
+  of the player whose turn it is and moves on to the next turn.
+
+  Everything that happens is published on the engine's EventBus as
+  RollEvent, ProductionEvent, BuildEvent, TurnEndEvent and GameOverEvent
+  objects.  Events are only built for the kinds somebody subscribed to,
+  so an engine without subscribers runs silent at no cost.
+
+  The move history of the game (initial placements, dice rolls, actions
+  and passes) is kept as compact 4 byte replay records (see Replay), and
+  whole games can be streamed to disk with a ReplayWriter.
+  ------------------------
+  """
+
+  def __init__(self, playerAgents=None, board=None, replayWriter=None, eventBus=None):
+    """
+    Method: __init__
+    ----------------------
+    Parameters:
+      playerAgents - an optional list of PlayerAgent subclasses that play the
+        game, indexed by agentIndex.  Agents are reset at the start of every game
+      board - an optional Board to play on.  If it isn't passed in, every
+        game is played on a new Board
+      replayWriter - an optional ReplayWriter every finished game is written to
+      eventBus - an optional EventBus the events are published on.  If it
+        isn't passed in, the engine makes its own
+
+    Returns: NA
+    ----------------------
+    """
+    self.playerAgents = playerAgents
+    self.board = board
+    self.replayWriter = replayWriter
+    self.eventBus = eventBus if eventBus is not None else EventBus()
+    self.gameState = None
+    self.seed = None
+    self.moveHistory = bytearray()
+    self.turnNumber = 1
+    self.result = None
+    self.legalMask = None
+
+  def reset(self, seed=None):
+    """
+    Method: reset
+    ----------------------
+    Parameters:
+      seed - an optional seed for the board and the dice of the game
+    Returns: NA
+
+    Starts a new game: places the initial settlements and roads of every
+    player, hands out the initial resources and rolls the dice for the
+    first turn.
+    ----------------------
+    """
+    self.seed = seed
+    if self.playerAgents is not None:
+      for agent in self.playerAgents:
+        agent.reset()
+    board = self.board.deepCopy() if self.board is not None else None
+    self.gameState = GameState(board, self.playerAgents, seed)
+    self.moveHistory = bytearray()
+    self.turnNumber = 1
+    self.result = None
+
+    # Each player places 1 settlement and 1 road per round
+    for i in range(NUM_INITIAL_SETTLEMENTS):
+      for agentIndex in range(self.gameState.getNumPlayerAgents()):
+        agent = self.gameState.playerAgents[agentIndex]
+        self.gameState.currentAgentIndex = agentIndex
+        settlement, road = agent.getInitialPlacement(self.gameState, i)
+        self.placeInitial(agentIndex, settlement, road)
+        self.turnNumber += 1
+
+    for agent in self.gameState.playerAgents:
+      agent.collectInitialResources(self.gameState.board)
+
+    self.gameState.currentAgentIndex = 0
+    self.beginTurn()
+
+  def placeInitial(self, agentIndex, settlement, road):
+    """
+    Method: placeInitial
+    ----------------------
+    Parameters:
+      agentIndex - the index of the player placing the pieces
+      settlement - the Tile where the settlement is placed
+      road - the Tile where the road is placed
+    Returns: NA
+
+    Places a free settlement and road for the given player.
+    ----------------------
+    """
+    agent = self.gameState.playerAgents[agentIndex]
+    board = self.gameState.board
+
+    action = (Actions["SETTLE"], settlement)
+    board.applyAction(agentIndex, action)
+    agent.settlements.append(settlement)
+    self.moveHistory += encodeAction(agentIndex, action)
+
+    action = (Actions["ROAD"], road)
+    board.applyAction(agentIndex, action)
+    agent.roads.append(road)
+    self.moveHistory += encodeAction(agentIndex, action)
+
+  def beginTurn(self):
+    """
+    Method: beginTurn
+    ----------------------
+    Parameters: NA
+    Returns: NA
+
+    Rolls the dice for the player whose turn it is and hands out the
+    resources to every player.
+    ----------------------
+    """
+    agentIndex = self.gameState.currentAgentIndex
+    if self.replayWriter is not None and self.replayWriter.checkpointInterval > 0:
+      if self.turnNumber % self.replayWriter.checkpointInterval == 0:
+        self.moveHistory += encodeCheckpoint(self.gameState, self.turnNumber)
+    diceRoll = self.gameState.diceAgent.rollDice()
+    self.moveHistory += encodeRoll(agentIndex, diceRoll)
+    listeners = self.eventBus.listeners
+    if listeners[ROLL]:
+      self.eventBus.publish(RollEvent(self.turnNumber, agentIndex, diceRoll))
+    gainedResources = self.gameState.updatePlayerResourcesForDiceRoll(diceRoll)
+    if listeners[PRODUCTION]:
+      for agent, gained in zip(self.gameState.playerAgents, gainedResources):
+        if gained.any():
+          self.eventBus.publish(ProductionEvent(self.turnNumber, agent.agentIndex, gained.copy()))
+
+  def getCurrentAgent(self):
+    """
+    Method: getCurrentAgent
+    ----------------------
+    Parameters: NA
+    Returns: the PlayerAgent whose turn it is
+    ----------------------
+    """
+    return self.gameState.playerAgents[self.gameState.currentAgentIndex]
+
+  def isOver(self):
+    """
+    Method: isOver
+    ----------------------
+    Parameters: NA
+    Returns: True/False whether or not the game has ended
+    ----------------------
+    """
+    return self.result is not None
+
+  def step(self, action):
+    """
+    Method: step
+    ----------------------
+    Parameters:
+      action - the action tuple (ACTION, LOCATION) the current player takes,
+        or None to pass
+    Returns: NA
+
+    Applies the action of the current player, ends the turn and, unless
+    the game is over, starts the turn of the next player.  Actions that
+    aren't legal for the player (see GameState.getLegalActionMask) are
+    rejected, so drivers don't have to check them first.
+    ----------------------
+    """
+    if self.isOver():
+      raise Exception("Can\'t step a game that is over!")
+
+    agentIndex = self.gameState.currentAgentIndex
+    agent = self.gameState.playerAgents[agentIndex]
+    listeners = self.eventBus.listeners
+
+    if action != None:
+      if not self.isLegalAction(agentIndex, action):
+        raise Exception("step - " + str(value2key(Actions, action[0])) + " on cell " + str(action[1].id) +
+                        " is not a legal action for player " + str(agentIndex) + "!")
+      agent.applyAction(action, self.gameState.board)
+      if listeners[BUILD]:
+        self.eventBus.publish(BuildEvent(self.turnNumber, agentIndex, int(action[0]), action[1]))
+    self.moveHistory += encodeAction(agentIndex, action)
+    if listeners[TURN_END]:
+      self.eventBus.publish(TurnEndEvent(self.turnNumber, agentIndex, action == None))
+
+    # Go to the next player/turn
+    self.gameState.currentAgentIndex = (agentIndex + 1) % self.gameState.getNumPlayerAgents()
+    self.turnNumber += 1
+
+    # Caps the total number of iterations for a game
+    if self.gameState.gameOver() >= 0 or self.turnNumber > CUTOFF_TURNS:
+      self.result = self.getResult()
+      if self.replayWriter is not None:
+        self.replayWriter.writeGame(self.seed, self.gameState.board.hexagons,
+                                    [agent.name for agent in self.gameState.playerAgents], self.result, self.moveHistory)
+      if listeners[GAME_OVER]:
+        self.eventBus.publish(GameOverEvent(self.turnNumber, self.result[0], self.result[2]))
+      return
+
+    self.beginTurn()
+
+  def isLegalAction(self, agentIndex, action):
+    """
+    Method: isLegalAction
+    ----------------------
+    Parameters:
+      agentIndex - the index of the player taking the action
+      action - an action tuple (ACTION, LOCATION), or None to pass
+    Returns: whether or not the player can take the action now
+
+    The mask of the legal actions is written into a buffer kept by the
+    engine, so checking allocates nothing.
+    ----------------------
+    """
+    if action == None:
+      return True
+    board = self.gameState.board
+    space = getActionSpace(board.size_x, board.size_y)
+    if action[0] not in BUILD_ACTIONS or not 0 <= action[1].id < space.numCells:
+      return False
+    if self.legalMask is None or len(self.legalMask) != space.numActions:
+      self.legalMask = space.newMask()
+    return bool(self.gameState.getLegalActionMask(agentIndex, self.legalMask)[space.encode(action)])
+
+  def getResult(self):
+    """
+    Method: getResult
+    ----------------------
+    Parameters: NA
+    Returns: a (WINNER, TURN_NUMBER, MARGIN) tuple, where MARGIN is how many
+      victory points the winner is ahead of the best other player.  WINNER
+      and MARGIN are -1 if nobody has won
+    ----------------------
+    """
+    winner = self.gameState.gameOver()
+    if winner < 0: return (winner, self.turnNumber, -1)
+    agentWinner = self.gameState.playerAgents[winner]
+    runnerUp = max(agent.victoryPoints for agent in self.gameState.playerAgents if agent is not agentWinner)
+    return (winner, self.turnNumber, agentWinner.victoryPoints - runnerUp)
+
+  def run(self, seed=None):
+    """
+    Method: run
+    ----------------------
+    Parameters:
+      seed - an optional seed for the board and the dice of the game
+    Returns: the (WINNER, TURN_NUMBER, MARGIN) result of the game
+
+    Plays a whole game, asking every agent for its action with getAction.
+    ----------------------
+    """
+    self.reset(seed)
+    while not self.isOver():
+      agent = self.getCurrentAgent()
+      self.step(agent.getAction(self.gameState))
+    return self.result
 
 
 class Game:
   """
   Class: Game
   ------------------------
-  Represents all information about a game, and controls game flow.
-  In addition to containing a GameState object to keep track of all game
-  state, a Game object also contains the game's move history as a list
-  of (AGENTNAME, ACTION) tuples.
+  Terminal front-end of the game.  Human players type their actions
+  while a GameEngine controls the game flow, and everything that happens
+  is printed by a ConsolePrinter subscribed to the engine when VERBOSE
+  is set.  The game's move history is kept as replay records (see Replay).
   ------------------------
   """
 
@@ -201,25 +732,52 @@ class Game:
     Method: __init__
     ----------------------
     Parameters:
-      gameState - an optional pre-defined GameState object to use for the game.
-        If one isn't passed in, the Game begins with a newly-created GameState object.
+      playerAgentNums - an optional list of player names.  If it isn't
+        passed in, the default four players are used
+
+    Returns: NA
+
+    Initializes the Game object and the GameEngine that runs it.
+    ----------------------
+    """
+    if playerAgentNums is None:
+      playerAgentNums = ["yera", "krati", "juan", "isi"]
+    self.playerAgentNums = playerAgentNums
+    self.engine = GameEngine([HumanAgent(name, i) for i, name in enumerate(playerAgentNums)])
+    self.printer = None
+    if VERBOSE:
+      self.printer = self.engine.eventBus.subscribe(ConsolePrinter(playerAgentNums))
+
+  @property
+  def gameState(self):
+    return self.engine.gameState
+
+  @property
+  def moveHistory(self):
+    return self.engine.moveHistory
 
+  def printTurn(self):
+    """
+    Method: printTurn
+    ----------------------
+    Parameters: NA
     Returns: NA
 
-    Initializes the Game object by initializing the move history list
-    and the internal GameState object.
+    Finishes printing the events of the last step and shows the player
+    whose turn it is.
     ----------------------
     """
-    self.moveHistory = []
-    self.gameState = GameState()
-    self.playerAgentNums = playerAgentNums 
+    if self.printer is None: return
+    self.printer.flush()
+    if not self.engine.isOver():
+      print(self.engine.getCurrentAgent())
 
   def start(self):
     """
     Method: start
     ----------------------
     Parameters: NA
-    Returns: NAz
+    Returns: the (WINNER, TURN_NUMBER, MARGIN) result of the game
 
     Begins the game by running the main game loop.
     ----------------------
@@ -229,136 +787,16 @@ class Game:
       print("WELCOME TO SETTLERS OF CATAN!")
       print("-----------------------------")
 
-    # Turn tracking
-    turnNumber = 1
-    currentAgentIndex = 0
-
-    if LAYOUT_n == 0:
-      # Each player has to place 1 settlements and 1 roads
-      for i in range(NUM_INITIAL_SETTLEMENTS):
-        for agentIndex in range(self.gameState.getNumPlayerAgents()):
-          currentAgent = self.gameState.playerAgents[agentIndex]
-
-          if VERBOSE:
-            print("---------- TURN " + str(turnNumber) + " --------------")
-            print("It's " + str(currentAgent.name) + "'s turn!. Where do you want to place your settlement? \n")
-            self.gameState.board.printBoard()
-          
-          x = input("Enter x: ")
-          y = input("Enter y: ")
-          action = (Actions["SETTLE"], self.gameState.board.getTile(int(x), int(y)))
-
-          self.gameState.board.applyAction(agentIndex, action)
-          currentAgent.settlements.append(action[1])
-          self.moveHistory.append((currentAgent.name, action))
-
-          if VERBOSE:
-            print("Where do you want to place your road?")
-            self.gameState.board.printBoard()
-          
-          x = input("Enter x: ")
-          y = input("Enter y: ")
-          action = (Actions["ROAD"], self.gameState.board.getTile(int(x), int(y)))
-
-          self.gameState.board.applyAction(agentIndex, action)
-          currentAgent.roads.append(action[1])
-          self.moveHistory.append((currentAgent.name, action))
-
-          currentAgentIndex = (currentAgentIndex+1) % self.gameState.getNumPlayerAgents()
-          turnNumber += 1
-    else:
-      for i in range(NUM_INITIAL_SETTLEMENTS):
-        for agentIndex in range(self.gameState.getNumPlayerAgents()):
-          currentAgent = self.gameState.playerAgents[agentIndex]
-
-          x = LAYOUT[i][agentIndex][0][0]
-          y = LAYOUT[i][agentIndex][0][1]
-          action = (Actions["SETTLE"], self.gameState.board.getTile(int(x), int(y)))
-
-          self.gameState.board.applyAction(agentIndex, action)
-          currentAgent.settlements.append(action[1])
-          self.moveHistory.append((currentAgent.name, action))
-          
-          x = LAYOUT[i][agentIndex][1][0]
-          y = LAYOUT[i][agentIndex][1][1]
-          action = (Actions["ROAD"], self.gameState.board.getTile(int(x), int(y)))
-
-          self.gameState.board.applyAction(agentIndex, action)
-          currentAgent.roads.append(action[1])
-          self.moveHistory.append((currentAgent.name, action))
-
-          currentAgentIndex = (currentAgentIndex+1) % self.gameState.getNumPlayerAgents()
-          turnNumber += 1
-      
-
-    for agentIndex in range(self.gameState.getNumPlayerAgents()):
-      currentAgent = self.gameState.playerAgents[agentIndex]
-      currentAgent.collectInitialResources(self.gameState.board)
-      currentAgentIndex = (currentAgentIndex+1) % self.gameState.getNumPlayerAgents()
-
-    while (self.gameState.gameOver() < 0):
-      # Initial information
-      currentAgent = self.gameState.playerAgents[currentAgentIndex]
-      if VERBOSE:
-        print("---------- TURN " + str(turnNumber) + " --------------")
-        print("It's " + str(currentAgent.name) + "'s turn!")
-
-      # Print board info
-      if VERBOSE:
-        self.gameState.board.printBoard()
-
-      # Dice roll + resource distribution
-      diceRoll = self.gameState.diceAgent.rollDice()
-      if VERBOSE: print("Rolled a " + str(diceRoll))
-      self.gameState.updatePlayerResourcesForDiceRoll(diceRoll)
-
-      # Print player info
-      if VERBOSE:
-        print(currentAgent)
-
-      # The current player performs 1 action, input the action from the list of legal actions
-      legalActions = self.gameState.getLegalActions(currentAgentIndex)
-
-      if not VERBOSE:
-        print("LEGAL ACTIONS:")
-        for action in legalActions:
-          print(action)
-
-      if len(legalActions) == 0:
-        if VERBOSE:
-          print("No legal actions for " + str(currentAgent.name) + ". Skipping turn.")
-          
-        currentAgentIndex = (currentAgentIndex+1) % self.gameState.getNumPlayerAgents()
-        turnNumber += 1
-        continue
-
-      self.gameState.board.printBoard()
-
-      a = input("Enter your action: \n 'SETTLE': 1 \n 'CITY': 2 \n 'ROAD': 3 \n 'TRADE': 4 \n")
-      x = input("Enter x: ")
-      y = input("Enter y: ")
-
-      action = [a, self.gameState.board.getTile(int(x), int(y))]
-      currentAgent.applyAction(action, self.gameState.board)
-    
-      if VERBOSE:# Print out the updated game state
-          print(str(currentAgent.name) + " took action " + str(action[0]) + " at " + str(action[1]) + "\n")
+    self.engine.reset()
+    self.printTurn()
+    while not self.engine.isOver():
+      currentAgent = self.engine.getCurrentAgent()
+      action = currentAgent.getAction(self.gameState)
+      self.engine.step(action)
+      self.printTurn()
 
-      # Track the game's move history
-      self.moveHistory.append((currentAgent.name, action))
-      # Go to the next player/turn
-      currentAgentIndex = (currentAgentIndex+1) % self.gameState.getNumPlayerAgents()
-      turnNumber += 1
+    return self.engine.result
 
-      # Caps the total number of iterations for a game
-      if turnNumber > CUTOFF_TURNS: break
 
-    winner = self.gameState.gameOver()
-    if winner < 0: return (winner, turnNumber, -1)
-    agentWinner = self.gameState.playerAgents[winner]
-    agentLoser = self.gameState.playerAgents[1-winner]
-    if VERBOSE: print(agentWinner.name + " won the game")
-    return (winner, turnNumber, agentWinner.victoryPoints - agentLoser.victoryPoints)
-  
-Game().start()
-    
\ No newline at end of file
+if __name__ == "__main__":
+  Game().start()
@@ -14,6 +14,15 @@ Actions = {
   "TRADE": 4
 }
 
+# Kinds of the events published by the game engine (see EventBus)
+Events = {
+  "ROLL": 0,
+  "PRODUCTION": 1,
+  "BUILD": 2,
+  "TURN_END": 3,
+  "GAME_OVER": 4
+}
+
 ResourceTypes = {
   "BRICK ": 0,
   " WOOL ": 1,
@@ -31,6 +40,36 @@ Structure = {
 }
 
 
+# Coordinates of the tiles (corners) surrounding each of the 19 hexagons
+HEXAGON_TILES = [
+  [(0, 2), (0, 3), (0, 4), (1, 2), (1, 3), (1, 4)],
+  [(0, 4), (0, 5), (0, 6), (1, 4), (1, 5), (1, 6)],
+  [(0, 6), (0, 7), (0, 8), (1, 6), (1, 7), (1, 8)],
+  [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)],
+  [(1, 3), (1, 4), (1, 5), (2, 3), (2, 4), (2, 5)],
+  [(1, 5), (1, 6), (1, 7), (2, 5), (2, 6), (2, 7)],
+  [(1, 7), (1, 8), (1, 9), (2, 7), (2, 8), (2, 9)],
+  [(2, 0), (2, 1), (2, 2), (3, 0), (3, 1), (3, 2)],
+  [(2, 2), (2, 3), (2, 4), (3, 2), (3, 3), (3, 4)],
+  [(2, 4), (2, 5), (2, 6), (3, 4), (3, 5), (3, 6)],
+  [(2, 6), (2, 7), (2, 8), (3, 6), (3, 7), (3, 8)],
+  [(2, 8), (2, 9), (2, 10), (3, 8), (3, 9), (3, 10)],
+  [(3, 1), (3, 2), (3, 3), (4, 1), (4, 2), (4, 3)],
+  [(3, 3), (3, 4), (3, 5), (4, 3), (4, 4), (4, 5)],
+  [(3, 5), (3, 6), (3, 7), (4, 5), (4, 6), (4, 7)],
+  [(3, 7), (3, 8), (3, 9), (4, 7), (4, 8), (4, 9)],
+  [(4, 2), (4, 3), (4, 4), (5, 2), (5, 3), (5, 4)],
+  [(4, 4), (4, 5), (4, 6), (5, 4), (5, 5), (5, 6)],
+  [(4, 6), (4, 7), (4, 8), (5, 6), (5, 7), (5, 8)],
+]
+
+# Tiles of the 6 x 11 grid that lie outside the island
+WATER_TILES = frozenset([
+  (0, 0), (0, 1), (1, 0), (4, 0), (5, 1), (5, 0),
+  (0, 9), (0, 10), (1, 10), (4, 10), (5, 9), (5, 10)
+])
+
+
 VERBOSE = True
 
 LAYOUT_n = 1
@@ -76,6 +115,24 @@ CITY_COST = {
 }
 
 NUM_PLAYERS = 2
+# Largest number of players a board keeps track of (one per color)
+MAX_PLAYERS = 4
+
+NUM_RESOURCES = 5
+MIN_ROLL = 2
+MAX_ROLL = 12
+
+# Build actions in the order of the rows of COST_MATRIX
+BUILD_ACTIONS = [Actions["SETTLE"], Actions["CITY"], Actions["ROAD"]]
+
+# Cost of every build action: one row per action in BUILD_ACTIONS
+# (row = action - 1) and one column per resource type
+COST_MATRIX = np.array([
+  [SETTLEMENT_COST[resource] for resource in range(NUM_RESOURCES)],
+  [CITY_COST[resource] for resource in range(NUM_RESOURCES)],
+  [ROAD_COST[resource] for resource in range(NUM_RESOURCES)]
+], dtype=np.int32)
+
 NUM_ITERATIONS = 4
 DEPTH = 3
 
@@ -0,0 +1,654 @@
+import sys
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, OrderedDict
+from Game import *
+from Stats import LatencyStats
+
+# Bot seats give the other games a chance to run once this many seconds
+# have passed since they last did
+YIELD_INTERVAL = 0.002
+
+# Seconds between two checks of how late the loop runs its callbacks
+LAG_INTERVAL = 0.01
+
+# Number of finished games whose stats the server keeps
+MAX_FINISHED = 1000
+
+# Seconds a human seat has to act before its turn is passed
+TURN_TIMEOUT = 60.0
+
+# Bots the clients can ask for when they create a game
+BOT_CLASSES = {
+  "random": RandomAgent,
+  "expectimax": ExpectimaxAgent
+}
+
+# Bots whose decisions take long enough to be searched in a thread of the
+# loop's executor, so the loop keeps serving the other games meanwhile
+SEARCH_BOTS = frozenset(["expectimax"])
+
+# Threads searching for the bots.  Searches are pure Python and hold the
+# GIL, so more threads only make the loop wait longer to get it back
+SEARCH_THREADS = 1
+
+class RemoteAgent(PlayerAgent):
+  """
+  Class: RemoteAgent
+  ---------------------
+  A PlayerAgent played by a client of the GameServer.  Its actions come
+  from the connection of the client, so getAction can't be called.  The
+  initial placements are the default ones (see PlayerAgent).
+  ---------------------
+  """
+
+  def getAction(self, state):
+    raise Exception("Cannot get action for a remote player - its actions come from its connection!")
+
+
+class Client:
+  """
+  Class: Client
+  ---------------------
+  A connection to the server.  A client sits in at most one seat.
+  ---------------------
+  """
+
+  def __init__(self, writer):
+    self.writer = writer
+    self.match = None
+    self.seat = None
+
+  def send(self, message):
+    if not self.writer.is_closing():
+      self.writer.write((json.dumps(message) + "\n").encode("utf-8"))
+
+
+class Seat:
+  """
+  Class: Seat
+  ---------------------
+  A seat of a Match: a bot (searched off the loop if isSearch), or a
+  RemoteAgent with the Client sitting in it (None while nobody is) and
+  the future its next action is awaited on.
+  ---------------------
+  """
+
+  def __init__(self, agent, isBot, isSearch=False):
+    self.agent = agent
+    self.isBot = isBot
+    self.isSearch = isSearch
+    self.client = None
+    self.joined = False
+    self.pending = None
+
+
+class Match:
+  """
+  Class: Match
+  ---------------------
+  A game hosted by the GameServer.  A GameEngine applies the rules and
+  the events on its EventBus are sent to every client in the game.
+
+  The game starts once every human seat is taken.  Bot seats act right
+  away, giving way to the other games every YIELD_INTERVAL seconds, and
+  search bots think in the executor so they never hold up the loop.  For
+  a human seat the match task sends a "turn" message with the legal
+  actions and waits for the "act" of its client, so a human thinking
+  only holds up their own game.  Turns with nothing to do but pass are
+  passed right away, as are the turns of seats whose client left and of
+  clients that don't act within turnTimeout seconds.
+  ---------------------
+  """
+
+  def __init__(self, gameId, seatKinds, seed=None, turnTimeout=TURN_TIMEOUT, executor=None):
+    self.gameId = gameId
+    self.executor = executor
+    self.seed = seed
+    self.turnTimeout = turnTimeout
+    self.seats = []
+    for agentIndex, kind in enumerate(seatKinds):
+      if kind == "human":
+        self.seats.append(Seat(RemoteAgent("Player " + str(agentIndex), agentIndex), False))
+      elif kind in BOT_CLASSES:
+        agent = BOT_CLASSES[kind](kind + " " + str(agentIndex), agentIndex)
+        if seed is not None:
+          agent.seed(seed + agentIndex)
+        self.seats.append(Seat(agent, True, kind in SEARCH_BOTS))
+      else:
+        raise Exception("Match - unknown seat kind " + str(kind) + "!")
+
+    self.engine = GameEngine([seat.agent for seat in self.seats])
+    self.actionSpace = getActionSpace()
+    self.status = "waiting"
+    self.task = None
+
+    # Latency metrics
+    self.botLatency = LatencyStats()
+    self.humanLatency = LatencyStats()
+    self.stepLatency = LatencyStats()
+    self.autoPasses = 0
+    self.timeouts = 0
+    self.startTime = None
+    self.endTime = None
+
+  def getFreeSeat(self):
+    for agentIndex, seat in enumerate(self.seats):
+      if not seat.isBot and not seat.joined:
+        return agentIndex
+    return -1
+
+  def isFull(self):
+    return self.getFreeSeat() < 0
+
+  def send(self, message):
+    for seat in self.seats:
+      if seat.client is not None:
+        seat.client.send(message)
+
+  def sit(self, agentIndex, client):
+    """
+    Method: sit
+    ---------------------
+    Parameters:
+      agentIndex - a human seat
+      client - the Client taking it
+    Returns: NA
+
+    The events of the game are only built and sent once a client is in it.
+    ---------------------
+    """
+    seat = self.seats[agentIndex]
+    seat.client = client
+    seat.joined = True
+    if not self.engine.eventBus.hasListeners():
+      self.engine.eventBus.subscribe(self.broadcastEvent)
+
+  def broadcastEvent(self, event):
+    message = event.toDict()
+    message["op"] = "event"
+    message["game"] = self.gameId
+    self.send(message)
+
+  def getLegalActions(self, agentIndex):
+    """
+    Method: getLegalActions
+    ---------------------
+    Parameters:
+      agentIndex - the seat to list the actions of
+    Returns: the legal actions of the seat as dicts with the id of the
+      action in the ActionSpace, its kind and where it is built
+    ---------------------
+    """
+    actions = [{"id": self.actionSpace.encode(action), "action": value2key(Actions, action[0]),
+                "cell": action[1].id, "x": action[1].x, "y": action[1].y}
+               for action in self.engine.gameState.getLegalActions(agentIndex)]
+    actions.append({"id": self.actionSpace.passAction, "action": "PASS"})
+    return actions
+
+  def getState(self):
+    """
+    Method: getState
+    ---------------------
+    Parameters: NA
+    Returns: a dict with everything a client can see of the game
+    ---------------------
+    """
+    message = {"op": "state", "game": self.gameId, "status": self.status}
+    state = self.engine.gameState
+    if state is None:
+      return message
+    structure, owner = state.board.getCells()
+    message.update({
+      "turn": self.engine.turnNumber,
+      "current": state.currentAgentIndex,
+      "result": self.engine.result,
+      "hexagons": [[hexagon.resource, hexagon.number] for hexagon in state.board.hexagons],
+      "structure": structure,
+      "owner": owner,
+      "players": [{"name": agent.name, "bot": seat.isBot, "victoryPoints": agent.victoryPoints,
+                   "resources": agent.resources.tolist()} for seat, agent in zip(self.seats, state.playerAgents)]
+    })
+    return message
+
+  def getStats(self):
+    """
+    Method: getStats
+    ---------------------
+    Parameters: NA
+    Returns: a dict with the latency metrics of the game: bot decisions,
+      human response times and the time the server takes to apply an
+      action, and the turns passed automatically or after a timeout
+    ---------------------
+    """
+    end = self.endTime if self.endTime is not None else time.perf_counter()
+    return {
+      "op": "stats",
+      "game": self.gameId,
+      "status": self.status,
+      "turn": self.engine.turnNumber,
+      "seconds": end - self.startTime if self.startTime is not None else 0.0,
+      "bot": self.botLatency.getStats(),
+      "human": self.humanLatency.getStats(),
+      "step": self.stepLatency.getStats(),
+      "autoPasses": self.autoPasses,
+      "timeouts": self.timeouts
+    }
+
+  def start(self):
+    """
+    Method: start
+    ---------------------
+    Parameters: NA
+    Returns: NA
+
+    Starts the task that plays the game on the running loop.
+    ---------------------
+    """
+    self.status = "running"
+    self.task = asyncio.get_running_loop().create_task(self.play())
+
+  async def play(self):
+    """
+    Method: play
+    ---------------------
+    Parameters: NA
+    Returns: the (WINNER, TURN_NUMBER, MARGIN) result of the game
+
+    Runs the game until it is over.
+    ---------------------
+    """
+    engine = self.engine
+    loop = asyncio.get_running_loop()
+    self.startTime = time.perf_counter()
+    try:
+      engine.reset(self.seed)
+      self.send(self.getState())
+      lastYield = time.perf_counter()
+
+      while not engine.isOver():
+        state = engine.gameState
+        agentIndex = state.currentAgentIndex
+        seat = self.seats[agentIndex]
+        if seat.isBot:
+          start = time.perf_counter()
+          if seat.isSearch:
+            # The state doesn't change while the match awaits its bot
+            action = await loop.run_in_executor(self.executor, seat.agent.getAction, state)
+            lastYield = time.perf_counter()
+          else:
+            action = seat.agent.getAction(state)
+          engine.step(action)
+          end = time.perf_counter()
+          self.botLatency.add(end - start)
+          if end - lastYield >= YIELD_INTERVAL:
+            await asyncio.sleep(0)
+            lastYield = time.perf_counter()
+          continue
+
+        action = await self.waitForAction(agentIndex)
+        start = time.perf_counter()
+        engine.step(action)
+        self.stepLatency.add(time.perf_counter() - start)
+      self.status = "over"
+    except Exception as error:
+      self.status = "error"
+      self.send({"op": "error", "game": self.gameId, "message": str(error)})
+    self.endTime = time.perf_counter()
+    return engine.result
+
+  async def waitForAction(self, agentIndex):
+    """
+    Method: waitForAction
+    ---------------------
+    Parameters:
+      agentIndex - the human seat whose turn it is
+    Returns: the action of the client in the seat, or None to pass
+    ---------------------
+    """
+    seat = self.seats[agentIndex]
+    legalActions = self.engine.gameState.getLegalActions(agentIndex)
+    if seat.client is None or len(legalActions) == 0:
+      self.autoPasses += 1
+      # Let the other games run between turns of a seat nobody is playing
+      await asyncio.sleep(0)
+      return None
+
+    seat.pending = asyncio.get_running_loop().create_future()
+    seat.client.send({"op": "turn", "game": self.gameId, "seat": agentIndex, "turn": self.engine.turnNumber,
+                      "legal": self.getLegalActions(agentIndex)})
+    start = time.perf_counter()
+    try:
+      action = await asyncio.wait_for(seat.pending, self.turnTimeout)
+    except asyncio.TimeoutError:
+      self.timeouts += 1
+      action = None
+    self.humanLatency.add(time.perf_counter() - start)
+    seat.pending = None
+    return action
+
+  def act(self, agentIndex, actionId):
+    """
+    Method: act
+    ---------------------
+    Parameters:
+      agentIndex - the seat of the client
+      actionId - the id of the action in the ActionSpace
+    Returns: NA
+
+    Hands the action to the match task, which applies it.
+    ---------------------
+    """
+    seat = self.seats[agentIndex]
+    if seat.pending is None or seat.pending.done():
+      raise Exception("act - it is not the turn of seat " + str(agentIndex) + "!")
+    actionId = int(actionId)
+    if actionId < 0 or actionId >= self.actionSpace.numActions:
+      raise Exception("act - unknown action " + str(actionId) + "!")
+    if not self.engine.gameState.getLegalActionMask(agentIndex)[actionId]:
+      raise Exception("act - action " + str(actionId) + " is not legal!")
+    seat.pending.set_result(self.actionSpace.decode(actionId, self.engine.gameState.board))
+
+  def detachClients(self):
+    """
+    Method: detachClients
+    ---------------------
+    Parameters: NA
+    Returns: NA
+
+    Frees the clients of a finished game, so they can join another one.
+    ---------------------
+    """
+    for seat in self.seats:
+      if seat.client is not None:
+        seat.client.match = None
+        seat.client.seat = None
+        seat.client = None
+
+  def leave(self, agentIndex):
+    seat = self.seats[agentIndex]
+    seat.client = None
+    if self.status == "waiting":
+      seat.joined = False
+    if seat.pending is not None and not seat.pending.done():
+      seat.pending.set_result(None)
+
+
+class GameServer:
+  """
+  Class: GameServer
+  ---------------------
+  Hosts many games at once on a single asyncio loop, over TCP or a Unix
+  socket.  Clients send and receive one JSON object per line; every
+  request has an "op":
+
+    create  {"seats": ["human", "random", ...], "seed": 1}
+            makes a game (seats default to one human and bots)
+    join    {"game": 3, "seat": 0}
+            takes a free human seat (of any game waiting for players,
+            or of a new game, if "game" is left out).  "seat" is only
+            needed to come back to a seat after leaving it
+    state   the board, players and turn of the game of the client
+    legal   the legal actions of the client (ids of the ActionSpace)
+    act     {"action": 42} plays an action when it is the client's turn
+    stats   {"game": 3} the latency metrics of a game, or of the
+            server if "game" is left out
+
+  Finished games are dropped along with their engines; the server only
+  keeps the stats of the last MAX_FINISHED of them, and their clients
+  are free to join another game.
+
+  The server sends "turn" messages with the legal actions when a client
+  has to act, and the events of the game (see EventBus) as they happen.
+  Errors come back as {"op": "error", "message": ...}.
+  ---------------------
+  """
+
+  def __init__(self, numPlayers=4, bot="random", turnTimeout=TURN_TIMEOUT):
+    if bot not in BOT_CLASSES:
+      raise Exception("GameServer - unknown bot " + str(bot) + "!")
+    self.numPlayers = numPlayers
+    self.bot = bot
+    self.turnTimeout = turnTimeout
+    self.matches = {}
+    self.finished = OrderedDict()
+    self.finishedGames = Counter()
+    self.nextGameId = 0
+    self.clients = set()
+    self.messages = 0
+    self.messageLatency = LatencyStats()
+    self.loopLag = LatencyStats()
+    self.executor = ThreadPoolExecutor(max_workers=SEARCH_THREADS, thread_name_prefix="search")
+    self.server = None
+    self.monitor = None
+
+  def createMatch(self, seatKinds=None, seed=None):
+    """
+    Method: createMatch
+    ---------------------
+    Parameters:
+      seatKinds - "human" or the name of a bot (see BOT_CLASSES) for
+        every seat.  By default the first seat is human
+      seed - an optional seed for the game
+    Returns: the new Match
+
+    Games without human seats start right away.
+    ---------------------
+    """
+    if seatKinds is None:
+      seatKinds = ["human"] + [self.bot] * (self.numPlayers - 1)
+    if len(seatKinds) < 2 or len(seatKinds) > MAX_PLAYERS:
+      raise Exception("createMatch - a game has between 2 and " + str(MAX_PLAYERS) + " seats!")
+    match = Match(self.nextGameId, seatKinds, seed, self.turnTimeout, self.executor)
+    self.matches[match.gameId] = match
+    self.nextGameId += 1
+    if match.isFull():
+      self.startMatch(match)
+    return match
+
+  def startMatch(self, match):
+    match.start()
+    match.task.add_done_callback(lambda task: self.endMatch(match))
+
+  def endMatch(self, match):
+    """
+    Method: endMatch
+    ---------------------
+    Parameters:
+      match - a Match whose task is done
+    Returns: NA
+
+    Drops the match, keeping its final stats, and frees its clients.
+    ---------------------
+    """
+    if match.task.cancelled():
+      match.status = "cancelled"
+    match.detachClients()
+    self.matches.pop(match.gameId, None)
+    self.finishedGames[match.status] += 1
+    self.finished[match.gameId] = match.getStats()
+    while len(self.finished) > MAX_FINISHED:
+      self.finished.popitem(last=False)
+
+  def join(self, client, gameId=None, agentIndex=None):
+    """
+    Method: join
+    ---------------------
+    Parameters:
+      client - the Client joining
+      gameId - the game to join (any game waiting for players if None)
+      agentIndex - the seat to take (the first free one if None)
+    Returns: NA
+    ---------------------
+    """
+    if client.match is not None:
+      raise Exception("join - already playing game " + str(client.match.gameId) + "!")
+    if gameId is None:
+      waiting = [match for match in self.matches.values() if match.status == "waiting"]
+      match = waiting[0] if waiting else self.createMatch()
+    elif gameId in self.matches:
+      match = self.matches[gameId]
+    else:
+      raise Exception("join - there is no game " + str(gameId) + "!")
+
+    if agentIndex is None:
+      agentIndex = match.getFreeSeat()
+      if agentIndex < 0:
+        raise Exception("join - game " + str(match.gameId) + " has no free seats!")
+    if agentIndex < 0 or agentIndex >= len(match.seats):
+      raise Exception("join - game " + str(match.gameId) + " has no seat " + str(agentIndex) + "!")
+    seat = match.seats[agentIndex]
+    if seat.isBot or seat.client is not None or match.status not in ("waiting", "running"):
+      raise Exception("join - seat " + str(agentIndex) + " of game " + str(match.gameId) + " is taken!")
+
+    match.sit(agentIndex, client)
+    client.match = match
+    client.seat = agentIndex
+    client.send({"op": "joined", "game": match.gameId, "seat": agentIndex})
+    if match.status == "waiting" and match.isFull():
+      self.startMatch(match)
+
+  def leave(self, client):
+    if client.match is not None:
+      client.match.leave(client.seat)
+      client.match = None
+      client.seat = None
+
+  def getStats(self):
+    """
+    Method: getStats
+    ---------------------
+    Parameters: NA
+    Returns: a dict with the number of games by status (finished ones
+      included), the clients connected, the time from reading a request
+      to its reply being written and how late the loop runs its callbacks
+    ---------------------
+    """
+    games = Counter(match.status for match in self.matches.values()) + self.finishedGames
+    return {"op": "stats", "games": dict(games), "clients": len(self.clients), "messages": self.messages,
+            "requests": self.messageLatency.getStats(), "loopLag": self.loopLag.getStats()}
+
+  def handleMessage(self, client, message):
+    """
+    Method: handleMessage
+    ---------------------
+    Parameters:
+      client - the Client the message came from
+      message - the decoded request
+    Returns: the reply to send back, or None
+    ---------------------
+    """
+    op = message.get("op")
+    if op == "create":
+      match = self.createMatch(message.get("seats"), message.get("seed"))
+      return {"op": "created", "game": match.gameId}
+    if op == "join":
+      self.join(client, message.get("game"), message.get("seat"))
+      return None
+    if op == "stats":
+      if "game" in message:
+        if message["game"] in self.matches:
+          return self.matches[message["game"]].getStats()
+        if message["game"] in self.finished:
+          return self.finished[message["game"]]
+        raise Exception("stats - there is no game " + str(message["game"]) + "!")
+      return self.getStats()
+
+    if client.match is None:
+      raise Exception(str(op) + " - join a game first!")
+    if op == "state":
+      return client.match.getState()
+    if op == "legal":
+      if client.match.engine.gameState is None:
+        raise Exception("legal - the game has not started!")
+      return {"op": "legal", "game": client.match.gameId, "actions": client.match.getLegalActions(client.seat)}
+    if op == "act":
+      client.match.act(client.seat, message.get("action"))
+      return None
+    raise Exception("unknown op " + str(op) + "!")
+
+  async def handleClient(self, reader, writer):
+    client = Client(writer)
+    self.clients.add(client)
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+        start = time.perf_counter()
+        self.messages += 1
+        try:
+          reply = self.handleMessage(client, json.loads(line))
+        except Exception as error:
+          reply = {"op": "error", "message": str(error)}
+        if reply is not None:
+          client.send(reply)
+        await writer.drain()
+        self.messageLatency.add(time.perf_counter() - start)
+    except ConnectionError:
+      pass
+    finally:
+      self.leave(client)
+      self.clients.discard(client)
+      writer.close()
+
+  async def monitorLoop(self):
+    """
+    Method: monitorLoop
+    ---------------------
+    Parameters: NA
+    Returns: NA
+
+    Sleeps LAG_INTERVAL at a time and records how much later than that
+    it wakes up: the time a request that just arrived waits before the
+    loop reads it.
+    ---------------------
+    """
+    while True:
+      start = time.perf_counter()
+      await asyncio.sleep(LAG_INTERVAL)
+      self.loopLag.add(max(0.0, time.perf_counter() - start - LAG_INTERVAL))
+
+  async def start(self, host="127.0.0.1", port=0, path=None):
+    """
+    Method: start
+    ---------------------
+    Parameters:
+      host, port - the address to listen on (port 0 picks a free port)
+      path - a Unix socket to listen on instead
+    Returns: the asyncio Server listening for clients
+    ---------------------
+    """
+    if path is not None:
+      self.server = await asyncio.start_unix_server(self.handleClient, path)
+    else:
+      self.server = await asyncio.start_server(self.handleClient, host, port)
+    self.monitor = asyncio.get_running_loop().create_task(self.monitorLoop())
+    return self.server
+
+  def close(self):
+    if self.server is not None:
+      self.server.close()
+    if self.monitor is not None:
+      self.monitor.cancel()
+    for match in list(self.matches.values()):
+      if match.task is not None:
+        match.task.cancel()
+    self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(port, path=None):
+  gameServer = GameServer()
+  server = await gameServer.start(port=port, path=path)
+  print("Serving on " + str(path if path is not None else server.sockets[0].getsockname()))
+  async with server:
+    await server.serve_forever()
+
+
+if __name__ == "__main__":
+  if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+    asyncio.run(serve(None, sys.argv[1]))
+  else:
+    asyncio.run(serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8765))
@@ -0,0 +1,198 @@
+from Game import *
+
+# Distributions longer than this are raised to a power through the FFT
+# instead of by repeated convolution
+FFT_MIN_SIZE = 1024
+
+def convolvePower(pmf, power):
+  """
+  Method: convolvePower
+  ---------------------------
+  Parameters:
+    pmf: the distribution of a non-negative integer amount, indexed by
+      amount
+    power: the number of independent amounts added up
+  Returns: the distribution of the sum, of (len(pmf) - 1) * power + 1
+    entries
+
+  Short distributions are convolved by repeated squaring, which is exact
+  up to rounding.  Long ones are raised to the power in the frequency
+  domain, which is O(n log n) and off by at most ~1e-15 per entry
+  (negative round-off is clipped).
+  ---------------------------
+  """
+  pmf = np.asarray(pmf, dtype=np.float64)
+  size = (len(pmf) - 1) * power + 1
+  if size <= 1:
+    return np.ones(1) if power == 0 else pmf.copy()
+
+  if size >= FFT_MIN_SIZE:
+    n = 1 << (size - 1).bit_length()
+    result = np.fft.irfft(np.fft.rfft(pmf, n) ** power, n)[:size]
+    return np.clip(result, 0.0, None)
+
+  result = np.ones(1)
+  square = pmf
+  while power:
+    if power & 1:
+      result = np.convolve(result, square)
+    power >>= 1
+    if power:
+      square = np.convolve(square, square)
+  return result
+
+
+class IncomeForecast:
+  """
+  Class: IncomeForecast
+  ---------------------------
+  Exact distributions of what a player collects over the next turns from
+  its settlements and cities, with no sampling.  Every turn is one roll
+  of the dice (see DiceAgent.getRollDistribution), and the player gets
+  the row of the production table of the board for that roll (see
+  Board.getResourcesFromDieRoll).  Rolls are independent, so:
+
+    - the income of one resource over k turns is the distribution of a
+      single roll convolved k times (see convolvePower)
+    - whether the player can afford a build within k turns depends on
+      all the resources of the roll at once, so it comes from a Markov
+      chain over the holdings of the resources of the cost, capped at
+      the cost: the chain is absorbed once they are all reached
+
+  The forecast is for the pieces on the board when it is built and
+  ignores trades and spending.
+
+  Instance Variables:
+  ---
+  production = an array [roll][resource] with what the player gets for
+    every roll (ROLL - MIN_ROLL)
+  rollPmfs = a list with the distribution of the income of every
+    resource on a single roll
+  ---------------------------
+  """
+
+  def __init__(self, board, agentIndex):
+    self.production = board.getProductionTable()[:, agentIndex].astype(np.int64)
+    self.rollPmfs = [np.bincount(self.production[:, resource], weights=ROLL_PROBABILITIES)
+                     for resource in range(NUM_RESOURCES)]
+    self.chains = {}
+
+  def getExpectedIncome(self, numTurns=1):
+    """
+    Method: getExpectedIncome
+    ---------------------------
+    Parameters:
+      numTurns: the number of turns
+    Returns: an array with the expected income of every resource
+    ---------------------------
+    """
+    return numTurns * ROLL_PROBABILITIES.dot(self.production)
+
+  def getIncomeDistribution(self, resource, numTurns):
+    """
+    Method: getIncomeDistribution
+    ---------------------------
+    Parameters:
+      resource: the resource type
+      numTurns: the number of turns
+    Returns: an array with the probability of collecting every amount of
+      the resource over the turns, indexed by amount
+    ---------------------------
+    """
+    return convolvePower(self.rollPmfs[resource], numTurns)
+
+  def getResourceDistributions(self, resources, numTurns):
+    """
+    Method: getResourceDistributions
+    ---------------------------
+    Parameters:
+      resources: the resources the player holds now
+      numTurns: the number of turns
+    Returns: a list with, for every resource, an array with the
+      probability of holding every amount after the turns
+    ---------------------------
+    """
+    distributions = []
+    for resource in range(NUM_RESOURCES):
+      income = self.getIncomeDistribution(resource, numTurns)
+      distributions.append(np.concatenate((np.zeros(int(resources[resource])), income)))
+    return distributions
+
+  def _getChain(self, cost):
+    """
+    Method: _getChain
+    ---------------------------
+    Parameters:
+      cost: the cost of a build
+    Returns: the (NEEDED, CAPS, RADIX, TRANSITIONS) of the Markov chain
+      for the cost: the resources it needs, how many of each, the mixed
+      radix (cap + 1) that numbers the capped holdings as states and the
+      [state][state] transition matrix of one turn
+
+    Chains are built once per cost.
+    ---------------------------
+    """
+    key = tuple(int(amount) for amount in cost)
+    if key in self.chains:
+      return self.chains[key]
+
+    needed = [resource for resource in range(NUM_RESOURCES) if key[resource] > 0]
+    caps = np.array([key[resource] for resource in needed], dtype=np.int64)
+    radix = np.cumprod(np.concatenate(([1], caps[:-1] + 1))).astype(np.int64)
+    numStates = int(np.prod(caps + 1))
+
+    states = np.arange(numStates)
+    holdings = (states[:, np.newaxis] // radix) % (caps + 1)
+    transitions = np.zeros((numStates, numStates))
+    for rollIndex, probability in enumerate(ROLL_PROBABILITIES):
+      nextStates = np.minimum(holdings + self.production[rollIndex, needed], caps).dot(radix)
+      np.add.at(transitions, (states, nextStates), probability)
+
+    self.chains[key] = (needed, caps, radix, transitions)
+    return self.chains[key]
+
+  def _getInitialState(self, resources, action):
+    needed, caps, radix, transitions = self._getChain(COST_MATRIX[action - 1])
+    held = np.minimum(np.asarray(resources, dtype=np.int64)[needed], caps)
+    distribution = np.zeros(len(transitions))
+    distribution[int(held.dot(radix))] = 1.0
+    return distribution, transitions
+
+  def getAffordProbabilities(self, resources, numTurns, action=Actions["CITY"]):
+    """
+    Method: getAffordProbabilities
+    ---------------------------
+    Parameters:
+      resources: the resources the player holds now
+      numTurns: the number of turns
+      action: the build action (SETTLE, CITY or ROAD)
+    Returns: an array of numTurns + 1 entries with the probability that
+      the player can afford the action within every number of turns (the
+      first one is 0 or 1)
+    ---------------------------
+    """
+    distribution, transitions = self._getInitialState(resources, action)
+    probabilities = np.empty(numTurns + 1)
+    probabilities[0] = distribution[-1]
+    for turn in range(1, numTurns + 1):
+      distribution = distribution.dot(transitions)
+      probabilities[turn] = distribution[-1]
+    return probabilities
+
+  def getAffordProbability(self, resources, numTurns, action=Actions["CITY"]):
+    """
+    Method: getAffordProbability
+    ---------------------------
+    Parameters:
+      resources: the resources the player holds now
+      numTurns: the number of turns
+      action: the build action (SETTLE, CITY or ROAD)
+    Returns: the probability that the player can afford the action within
+      the turns
+
+    Raises the transition matrix to the number of turns, so long
+    horizons take O(log numTurns) matrix products.
+    ---------------------------
+    """
+    distribution, transitions = self._getInitialState(resources, action)
+    return float(distribution.dot(np.linalg.matrix_power(transitions, numTurns))[-1])
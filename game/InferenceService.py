@@ -0,0 +1,264 @@
+import time
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from Game import *
+from Stats import BatchResult, LatencyStats
+from ObservationEncoder import ObservationEncoder
+
+class LinearModel:
+  """
+  Class: LinearModel
+  ---------------------------
+  A model with a linear policy head and a tanh value head over the
+  observation, with random weights.  Any callable with the same
+  signature can be plugged into an InferenceService.
+  ---------------------------
+  """
+
+  def __init__(self, numFeatures, numActions, seed=None):
+    rng = np.random.default_rng(seed)
+    self.policyWeights = (rng.standard_normal((numFeatures, numActions)) / np.sqrt(numFeatures)).astype(np.float32)
+    self.valueWeights = (rng.standard_normal(numFeatures) / np.sqrt(numFeatures)).astype(np.float32)
+
+  def __call__(self, observations):
+    """
+    Method: __call__
+    ---------------------------
+    Parameters:
+      observations: a [BATCH][FEATURES] float32 array
+    Returns: the [BATCH][ACTIONS] policy logits and the [BATCH] values
+    ---------------------------
+    """
+    return observations @ self.policyWeights, np.tanh(observations @ self.valueWeights)
+
+
+class InferenceRequest:
+  __slots__ = ("observation", "future", "submitTime")
+
+  def __init__(self, observation):
+    self.observation = observation
+    self.future = Future()
+    self.submitTime = time.perf_counter()
+
+
+class InferenceService:
+  """
+  Class: InferenceService
+  ---------------------------
+  Evaluates the observations of many games in batches.  Agents submit an
+  observation and get a Future; a batching thread gathers the requests
+  until it has maxBatchSize of them or maxDelay seconds have passed since
+  the first one, copies them into a preallocated batch, runs the model
+  once on the whole batch and hands every request its row of the output.
+  With no delay a batch is whatever was queued while the previous one
+  was evaluated, which is best when the games keep the CPU busy.
+
+  The model is any callable taking a [BATCH][FEATURES] float32 array and
+  returning an array or a tuple of arrays with one row per observation
+  (e.g. LinearModel).  Games must run in their own threads (see
+  playGames) for their requests to be batched together; asyncio code can
+  wait on the Futures with asyncio.wrap_future.
+  ---------------------------
+  """
+
+  def __init__(self, model, numFeatures, maxBatchSize=64, maxDelay=0.0):
+    self.model = model
+    self.numFeatures = numFeatures
+    self.maxBatchSize = maxBatchSize
+    self.maxDelay = maxDelay
+    self.batch = np.zeros((maxBatchSize, numFeatures), dtype=np.float32)
+    self.queue = queue.SimpleQueue()
+
+    # Statistics, only updated by the batching thread
+    self.batchSizes = Counter()
+    self.queueLatency = LatencyStats()
+    self.modelLatency = LatencyStats()
+    self.totalLatency = LatencyStats()
+    self.firstRequestTime = None
+    self.lastResultTime = None
+
+    self.thread = threading.Thread(target=self._run, name="InferenceService", daemon=True)
+    self.thread.start()
+
+  def submit(self, observation):
+    """
+    Method: submit
+    ---------------------------
+    Parameters:
+      observation: an array of numFeatures entries.  It is read when its
+        batch is evaluated, so it must not change until the Future is done
+    Returns: a Future with the output of the model for the observation
+    ---------------------------
+    """
+    request = InferenceRequest(observation)
+    self.queue.put(request)
+    return request.future
+
+  def evaluate(self, observation):
+    return self.submit(observation).result()
+
+  def _run(self):
+    """
+    Method: _run
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Loop of the batching thread, until close puts None in the queue.
+    ---------------------------
+    """
+    stopping = False
+    while not stopping:
+      request = self.queue.get()
+      if request is None:
+        break
+      requests = [request]
+      deadline = time.perf_counter() + self.maxDelay
+      while len(requests) < self.maxBatchSize:
+        remaining = deadline - time.perf_counter()
+        try:
+          request = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+        except queue.Empty:
+          break
+        if request is None:
+          stopping = True
+          break
+        requests.append(request)
+      self._evaluateBatch(requests)
+
+  def _evaluateBatch(self, requests):
+    numRequests = len(requests)
+    batch = self.batch[:numRequests]
+    start = time.perf_counter()
+    if self.firstRequestTime is None:
+      self.firstRequestTime = requests[0].submitTime
+    for i, request in enumerate(requests):
+      batch[i] = request.observation
+      self.queueLatency.add(start - request.submitTime)
+
+    try:
+      outputs = self.model(batch)
+    except Exception as error:
+      for request in requests:
+        request.future.set_exception(error)
+      return
+    end = time.perf_counter()
+    self.modelLatency.add(end - start)
+    self.batchSizes[numRequests] += 1
+
+    for i, request in enumerate(requests):
+      if isinstance(outputs, tuple):
+        request.future.set_result(tuple(output[i].copy() for output in outputs))
+      else:
+        request.future.set_result(outputs[i].copy())
+      self.totalLatency.add(end - request.submitTime)
+    self.lastResultTime = end
+
+  def getStats(self):
+    """
+    Method: getStats
+    ---------------------------
+    Parameters: NA
+    Returns: a dict with the number of requests and batches, the mean
+      batch size and the histogram of batch sizes, the requests served
+      per second and the latencies of waiting in the queue, of the model
+      (per batch) and of a whole request
+    ---------------------------
+    """
+    numRequests = sum(size * count for size, count in self.batchSizes.items())
+    numBatches = sum(self.batchSizes.values())
+    elapsed = self.lastResultTime - self.firstRequestTime if numBatches else 0.0
+    return {
+      "requests": numRequests,
+      "batches": numBatches,
+      "meanBatchSize": numRequests / float(numBatches) if numBatches else 0.0,
+      "batchSizes": dict(sorted(self.batchSizes.items())),
+      "requestsPerSecond": numRequests / elapsed if elapsed > 0 else 0.0,
+      "queue": self.queueLatency.getStats(),
+      "model": self.modelLatency.getStats(),
+      "total": self.totalLatency.getStats()
+    }
+
+  def close(self):
+    """
+    Method: close
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Evaluates the requests already submitted and stops the batching thread.
+    ---------------------------
+    """
+    if self.thread.is_alive():
+      self.queue.put(None)
+      self.thread.join()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    self.close()
+
+
+class NeuralAgent(PlayerAgent):
+  """
+  Class: NeuralAgent
+  ---------------------------
+  A PlayerAgent that takes the legal action with the highest policy
+  logit of a model evaluated by an InferenceService, on the observations
+  of an ObservationEncoder.  Turns where passing is the only legal action
+  are passed without asking the model.  The observation and the mask of
+  legal actions are preallocated and reused every turn.
+  ---------------------------
+  """
+
+  def __init__(self, name, agentIndex, service, encoder=None):
+    super(NeuralAgent, self).__init__(name, agentIndex)
+    self.service = service
+    self.encoder = encoder if encoder is not None else ObservationEncoder()
+    if self.encoder.numFeatures != service.numFeatures:
+      raise Exception("NeuralAgent - the encoder and the service have a different number of features!")
+    self.actionSpace = getActionSpace()
+    self.observation = self.encoder.newBuffer()
+    self.mask = self.actionSpace.newMask()
+    self.value = 0.0
+
+  def getAction(self, state):
+    mask = state.getLegalActionMask(self.agentIndex, out=self.mask)
+    if not mask[:self.actionSpace.passAction].any():
+      return None
+
+    self.encoder.encode(state, self.agentIndex, self.observation)
+    logits, self.value = self.service.evaluate(self.observation)
+    logits[~mask] = -np.inf
+    return self.actionSpace.decode(int(logits.argmax()), state.board)
+
+
+def playGames(numGames, makeAgents, numThreads=32, seed=0):
+  """
+  Method: playGames
+  ---------------------------
+  Parameters:
+    numGames: the number of games to play
+    makeAgents: a callable returning a new list of the PlayerAgents of a
+      game
+    numThreads: the number of games played at the same time
+    seed: the seed of the first game; game i is played with seed + i
+  Returns: a BatchResult with the aggregated results
+
+  Plays the games in a pool of threads, so the requests the agents of
+  all the games in flight send to an InferenceService are batched.
+  ---------------------------
+  """
+  def playGame(gameSeed):
+    agents = makeAgents()
+    for agent in agents:
+      agent.seed(gameSeed * len(agents) + agent.agentIndex)
+    return (gameSeed,) + GameEngine(agents).run(gameSeed)
+
+  start = time.time()
+  with ThreadPoolExecutor(max_workers=numThreads) as executor:
+    results = list(executor.map(playGame, range(seed, seed + numGames)))
+  return BatchResult(len(makeAgents()), results, time.time() - start)
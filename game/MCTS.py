@@ -0,0 +1,296 @@
+import math
+import time
+import random
+from concurrent.futures import ProcessPoolExecutor
+from Game import *
+
+# Exploration constant of UCT
+EXPLORATION = 1.4
+
+class MCTSNode:
+  """
+  Class: MCTSNode
+  ---------------------------
+  A node of the search tree, reached by taking action.  Dice rolls are
+  sampled every time the tree is walked, so the same node can be reached
+  with different resources and its children are only the actions that
+  were legal at some point.  availability counts how many times the node
+  could be chosen, which UCT uses instead of the visits of the parent.
+  ---------------------------
+  """
+  __slots__ = ("action", "agentIndex", "children", "visits", "availability", "totalReward")
+
+  def __init__(self, action, agentIndex):
+    self.action = action
+    self.agentIndex = agentIndex
+    self.children = {}
+    self.visits = 0
+    self.availability = 0
+    self.totalReward = 0.0
+
+
+class Rollout:
+  """
+  Class: Rollout
+  ---------------------------
+  Walks a GameState forward in place: rolls the dice, hands out the
+  resources and applies the actions of the players.  The players that
+  receive resources from every roll are cached until a settlement or
+  city changes the production table.
+  ---------------------------
+  """
+
+  def __init__(self, state, rng, diceAgent):
+    self.state = state
+    self.rng = rng
+    self.diceAgent = diceAgent
+    self.receivers = [None] * (MAX_ROLL - MIN_ROLL + 1)
+
+  def rollDice(self):
+    """
+    Method: rollDice
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Rolls the dice for the player to move and hands out the resources.
+    ---------------------------
+    """
+    rollIndex = self.diceAgent.rollDice() - MIN_ROLL
+    receivers = self.receivers[rollIndex]
+    if receivers is None:
+      gained = self.state.board.getProductionTable()[rollIndex]
+      receivers = [(agent, gained[agent.agentIndex]) for agent in self.state.playerAgents if gained[agent.agentIndex].any()]
+      self.receivers[rollIndex] = receivers
+    for agent, gained in receivers:
+      agent.addResources(gained)
+
+  def applyAction(self, action):
+    """
+    Method: applyAction
+    ---------------------------
+    Parameters:
+      action - the action of the player to move, or None to pass
+    Returns: NA
+
+    Applies the action, hands the turn to the next player and rolls the
+    dice for them.
+    ---------------------------
+    """
+    state = self.state
+    agentIndex = state.currentAgentIndex
+    if action != None:
+      state.playerAgents[agentIndex].applyAction(action, state.board)
+      if action[0] != Actions["ROAD"]:
+        self.receivers = [None] * (MAX_ROLL - MIN_ROLL + 1)
+    state.currentAgentIndex = (agentIndex + 1) % state.getNumPlayerAgents()
+    if state.gameOver() < 0:
+      self.rollDice()
+
+  def chooseAction(self):
+    """
+    Method: chooseAction
+    ---------------------------
+    Parameters: NA
+    Returns: the action of the rollout policy for the player to move:
+      a random city if it can build one, else a random settlement, else
+      a random road half of the time, else passing (None)
+    ---------------------------
+    """
+    state = self.state
+    agentIndex = state.currentAgentIndex
+    agent = state.playerAgents[agentIndex]
+    affordable = agent.getAffordableMask()
+    if affordable[Actions["CITY"] - 1] and agent.settlements:
+      return (Actions["CITY"], self.rng.choice(agent.settlements))
+
+    # Legal actions are only listed when they may be taken
+    wantsRoad = affordable[Actions["ROAD"] - 1] and self.rng.random() < 0.5
+    if not (affordable[Actions["SETTLE"] - 1] or wantsRoad):
+      return None
+    byType = {}
+    for action in state.getLegalActions(agentIndex):
+      byType.setdefault(action[0], []).append(action)
+    if Actions["SETTLE"] in byType:
+      return self.rng.choice(byType[Actions["SETTLE"]])
+    if wantsRoad and Actions["ROAD"] in byType:
+      return self.rng.choice(byType[Actions["ROAD"]])
+    return None
+
+  def run(self, maxTurns):
+    """
+    Method: run
+    ---------------------------
+    Parameters:
+      maxTurns - the number of turns after which the rollout stops
+    Returns: the reward of every player: 1 for the winner and 0 for the
+      others, or a share of the victory points if nobody won in time
+    ---------------------------
+    """
+    state = self.state
+    for turn in range(maxTurns):
+      if state.gameOver() >= 0:
+        break
+      self.applyAction(self.chooseAction())
+    return getRewards(state)
+
+
+def getRewards(state):
+  winner = state.gameOver()
+  if winner >= 0:
+    return [1.0 if agent.agentIndex == winner else 0.0 for agent in state.playerAgents]
+  return [0.5 * agent.victoryPoints / VICTORY_POINTS_TO_WIN for agent in state.playerAgents]
+
+
+def searchTree(state, iterations=None, timeLimit=None, seed=None, exploration=EXPLORATION, maxRolloutTurns=CUTOFF_TURNS):
+  """
+  Method: searchTree
+  ---------------------------
+  Parameters:
+    state - the GameState to search, with the player to move about to act
+    iterations - the number of iterations to run
+    timeLimit - the number of seconds to search for
+    seed - the seed of the dice and the rollouts
+    exploration - the exploration constant of UCT
+    maxRolloutTurns - the number of turns after which rollouts stop
+  Returns: a dict mapping the ActionSpace id of every action tried at
+    the root to its (VISITS, TOTAL_REWARD)
+
+  Runs UCT from state until iterations are done or timeLimit seconds
+  have passed (whichever comes first; 1000 iterations if neither is given).
+  Every iteration walks a copy of the state down the tree, adds one node,
+  plays a rollout and backs the rewards of every player up the path.
+  ---------------------------
+  """
+  if iterations is None and timeLimit is None:
+    iterations = 1000
+  rng = random.Random(seed)
+  diceAgent = DiceAgent(rng=np.random.default_rng(seed))
+  space = getActionSpace(state.board.size_x, state.board.size_y)
+  root = MCTSNode(None, -1)
+  deadline = time.time() + timeLimit if timeLimit is not None else None
+
+  iteration = 0
+  while (iterations is None or iteration < iterations) and (deadline is None or time.time() < deadline):
+    iteration += 1
+    rollout = Rollout(state.deepCopy(), rng, diceAgent)
+    walked = rollout.state
+    node = root
+    path = [root]
+
+    # Selection and expansion
+    while walked.gameOver() < 0:
+      agentIndex = walked.currentAgentIndex
+      actions = walked.getLegalActions(agentIndex)
+      actions.append(None)
+      actionIds = [space.encode(action) for action in actions]
+      untried = [i for i, actionId in enumerate(actionIds) if actionId not in node.children]
+      if untried:
+        chosen = rng.choice(untried)
+        child = MCTSNode(actionIds[chosen], agentIndex)
+        node.children[child.action] = child
+        for actionId in actionIds:
+          if actionId in node.children:
+            node.children[actionId].availability += 1
+        action = actions[chosen]
+        rollout.applyAction(action)
+        path.append(child)
+        break
+
+      best = None
+      bestScore = -1.0
+      for action, actionId in zip(actions, actionIds):
+        child = node.children[actionId]
+        child.availability += 1
+        score = child.totalReward / child.visits + exploration * math.sqrt(math.log(child.availability) / child.visits)
+        if score > bestScore:
+          best, bestScore, bestAction = child, score, action
+      rollout.applyAction(bestAction)
+      node = best
+      path.append(node)
+
+    # Simulation and backpropagation
+    rewards = rollout.run(maxRolloutTurns)
+    for visited in path:
+      visited.visits += 1
+      if visited.agentIndex >= 0:
+        visited.totalReward += rewards[visited.agentIndex]
+
+  return {action: (child.visits, child.totalReward) for action, child in root.children.items()}
+
+
+def _searchWorker(data, boardClass, iterations, timeLimit, seed, exploration, maxRolloutTurns):
+  state = GameState.fromBytes(data, boardClass)
+  return searchTree(state, iterations, timeLimit, seed, exploration, maxRolloutTurns)
+
+
+class MCTSAgent(PlayerAgent):
+  """
+  Class: MCTSAgent
+  ---------------------------
+  A PlayerAgent that chooses its actions with Monte Carlo Tree Search
+  (UCT), with light rollouts that build cities and settlements first.
+
+  With numWorkers > 1 the search is parallelized at the root: every
+  worker process searches its own tree with its own dice, and the visit
+  counts of the root actions are added up to choose the action.  The
+  budget (iterations per worker and/or timeLimit seconds) applies to
+  every worker.  The pool is started on the first search; call close
+  to stop it.
+  ---------------------------
+  """
+
+  def __init__(self, name, agentIndex, iterations=None, timeLimit=None, numWorkers=1,
+               exploration=EXPLORATION, maxRolloutTurns=CUTOFF_TURNS, seed=None):
+    super(MCTSAgent, self).__init__(name, agentIndex)
+    self.iterations = iterations
+    self.timeLimit = timeLimit
+    self.numWorkers = numWorkers
+    self.exploration = exploration
+    self.maxRolloutTurns = maxRolloutTurns
+    self.random = random.Random(seed)
+    self.executor = None
+    self.stats = {}
+
+  def seed(self, seed):
+    self.random.seed(seed)
+
+  def getAction(self, state):
+    """
+    Method: getAction
+    ---------------------------
+    Parameters:
+      state - a GameState object containing information about the current state of the game
+    Returns: the root action with the most visits over all the workers
+    ---------------------------
+    """
+    if len(state.getLegalActions(self.agentIndex)) == 0:
+      return None
+
+    seeds = [self.random.getrandbits(32) for worker in range(self.numWorkers)]
+    if self.numWorkers <= 1:
+      # Search a copy made of plain PlayerAgents
+      results = [searchTree(state.deepCopy(), self.iterations, self.timeLimit, seeds[0], self.exploration, self.maxRolloutTurns)]
+    else:
+      # Workers get the state as bytes (see GameState.toBytes), which is
+      # far smaller and quicker to send than the pickled object graph
+      if self.executor is None:
+        self.executor = ProcessPoolExecutor(max_workers=self.numWorkers)
+      data = state.toBytes()
+      futures = [self.executor.submit(_searchWorker, data, type(state.board), self.iterations, self.timeLimit, seed,
+                                      self.exploration, self.maxRolloutTurns) for seed in seeds]
+      results = [future.result() for future in futures]
+
+    self.stats = {}
+    for result in results:
+      for action, (visits, totalReward) in result.items():
+        merged = self.stats.get(action, (0, 0.0))
+        self.stats[action] = (merged[0] + visits, merged[1] + totalReward)
+
+    best = max(self.stats, key=lambda action: self.stats[action][0])
+    return getActionSpace(state.board.size_x, state.board.size_y).decode(best, state.board)
+
+  def close(self):
+    if self.executor is not None:
+      self.executor.shutdown()
+      self.executor = None
@@ -0,0 +1,163 @@
+import numpy as np
+from Game import *
+
+# Features of every hexagon: one-hot resource (all zero for the desert)
+# and the probability of its number being rolled
+HEXAGON_FEATURES = NUM_RESOURCES + 1
+
+# Features of every player: resources and victory points
+PLAYER_FEATURES = NUM_RESOURCES + 1
+
+# Number of ways two dice add up to every roll, indexed by ROLL - MIN_ROLL
+ROLL_WAYS = np.rint(ROLL_PROBABILITIES * 36).astype(np.int64)
+
+class ObservationEncoder:
+  """
+  Class: ObservationEncoder
+  ---------------------------
+  Writes what a player sees of a GameState into a flat buffer given by
+  the caller, with three blocks:
+
+    cells     [3 * numPlayers][size_x][size_y] planes over Board.board:
+              plane 3 * p + STRUCTURE is 1 where player p has a road,
+              settlement or city, with players counted from the observer
+              (p = 0) in turn order
+    hexagons  [NUM_HEXAGONS][HEXAGON_FEATURES]: resource one-hot and
+              roll probability
+    players   [numPlayers][PLAYER_FEATURES]: resources and victory
+              points, the observer first
+
+  getViews gives the blocks as arrays over a buffer.  Buffers are float32
+  by default; in integer buffers (e.g. uint8) the roll probability is
+  given in 36ths, and resources and victory points above the largest
+  value of the type are clipped to it instead of wrapping around.
+  Nothing is allocated while encoding, so the same buffer can be filled
+  for every training sample or search leaf.
+  ---------------------------
+  """
+
+  def __init__(self, size_x=6, size_y=11, numPlayers=MAX_PLAYERS):
+    self.size_x = size_x
+    self.size_y = size_y
+    self.numPlayers = numPlayers
+    self.numCells = size_x * size_y
+    self.numCellPlanes = len(BUILD_ACTIONS) * numPlayers
+
+    self.cellsOffset = 0
+    self.hexagonsOffset = self.numCellPlanes * self.numCells
+    self.playersOffset = self.hexagonsOffset + NUM_HEXAGONS * HEXAGON_FEATURES
+    self.numFeatures = self.playersOffset + numPlayers * PLAYER_FEATURES
+
+    self.rollProbabilities = ROLL_PROBABILITIES.tolist()
+    self.rollWays = ROLL_WAYS.tolist()
+
+    # Largest value of every integer type seen, and room to clip the
+    # resources of a player to it
+    self.maxValues = {}
+    self.scratch = np.zeros(NUM_RESOURCES, dtype=np.int32)
+
+  def newBuffer(self, batchSize=None, dtype=np.float32):
+    """
+    Method: newBuffer
+    ---------------------------
+    Parameters:
+      batchSize: an optional number of observations to stack
+      dtype: the type of the features
+    Returns: a zeroed buffer for an observation ([batchSize][numFeatures]
+      if batchSize is given)
+    ---------------------------
+    """
+    shape = self.numFeatures if batchSize is None else (batchSize, self.numFeatures)
+    return np.zeros(shape, dtype=dtype)
+
+  def getViews(self, out):
+    """
+    Method: getViews
+    ---------------------------
+    Parameters:
+      out: a buffer from newBuffer (one observation or a batch)
+    Returns: a dict with the cells, hexagons and players blocks of the
+      buffer as views with their own shapes
+    ---------------------------
+    """
+    batch = out.shape[:-1]
+    return {
+      "cells": out[..., self.cellsOffset:self.hexagonsOffset].reshape(batch + (self.numCellPlanes, self.size_x, self.size_y)),
+      "hexagons": out[..., self.hexagonsOffset:self.playersOffset].reshape(batch + (NUM_HEXAGONS, HEXAGON_FEATURES)),
+      "players": out[..., self.playersOffset:].reshape(batch + (self.numPlayers, PLAYER_FEATURES))
+    }
+
+  def encode(self, state, agentIndex, out):
+    """
+    Method: encode
+    ---------------------------
+    Parameters:
+      state: a GameState
+      agentIndex: the player the observation is for
+      out: a buffer of numFeatures entries (e.g. a row of a batch)
+    Returns: out
+    ---------------------------
+    """
+    board = state.board
+    numCells = self.numCells
+    numPlayers = len(state.playerAgents)
+    out.fill(0)
+
+    # Only the occupied cells are written (cities are in the settlements)
+    for tiles in (board.roads, board.settlements):
+      for tile in tiles:
+        relative = (tile.player - agentIndex) % numPlayers
+        out[(len(BUILD_ACTIONS) * relative + tile.structure) * numCells + tile.id] = 1
+
+    rollFeatures = self.rollProbabilities if out.dtype.kind == "f" else self.rollWays
+    position = self.hexagonsOffset
+    for hexagon in board.hexagons:
+      if hexagon.resource != -1:
+        out[position + hexagon.resource] = 1
+        out[position + NUM_RESOURCES] = rollFeatures[hexagon.number - MIN_ROLL]
+      position += HEXAGON_FEATURES
+
+    maxValue = None if out.dtype.kind == "f" else self.getMaxValue(out.dtype)
+    position = self.playersOffset
+    for offset in range(numPlayers):
+      agent = state.playerAgents[(agentIndex + offset) % numPlayers]
+      if maxValue is None:
+        out[position:position + NUM_RESOURCES] = agent.resources
+        out[position + NUM_RESOURCES] = agent.victoryPoints
+      else:
+        out[position:position + NUM_RESOURCES] = np.minimum(agent.resources, maxValue, out=self.scratch)
+        out[position + NUM_RESOURCES] = min(agent.victoryPoints, maxValue)
+      position += PLAYER_FEATURES
+    return out
+
+  def getMaxValue(self, dtype):
+    """
+    Method: getMaxValue
+    ---------------------------
+    Parameters:
+      dtype: an integer type
+    Returns: the largest value of the type the features are clipped to
+      (at most the largest int32, the type of the resources of a player)
+    ---------------------------
+    """
+    maxValue = self.maxValues.get(dtype)
+    if maxValue is None:
+      maxValue = min(int(np.iinfo(dtype).max), int(np.iinfo(np.int32).max))
+      self.maxValues[dtype] = maxValue
+    return maxValue
+
+  def encodeBatch(self, states, agentIndices, out):
+    """
+    Method: encodeBatch
+    ---------------------------
+    Parameters:
+      states: a list of GameStates
+      agentIndices: the player every observation is for (an int for all
+        of them)
+      out: a [N][numFeatures] buffer with N >= len(states)
+    Returns: the rows of out that were filled
+    ---------------------------
+    """
+    for i, state in enumerate(states):
+      self.encode(state, agentIndices if isinstance(agentIndices, int) else agentIndices[i], out[i])
+    return out[:len(states)]
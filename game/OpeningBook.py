@@ -0,0 +1,358 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from Game import *
+
+# Bonus of a settlement for every resource the player gets for the first time
+DIVERSITY_WEIGHT = 0.1
+
+# Weight of the best spot a road leads to, next to the value of its settlement
+ROAD_WEIGHT = 0.25
+
+def getLayout(board):
+  """
+  Method: getLayout
+  ---------------------------
+  Parameters:
+    board: a Board (or ArrayBoard)
+  Returns: a tuple with the (resource, number) of every hexagon, by id
+  ---------------------------
+  """
+  return tuple((hexagon.resource, hexagon.number) for hexagon in board.hexagons)
+
+
+def getLayoutKey(layout, numPlayers, size_x=6, size_y=11):
+  """
+  Method: getLayoutKey
+  ---------------------------
+  Parameters:
+    layout: a layout from getLayout
+    numPlayers: the number of players of the game
+    size_x, size_y: the size of the board
+  Returns: the key of the layout in an OpeningBook, a hash of the
+    resources and numbers of the hexagons packed as in GameState.toBytes,
+    so the same layout gets the same key on any board class or process
+  ---------------------------
+  """
+  data = STATE_HEADER.pack(STATE_VERSION, numPlayers, 0, size_x, size_y)
+  data += LAYOUT_FORMAT.pack(*([resource for resource, number in layout] + [number for resource, number in layout]))
+  return hashlib.sha1(data).hexdigest()
+
+
+def getPlacementOrder(numPlayers):
+  """
+  Method: getPlacementOrder
+  ---------------------------
+  Parameters:
+    numPlayers: the number of players of the game
+  Returns: the list of (placementIndex, agentIndex) tuples in the order
+    GameEngine.reset asks for the initial placements
+  ---------------------------
+  """
+  return [(i, agentIndex) for i in range(NUM_INITIAL_SETTLEMENTS) for agentIndex in range(numPlayers)]
+
+
+def _getExpansionScore(board, settlement, road, cellScores):
+  """
+  Method: _getExpansionScore
+  ---------------------------
+  Parameters:
+    board: the Board
+    settlement: the Tile of the settlement the road comes from
+    road: the Tile of the road
+    cellScores: the cell scores of the PipIndex of the board
+  Returns: the score of the best free cell two steps past the road,
+    where a settlement could go after one more road
+  ---------------------------
+  """
+  getTileById = board.getTileById
+  neighbors = board.topology.orthogonalNeighbors
+  best = 0.0
+  for endpoint in neighbors[road.id]:
+    if endpoint == settlement.id or getTileById(endpoint).isOccupied(): continue
+    for cell in neighbors[endpoint]:
+      if cell != road.id and not getTileById(cell).isOccupied() and cellScores[cell] > best:
+        best = cellScores[cell]
+  return best
+
+
+def getPlacementCandidates(board, settlements=()):
+  """
+  Method: getPlacementCandidates
+  ---------------------------
+  Parameters:
+    board: the Board to place on
+    settlements: the Tiles of the settlements the player already has
+  Returns: a list of (SCORE, SETTLEMENT_TILE, ROAD_TILE) tuples with every
+    legal settlement and road the player can place, best first
+
+  A settlement is scored by the scarcity-weighted expected yield of its
+  cell (see PipIndex), plus DIVERSITY_WEIGHT for every resource it
+  produces that the player's settlements don't.  The road adds
+  ROAD_WEIGHT times the score of the best cell it leads to.  Ties go to
+  the lowest cells, so the result only depends on the board.
+  ---------------------------
+  """
+  index = getPipIndex(board)
+  cellScores = index.cellScores
+  cellYield = index.cellYield
+  covered = set()
+  for settlement in settlements:
+    covered.update(np.flatnonzero(cellYield[settlement.id]).tolist())
+
+  candidates = []
+  for cell in board.topology.landCells:
+    tile = board.getTileById(cell)
+    if tile.isOccupied() or not board.isValidSettlementLocation(tile): continue
+    newResources = len(set(np.flatnonzero(cellYield[cell]).tolist()) - covered)
+    settleScore = cellScores[cell] + DIVERSITY_WEIGHT * newResources
+    for road in board.getUnoccupiedNeighbors(tile, diagonals=False):
+      score = settleScore + ROAD_WEIGHT * _getExpansionScore(board, tile, road, cellScores)
+      candidates.append((score, tile, road))
+
+  candidates.sort(key=lambda candidate: (-candidate[0], candidate[1].id, candidate[2].id))
+  return candidates
+
+
+def solveOpening(layout, numPlayers, size_x=6, size_y=11):
+  """
+  Method: solveOpening
+  ---------------------------
+  Parameters:
+    layout: a layout from getLayout
+    numPlayers: the number of players of the game
+    size_x, size_y: the size of the board
+  Returns: the opening of the layout, a list with a list per placement
+    round holding the [settlementCell, roadCell] of every player (the
+    shape of LAYOUT)
+
+  Places the pieces on an empty board in the order of getPlacementOrder,
+  every player taking its best candidate from getPlacementCandidates.
+  ---------------------------
+  """
+  hexagons = [Hexagon(resource, number, id) for id, (resource, number) in enumerate(layout)]
+  board = Board(size_x, size_y, hexagons)
+  settlements = [[] for _ in range(numPlayers)]
+  opening = [[None] * numPlayers for _ in range(NUM_INITIAL_SETTLEMENTS)]
+
+  for placementIndex, agentIndex in getPlacementOrder(numPlayers):
+    candidates = getPlacementCandidates(board, settlements[agentIndex])
+    if not candidates:
+      raise Exception("solveOpening - there is nowhere left for player " + str(agentIndex) + " to settle!")
+    score, settlement, road = candidates[0]
+    board.applyAction(agentIndex, (Actions["SETTLE"], settlement))
+    board.applyAction(agentIndex, (Actions["ROAD"], road))
+    settlements[agentIndex].append(settlement)
+    opening[placementIndex][agentIndex] = [settlement.id, road.id]
+  return opening
+
+
+def _solveLayouts(layouts, numPlayers, size_x, size_y):
+  """
+  Method: _solveLayouts
+  ---------------------------
+  Parameters:
+    layouts: the layouts to solve
+    numPlayers, size_x, size_y: see solveOpening
+  Returns: a list of (KEY, OPENING) tuples
+
+  Work of a process of solveOpenings.
+  ---------------------------
+  """
+  return [(getLayoutKey(layout, numPlayers, size_x, size_y), solveOpening(layout, numPlayers, size_x, size_y))
+          for layout in layouts]
+
+
+def solveOpenings(layouts, numPlayers=MAX_PLAYERS, numWorkers=None, chunkSize=None, size_x=6, size_y=11):
+  """
+  Method: solveOpenings
+  ---------------------------
+  Parameters:
+    layouts: the layouts to solve
+    numPlayers: the number of players of the games
+    numWorkers: the number of worker processes (one per core by default,
+      1 solves every layout in this process)
+    chunkSize: the number of layouts sent to a worker at once
+    size_x, size_y: the size of the boards
+  Returns: a list of (KEY, OPENING) tuples, in the order of the layouts
+
+  Solves many layouts over a pool of processes.  A single opening takes a
+  few milliseconds, so the layouts are what is split between the workers.
+  ---------------------------
+  """
+  layouts = list(layouts)
+  if numWorkers is None:
+    numWorkers = os.cpu_count() or 1
+  if numWorkers <= 1 or len(layouts) <= 1:
+    return _solveLayouts(layouts, numPlayers, size_x, size_y)
+
+  if chunkSize is None:
+    chunkSize = max(1, len(layouts) // (numWorkers * 4))
+  chunks = [layouts[i:i + chunkSize] for i in range(0, len(layouts), chunkSize)]
+  results = []
+  with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+    for chunkResults in executor.map(_solveLayouts, chunks, [numPlayers] * len(chunks),
+                                     [size_x] * len(chunks), [size_y] * len(chunks)):
+      results.extend(chunkResults)
+  return results
+
+
+class OpeningBook:
+  """
+  Class: OpeningBook
+  ---------------------------
+  The openings of the layouts seen so far, keyed by getLayoutKey.  A
+  layout is solved the first time it is asked for and then looked up, so
+  a board that comes up again (e.g. a replayed seed) gets its opening at
+  once.
+
+  With a path, the book is kept in a file with a JSON line per opening.
+  New openings are appended as they are solved, so processes sharing
+  the file never rewrite each other's lines; an opening solved twice is
+  simply read twice.
+
+  Agents use a book for their initial placements when their openingBook
+  is set (see PlayerAgent.getInitialPlacement).
+  ---------------------------
+  """
+
+  def __init__(self, path=None):
+    self.path = path
+    self.openings = {}
+    self.hits = 0
+    self.misses = 0
+    if path is not None and os.path.exists(path):
+      self.load()
+
+  def __len__(self):
+    return len(self.openings)
+
+  def __contains__(self, key):
+    return key in self.openings
+
+  def load(self):
+    """
+    Method: load
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Reads the openings of the file, including the ones other processes
+    added since the book was opened.  A line cut short by a crash is
+    skipped.
+    ---------------------------
+    """
+    with open(self.path, "r") as f:
+      for line in f:
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          continue
+        self.openings[entry["key"]] = entry["opening"]
+
+  def add(self, key, opening):
+    """
+    Method: add
+    ---------------------------
+    Parameters:
+      key: the key of a layout
+      opening: its opening (see solveOpening)
+    Returns: NA
+    ---------------------------
+    """
+    if key in self.openings:
+      return
+    self.openings[key] = opening
+    if self.path is not None:
+      with open(self.path, "a") as f:
+        f.write(json.dumps({"key": key, "opening": opening}, separators=(",", ":")) + "\n")
+
+  def getOpening(self, board, numPlayers):
+    """
+    Method: getOpening
+    ---------------------------
+    Parameters:
+      board: a Board with the layout to look up
+      numPlayers: the number of players of the game
+    Returns: the opening of the layout, solved and added if it isn't in
+      the book yet
+    ---------------------------
+    """
+    layout = getLayout(board)
+    key = getLayoutKey(layout, numPlayers, board.size_x, board.size_y)
+    if key in self.openings:
+      self.hits += 1
+      return self.openings[key]
+    self.misses += 1
+    self.add(key, solveOpening(layout, numPlayers, board.size_x, board.size_y))
+    return self.openings[key]
+
+  def getPlacement(self, state, placementIndex, agentIndex):
+    """
+    Method: getPlacement
+    ---------------------------
+    Parameters:
+      state: the GameState of the game being set up
+      placementIndex: which of the NUM_INITIAL_SETTLEMENTS placements this is
+      agentIndex: the player placing
+    Returns: a (SETTLEMENT_TILE, ROAD_TILE) tuple for the player
+
+    The opening assumes every player follows the book.  If the planned
+    spot was taken by a player that didn't, the best placement on the
+    board as it is is solved instead.
+    ---------------------------
+    """
+    board = state.board
+    opening = self.getOpening(board, state.getNumPlayerAgents())
+    settleCell, roadCell = opening[placementIndex][agentIndex]
+    settlement = board.getTileById(settleCell)
+    road = board.getTileById(roadCell)
+    if (not settlement.isOccupied() and not road.isOccupied() and board.isValidSettlementLocation(settlement)):
+      return (settlement, road)
+
+    candidates = getPlacementCandidates(board, state.playerAgents[agentIndex].settlements)
+    if not candidates:
+      raise Exception("getPlacement - there is nowhere left for player " + str(agentIndex) + " to settle!")
+    return candidates[0][1:]
+
+  def precompute(self, seeds, numPlayers=MAX_PLAYERS, numWorkers=None):
+    """
+    Method: precompute
+    ---------------------------
+    Parameters:
+      seeds: the seeds of the games whose boards are solved
+      numPlayers: the number of players of the games
+      numWorkers: the number of worker processes (see solveOpenings)
+    Returns: the number of openings added
+
+    Solves the boards the games with those seeds are played on (the
+    boards a GameState shuffles from its seed) over a pool of processes,
+    skipping the ones already in the book.
+    ---------------------------
+    """
+    layouts = {}
+    for seed in seeds:
+      layout = getLayout(Board(rng=np.random.default_rng(seed)))
+      key = getLayoutKey(layout, numPlayers)
+      if key not in self.openings:
+        layouts[key] = layout
+    for key, opening in solveOpenings(list(layouts.values()), numPlayers, numWorkers):
+      self.add(key, opening)
+    return len(layouts)
+
+
+_openingBooks = {}
+
+def getOpeningBook(path):
+  """
+  Method: getOpeningBook
+  ---------------------------
+  Parameters:
+    path: the file of an OpeningBook
+  Returns: the book, loaded once per process and reused after that
+  ---------------------------
+  """
+  if path not in _openingBooks:
+    _openingBooks[path] = OpeningBook(path)
+  return _openingBooks[path]
@@ -0,0 +1,252 @@
+import struct
+from GameConstants import *
+
+# Kinds of replay records.  Build records use the codes of Actions
+RecordTypes = {
+  "ROLL": 0,
+  "SETTLE": Actions["SETTLE"],
+  "CITY": Actions["CITY"],
+  "ROAD": Actions["ROAD"],
+  "PASS": 5,
+  "CHECKPOINT": 6
+}
+
+REPLAY_MAGIC = b"CTRP"
+REPLAY_VERSION = 2
+
+# Fixed part of the header of a game:
+# magic, header size, version, number of players, seed (-1 if unknown),
+# winner, turn number, margin and number of records
+HEADER = struct.Struct("<4sHBBqbHhI")
+NUM_HEXAGONS = 19
+LAYOUT_FORMAT = struct.Struct("<" + str(NUM_HEXAGONS) + "b" + str(NUM_HEXAGONS) + "b")
+
+# Every event is a record of 4 bytes: kind, player, cell id and value (the dice roll)
+RECORD = struct.Struct("<BBBB")
+RECORD_SIZE = RECORD.size
+
+# A CHECKPOINT record (kind, player to move, size in records as a little
+# endian uint16) is followed by a snapshot of the state at the start of
+# a turn: turn number, player to move, number of players, the structure
+# and owner of every cell, and the resources and victory points of every
+# player.  The snapshot is padded to a whole number of records
+CHECKPOINT_HEADER = struct.Struct("<HBB")
+
+
+def encodeRoll(agentIndex, diceRoll):
+  """
+  Method: encodeRoll
+  ---------------------------
+  Parameters:
+    agentIndex: the index of the player whose turn it is
+    diceRoll: the sum of the two dice rolled
+  Returns: the 4 byte record of the dice roll
+  ---------------------------
+  """
+  return RECORD.pack(RecordTypes["ROLL"], agentIndex, 0, diceRoll)
+
+
+def encodeAction(agentIndex, action):
+  """
+  Method: encodeAction
+  ---------------------------
+  Parameters:
+    agentIndex: the index of the player taking the action
+    action: the (ACTION, Tile) tuple, or None for a pass
+  Returns: the 4 byte record of the action
+  ---------------------------
+  """
+  if action == None:
+    return RECORD.pack(RecordTypes["PASS"], agentIndex, 0, 0)
+  return RECORD.pack(int(action[0]), agentIndex, action[1].id, 0)
+
+
+def encodeCheckpoint(state, turnNumber):
+  """
+  Method: encodeCheckpoint
+  ---------------------------
+  Parameters:
+    state: the GameState at the start of a turn (before the dice roll)
+    turnNumber: the number of the turn that starts
+  Returns: the CHECKPOINT record followed by the snapshot of the state
+  ---------------------------
+  """
+  numPlayers = state.getNumPlayerAgents()
+  snapshot = bytearray(CHECKPOINT_HEADER.pack(turnNumber, state.currentAgentIndex, numPlayers))
+  snapshot += bytes((tile.structure for tile in state.board.tiles))
+  snapshot += bytes((255 if tile.player is None else tile.player for tile in state.board.tiles))
+  for agent in state.playerAgents:
+    snapshot += struct.pack("<5hh", *([int(amount) for amount in agent.resources] + [agent.victoryPoints]))
+  snapshot += bytes(-len(snapshot) % RECORD_SIZE)
+
+  numRecords = len(snapshot) // RECORD_SIZE
+  return RECORD.pack(RecordTypes["CHECKPOINT"], state.currentAgentIndex, numRecords & 0xFF, numRecords >> 8) + snapshot
+
+
+def decodeCheckpoint(data, numCells):
+  """
+  Method: decodeCheckpoint
+  ---------------------------
+  Parameters:
+    data: the snapshot that follows a CHECKPOINT record
+    numCells: the number of cells of the board
+  Returns: a dict with the turnNumber, currentAgentIndex, structure and
+    owner of every cell (owner is -1 for nobody), resources and
+    victoryPoints of the snapshot
+  ---------------------------
+  """
+  turnNumber, currentAgentIndex, numPlayers = CHECKPOINT_HEADER.unpack_from(data, 0)
+  position = CHECKPOINT_HEADER.size
+  structure = list(bytes(data[position:position + numCells]))
+  position += numCells
+  owner = [-1 if player == 255 else player for player in bytes(data[position:position + numCells])]
+  position += numCells
+  resources = []
+  victoryPoints = []
+  for i in range(numPlayers):
+    values = struct.unpack_from("<5hh", data, position)
+    resources.append(list(values[:NUM_RESOURCES]))
+    victoryPoints.append(values[NUM_RESOURCES])
+    position += struct.calcsize("<5hh")
+  return {
+    "turnNumber": turnNumber,
+    "currentAgentIndex": currentAgentIndex,
+    "structure": structure,
+    "owner": owner,
+    "resources": resources,
+    "victoryPoints": victoryPoints
+  }
+
+
+def encodeHeader(seed, hexagons, playerNames, result, numRecords):
+  """
+  Method: encodeHeader
+  ---------------------------
+  Parameters:
+    seed: the seed of the game (None if unknown)
+    hexagons: the list of the 19 Hexagons of the board
+    playerNames: the names of the players, in seat order
+    result: the (WINNER, TURN_NUMBER, MARGIN) result of the game
+    numRecords: the number of records that follow the header
+  Returns: the bytes of the header of a game
+  ---------------------------
+  """
+  names = b""
+  for name in playerNames:
+    # Names are cut to 255 bytes on a character boundary
+    encoded = name.encode("utf-8")[:255].decode("utf-8", "ignore").encode("utf-8")
+    names += bytes([len(encoded)]) + encoded
+  layout = LAYOUT_FORMAT.pack(*([hexagon.resource for hexagon in hexagons] + [hexagon.number for hexagon in hexagons]))
+  size = HEADER.size + LAYOUT_FORMAT.size + len(names)
+  winner, turnNumber, margin = result
+  header = HEADER.pack(REPLAY_MAGIC, size, REPLAY_VERSION, len(playerNames), -1 if seed is None else seed,
+                       winner, turnNumber, margin, numRecords)
+  return header + layout + names
+
+
+def decodeHeader(data, offset=0):
+  """
+  Method: decodeHeader
+  ---------------------------
+  Parameters:
+    data: a bytes-like object holding replays
+    offset: where the header of the game starts
+  Returns: a dict with the seed, hexResources, hexNumbers, playerNames,
+    result, numRecords and headerSize of the game
+  ---------------------------
+  """
+  magic, size, version, numPlayers, seed, winner, turnNumber, margin, numRecords = HEADER.unpack_from(data, offset)
+  if magic != REPLAY_MAGIC:
+    raise Exception("decodeHeader - not a replay at offset " + str(offset) + "!")
+  if version > REPLAY_VERSION:
+    raise Exception("decodeHeader - unknown replay version " + str(version) + "!")
+
+  layout = LAYOUT_FORMAT.unpack_from(data, offset + HEADER.size)
+  position = offset + HEADER.size + LAYOUT_FORMAT.size
+  playerNames = []
+  for i in range(numPlayers):
+    length = data[position]
+    playerNames.append(bytes(data[position + 1:position + 1 + length]).decode("utf-8"))
+    position += 1 + length
+
+  return {
+    "seed": None if seed < 0 else seed,
+    "hexResources": list(layout[:NUM_HEXAGONS]),
+    "hexNumbers": list(layout[NUM_HEXAGONS:]),
+    "playerNames": playerNames,
+    "result": (winner, turnNumber, margin),
+    "numRecords": numRecords,
+    "headerSize": size
+  }
+
+
+def decodeRecords(data):
+  """
+  Method: decodeRecords
+  ---------------------------
+  Parameters:
+    data: a bytes-like object holding whole records
+  Returns: an iterator of (KIND, PLAYER, CELL, VALUE) tuples
+  ---------------------------
+  """
+  return RECORD.iter_unpack(data)
+
+
+class ReplayWriter:
+  """
+  Class: ReplayWriter
+  ---------------------------
+  Appends games to a replay file.  Every game is written as a header
+  (seed, hexagon resources and numbers, player names, result and number
+  of records) followed by its 4 byte records.  Games are collected in a
+  memory buffer and written to disk in chunks of bufferSize bytes.
+
+  A GameEngine writing to a ReplayWriter embeds a checkpoint of the state
+  every checkpointInterval turns (0 disables them), so that readers can
+  rebuild any turn without replaying the game from the start.
+  ---------------------------
+  """
+
+  def __init__(self, path, bufferSize=1 << 20, checkpointInterval=50):
+    self.path = path
+    self.bufferSize = bufferSize
+    self.checkpointInterval = checkpointInterval
+    self.buffer = bytearray()
+    self.file = open(path, "ab")
+    self.numGames = 0
+
+  def writeGame(self, seed, hexagons, playerNames, result, records):
+    """
+    Method: writeGame
+    ---------------------------
+    Parameters:
+      seed: the seed of the game (None if unknown)
+      hexagons: the list of the 19 Hexagons of the board
+      playerNames: the names of the players, in seat order
+      result: the (WINNER, TURN_NUMBER, MARGIN) result of the game
+      records: the records of the game (e.g. GameEngine.moveHistory)
+    Returns: NA
+    ---------------------------
+    """
+    self.buffer += encodeHeader(seed, hexagons, playerNames, result, len(records) // RECORD_SIZE)
+    self.buffer += records
+    self.numGames += 1
+    if len(self.buffer) >= self.bufferSize:
+      self.flush()
+
+  def flush(self):
+    if self.buffer:
+      self.file.write(self.buffer)
+      self.buffer = bytearray()
+    self.file.flush()
+
+  def close(self):
+    if not self.file.closed:
+      self.flush()
+      self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    self.close()
@@ -0,0 +1,273 @@
+import mmap
+import bisect
+from Game import *
+
+class ReplayGame:
+  """
+  Class: ReplayGame
+  ---------------------------
+  A game stored in a replay file.  The records are a view on the mapped
+  file, so nothing is copied or decoded until it is used.  The first
+  call to getStateAtTurn indexes the records (where every turn and
+  every checkpoint is) in a single pass; the index is kept for the
+  following calls.
+
+  Turn numbers are the ones of the GameEngine: the initial placements
+  take turns 1 to numPlayers * NUM_INITIAL_SETTLEMENTS and the first dice
+  roll happens in the turn after them.
+  ---------------------------
+  """
+
+  def __init__(self, data, offset):
+    self.offset = offset
+    self.header = decodeHeader(data, offset)
+    start = offset + self.header["headerSize"]
+    self.records = data[start:start + self.header["numRecords"] * RECORD_SIZE]
+    self.numPlayers = len(self.header["playerNames"])
+    self.firstTurn = 1 + self.numPlayers * NUM_INITIAL_SETTLEMENTS
+    self.turnOffsets = None
+    self.checkpointTurns = None
+    self.checkpointOffsets = None
+
+  def getSize(self):
+    """
+    Method: getSize
+    ---------------------------
+    Parameters: NA
+    Returns: the number of bytes the game takes in the file
+    ---------------------------
+    """
+    return self.header["headerSize"] + len(self.records)
+
+  def getResult(self):
+    return self.header["result"]
+
+  def iterRecords(self):
+    """
+    Method: iterRecords
+    ---------------------------
+    Parameters: NA
+    Returns: an iterator of the (KIND, PLAYER, CELL, VALUE) records of the
+      game, without the state snapshots that follow CHECKPOINT records
+    ---------------------------
+    """
+    records = self.records
+    position = 0
+    while position < len(records):
+      record = RECORD.unpack_from(records, position)
+      yield record
+      position += RECORD_SIZE
+      if record[0] == RecordTypes["CHECKPOINT"]:
+        position += (record[2] | record[3] << 8) * RECORD_SIZE
+
+  def buildIndex(self):
+    """
+    Method: buildIndex
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Finds where the action of every turn and every checkpoint are in the
+    records.  turnOffsets[i] is the offset of the action of turn
+    firstTurn + i (the end of the records for the turn the game ended in).
+    ---------------------------
+    """
+    records = self.records
+    self.turnOffsets = []
+    self.checkpointTurns = []
+    self.checkpointOffsets = []
+    turnNumber = self.firstTurn
+    position = 2 * self.numPlayers * NUM_INITIAL_SETTLEMENTS * RECORD_SIZE
+    while position < len(records):
+      kind = records[position]
+      if kind == RecordTypes["CHECKPOINT"]:
+        self.checkpointTurns.append(turnNumber)
+        self.checkpointOffsets.append(position)
+        position += (1 + (records[position + 2] | records[position + 3] << 8)) * RECORD_SIZE
+        continue
+      if kind != RecordTypes["ROLL"]:
+        self.turnOffsets.append(position)
+        turnNumber += 1
+      position += RECORD_SIZE
+    self.turnOffsets.append(len(records))
+
+  def getLastTurn(self):
+    if self.turnOffsets is None:
+      self.buildIndex()
+    return self.firstTurn + len(self.turnOffsets) - 1
+
+  def getStateAtTurn(self, turnNumber, boardClass=Board):
+    """
+    Method: getStateAtTurn
+    ---------------------------
+    Parameters:
+      turnNumber: the turn to rebuild, between firstTurn and getLastTurn()
+      boardClass: the Board class (e.g. ArrayBoard) of the rebuilt state
+    Returns: a new GameState as the player to move saw it in the given
+      turn: after the dice roll and before the action
+
+    Starts from the nearest checkpoint before the turn (or from the
+    initial placements if there is none) and replays the records from
+    there with Board.applyAction and PlayerAgent.applyAction.
+    ---------------------------
+    """
+    if self.turnOffsets is None:
+      self.buildIndex()
+    if turnNumber < self.firstTurn or turnNumber > self.getLastTurn():
+      raise Exception("getStateAtTurn - turn " + str(turnNumber) + " is not in the replay!")
+
+    hexagons = [Hexagon(resource, number, i) for i, (resource, number)
+                in enumerate(zip(self.header["hexResources"], self.header["hexNumbers"]))]
+    board = boardClass(hexagons=hexagons)
+    agents = [PlayerAgent(name, i) for i, name in enumerate(self.header["playerNames"])]
+    state = GameState(board, agents)
+
+    checkpoint = bisect.bisect_right(self.checkpointTurns, turnNumber) - 1
+    if checkpoint >= 0:
+      position = self.loadCheckpoint(state, self.checkpointOffsets[checkpoint])
+    else:
+      position = self.loadInitialPlacements(state)
+
+    records = self.records
+    end = self.turnOffsets[turnNumber - self.firstTurn]
+    while position < end:
+      kind, agentIndex, cell, value = RECORD.unpack_from(records, position)
+      position += RECORD_SIZE
+      if kind == RecordTypes["ROLL"]:
+        state.updatePlayerResourcesForDiceRoll(value)
+      elif kind == RecordTypes["CHECKPOINT"]:
+        position += (cell | value << 8) * RECORD_SIZE
+      else:
+        if kind != RecordTypes["PASS"]:
+          state.playerAgents[agentIndex].applyAction((kind, board.getTileById(cell)), board)
+        state.currentAgentIndex = (agentIndex + 1) % self.numPlayers
+    return state
+
+  def loadInitialPlacements(self, state):
+    """
+    Method: loadInitialPlacements
+    ---------------------------
+    Parameters:
+      state: a GameState with an empty board
+    Returns: the offset of the first record after the placements
+
+    Places the initial settlements and roads and hands out the initial
+    resources, as GameEngine.reset does.
+    ---------------------------
+    """
+    board = state.board
+    end = 2 * self.numPlayers * NUM_INITIAL_SETTLEMENTS * RECORD_SIZE
+    for kind, agentIndex, cell, value in decodeRecords(self.records[:end]):
+      tile = board.getTileById(cell)
+      board.applyAction(agentIndex, (kind, tile))
+      if kind == Actions["SETTLE"]:
+        state.playerAgents[agentIndex].settlements.append(tile)
+      else:
+        state.playerAgents[agentIndex].roads.append(tile)
+    for agent in state.playerAgents:
+      agent.collectInitialResources(board)
+    state.currentAgentIndex = 0
+    return end
+
+  def loadCheckpoint(self, state, position):
+    """
+    Method: loadCheckpoint
+    ---------------------------
+    Parameters:
+      state: a GameState with an empty board
+      position: the offset of the CHECKPOINT record
+    Returns: the offset of the first record after the checkpoint
+
+    Builds the pieces (see GameState.loadPieces), resources and victory
+    points of the snapshot.
+    ---------------------------
+    """
+    board = state.board
+    kind, agentIndex, sizeLow, sizeHigh = RECORD.unpack_from(self.records, position)
+    end = position + (1 + (sizeLow | sizeHigh << 8)) * RECORD_SIZE
+    snapshot = decodeCheckpoint(self.records[position + RECORD_SIZE:end], board.topology.numCells)
+
+    state.loadPieces(snapshot["structure"], snapshot["owner"])
+
+    for agent in state.playerAgents:
+      agent.addResources(np.array(snapshot["resources"][agent.agentIndex], dtype=np.int32))
+      agent.addVictoryPoints(snapshot["victoryPoints"][agent.agentIndex])
+    state.currentAgentIndex = snapshot["currentAgentIndex"]
+    return end
+
+
+class ReplayReader:
+  """
+  Class: ReplayReader
+  ---------------------------
+  Reads a replay file written by ReplayWriter.  The file is memory mapped
+  and only the headers are read to find where every game starts; the
+  records of a game are decoded when they are used.
+  ---------------------------
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self.file = open(path, "rb")
+    self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+    self.data = memoryview(self.mapping)
+    self.offsets = None
+
+  def getOffsets(self):
+    """
+    Method: getOffsets
+    ---------------------------
+    Parameters: NA
+    Returns: the offset where every game of the file starts
+    ---------------------------
+    """
+    if self.offsets is None:
+      self.offsets = []
+      position = 0
+      while position < len(self.data):
+        self.offsets.append(position)
+        header = decodeHeader(self.data, position)
+        position += header["headerSize"] + header["numRecords"] * RECORD_SIZE
+    return self.offsets
+
+  def getGame(self, gameIndex):
+    return ReplayGame(self.data, self.getOffsets()[gameIndex])
+
+  def getStateAtTurn(self, gameIndex, turnNumber, boardClass=Board):
+    return self.getGame(gameIndex).getStateAtTurn(turnNumber, boardClass)
+
+  def __len__(self):
+    return len(self.getOffsets())
+
+  def __iter__(self):
+    position = 0
+    while position < len(self.data):
+      game = ReplayGame(self.data, position)
+      yield game
+      position += game.getSize()
+
+  def close(self):
+    """
+    Method: close
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Closes the file.  The mapping is released right away unless games
+    taken from the reader are still alive, in which case it is released
+    with the last of them.
+    ---------------------------
+    """
+    if not self.file.closed:
+      self.data.release()
+      try:
+        self.mapping.close()
+      except BufferError:
+        pass
+      self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    self.close()
@@ -0,0 +1,269 @@
+import json
+import time
+import queue
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY,
+  created REAL NOT NULL,
+  numPlayers INTEGER NOT NULL,
+  agents TEXT NOT NULL,
+  config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+  id INTEGER PRIMARY KEY,
+  runId INTEGER NOT NULL REFERENCES runs(id),
+  seed INTEGER,
+  layoutHash TEXT,
+  winner INTEGER NOT NULL,
+  turnNumber INTEGER NOT NULL,
+  margin INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seats (
+  gameId INTEGER NOT NULL REFERENCES games(id),
+  seat INTEGER NOT NULL,
+  agent TEXT NOT NULL,
+  won INTEGER NOT NULL,
+  victoryPoints INTEGER NOT NULL,
+  settlements INTEGER NOT NULL,
+  cities INTEGER NOT NULL,
+  roads INTEGER NOT NULL,
+  PRIMARY KEY (gameId, seat)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS gamesByRun ON games(runId, seed);
+CREATE INDEX IF NOT EXISTS gamesByLayout ON games(layoutHash, winner);
+CREATE INDEX IF NOT EXISTS seatsByAgent ON seats(agent, gameId, won);
+"""
+
+class ResultStore:
+  """
+  Class: ResultStore
+  ---------------------------
+  A SQLite database with the results of batches of games:
+
+    runs   a row per batch: when it was run, the agent of every seat and
+           its settings (seed, number of games...) as JSON
+    games  a row per game: run, seed, hash of the board layout (see
+           OpeningBook.getLayoutKey), winner, turns and margin
+    seats  a row per player of every game: agent, whether it won, victory
+           points and pieces at the end
+
+  Writes never wait for the disk.  addRun and addGames hand the rows to
+  a writer thread and return at once; the ids of new rows are given out
+  by the store.  The writer gathers what is queued into one transaction
+  of up to batchSize games, and the database is in WAL mode, so readers
+  (getWinRates and friends, or other processes) don't block it.
+
+  Only one store should write to a database at a time.
+  ---------------------------
+  """
+
+  def __init__(self, path, batchSize=1000):
+    self.path = path
+    self.batchSize = batchSize
+
+    # Connection of the calling thread, for setting up and for queries
+    self.connection = sqlite3.connect(path, check_same_thread=False)
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.executescript(SCHEMA)
+    self.connection.commit()
+    self.nextRunId = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM runs").fetchone()[0]
+    self.nextGameId = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM games").fetchone()[0]
+
+    self.queue = queue.SimpleQueue()
+    self.error = None
+    self.gamesWritten = 0
+    self.thread = threading.Thread(target=self._run, name="ResultStore", daemon=True)
+    self.thread.start()
+
+  def addRun(self, agents, config=None):
+    """
+    Method: addRun
+    ---------------------------
+    Parameters:
+      agents: the names of the agents (e.g. their classes) of every seat
+      config: an optional dict with the settings of the run
+    Returns: the id of the new run
+    ---------------------------
+    """
+    runId = self.nextRunId
+    self.nextRunId += 1
+    self.queue.put(("run", (runId, time.time(), len(agents), json.dumps(list(agents)), json.dumps(config or {}))))
+    return runId
+
+  def addGames(self, runId, agents, games):
+    """
+    Method: addGames
+    ---------------------------
+    Parameters:
+      runId: the run the games belong to
+      agents: the names of the agents of every seat
+      games: a list of (SEED, WINNER, TURN_NUMBER, MARGIN, LAYOUT_HASH,
+        SEATS) tuples, where SEATS is a list with the (VICTORY_POINTS,
+        SETTLEMENTS, CITIES, ROADS) of every seat
+    Returns: the ids of the new games
+    ---------------------------
+    """
+    self._checkWriter()
+    firstId = self.nextGameId
+    self.nextGameId += len(games)
+    gameRows = []
+    seatRows = []
+    for gameId, (seed, winner, turnNumber, margin, layoutHash, seats) in enumerate(games, firstId):
+      gameRows.append((gameId, runId, seed, layoutHash, winner, turnNumber, margin))
+      for seat, (victoryPoints, settlements, cities, roads) in enumerate(seats):
+        seatRows.append((gameId, seat, agents[seat], int(seat == winner), victoryPoints, settlements, cities, roads))
+    self.queue.put(("games", (gameRows, seatRows)))
+    return list(range(firstId, self.nextGameId))
+
+  def _checkWriter(self):
+    if self.error is not None:
+      raise Exception("ResultStore - the writer thread failed: " + str(self.error) + "!")
+
+  def _run(self):
+    """
+    Method: _run
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Loop of the writer thread, until close puts None in the queue.
+    ---------------------------
+    """
+    connection = sqlite3.connect(self.path)
+    connection.execute("PRAGMA synchronous=NORMAL")
+    stopping = False
+    while not stopping:
+      items = [self.queue.get()]
+      numGames = 0
+      while numGames < self.batchSize:
+        try:
+          item = self.queue.get_nowait()
+        except queue.Empty:
+          break
+        items.append(item)
+        if item is not None and item[0] == "games":
+          numGames += len(item[1][0])
+
+      flushed = []
+      try:
+        with connection:
+          for item in items:
+            if item is None:
+              stopping = True
+            elif item[0] == "run":
+              connection.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?)", item[1])
+            elif item[0] == "games":
+              gameRows, seatRows = item[1]
+              connection.executemany("INSERT INTO games VALUES (?, ?, ?, ?, ?, ?, ?)", gameRows)
+              connection.executemany("INSERT INTO seats VALUES (?, ?, ?, ?, ?, ?, ?, ?)", seatRows)
+              self.gamesWritten += len(gameRows)
+            else:
+              flushed.append(item[1])
+      except Exception as error:
+        self.error = error
+      for event in flushed:
+        event.set()
+    connection.close()
+
+  def flush(self):
+    """
+    Method: flush
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Waits until everything added so far is in the database.
+    ---------------------------
+    """
+    event = threading.Event()
+    self.queue.put(("flush", event))
+    event.wait()
+    self._checkWriter()
+
+  def query(self, sql, parameters=()):
+    """
+    Method: query
+    ---------------------------
+    Parameters:
+      sql: a SELECT statement over the runs, games and seats tables
+      parameters: the values of its placeholders
+    Returns: the list of rows it returns, as of the last transaction the
+      writer committed
+    ---------------------------
+    """
+    return self.connection.execute(sql, parameters).fetchall()
+
+  def getWinRates(self, runId=None):
+    """
+    Method: getWinRates
+    ---------------------------
+    Parameters:
+      runId: an optional run to restrict the games to
+    Returns: a dict with the (GAMES, WINS, WIN_RATE) of every agent
+    ---------------------------
+    """
+    sql = "SELECT agent, COUNT(*), SUM(won) FROM seats"
+    parameters = ()
+    if runId is not None:
+      sql += " WHERE gameId IN (SELECT id FROM games WHERE runId = ?)"
+      parameters = (runId,)
+    rows = self.query(sql + " GROUP BY agent", parameters)
+    return {agent: (games, wins, wins / float(games)) for agent, games, wins in rows}
+
+  def getPairWinRates(self, agent=None):
+    """
+    Method: getPairWinRates
+    ---------------------------
+    Parameters:
+      agent: an optional agent to restrict the pairs to
+    Returns: a dict with the (GAMES, WINS, WIN_RATE) of every (AGENT,
+      OPPONENT) pair that met in a game, the wins being AGENT's
+    ---------------------------
+    """
+    sql = ("SELECT a.agent, b.agent, COUNT(*), SUM(a.won) FROM seats a "
+           "JOIN seats b ON b.gameId = a.gameId AND b.seat != a.seat")
+    parameters = ()
+    if agent is not None:
+      sql += " WHERE a.agent = ?"
+      parameters = (agent,)
+    rows = self.query(sql + " GROUP BY a.agent, b.agent", parameters)
+    return {(a, b): (games, wins, wins / float(games)) for a, b, games, wins in rows}
+
+  def getLayoutWinRates(self, layoutHash):
+    """
+    Method: getLayoutWinRates
+    ---------------------------
+    Parameters:
+      layoutHash: the hash of a board layout
+    Returns: a dict with the number of games won by every seat on boards
+      with that layout (-1 = nobody won)
+    ---------------------------
+    """
+    return dict(self.query("SELECT winner, COUNT(*) FROM games WHERE layoutHash = ? GROUP BY winner", (layoutHash,)))
+
+  def close(self):
+    """
+    Method: close
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Writes what is still queued and stops the writer thread.
+    ---------------------------
+    """
+    if self.thread.is_alive():
+      self.queue.put(None)
+      self.thread.join()
+    if self.connection is not None:
+      self.connection.close()
+      self.connection = None
+    self._checkWriter()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    self.close()
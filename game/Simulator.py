@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from Game import *
+from Stats import BatchResult
+from OpeningBook import getOpeningBook, getLayout, getLayoutKey
+
+def _initWorker():
+  """
+  Method: _initWorker
+  ----------------------
+  Builds the board topology once in every worker process, so all the
+  games played by the worker share it.
+  ----------------------
+  """
+  getTopology()
+
+
+def _runGames(agentClasses, seeds, replayDir=None, openingBook=None, details=False):
+  """
+  Method: _runGames
+  ----------------------
+  Parameters:
+    agentClasses - the PlayerAgent subclass playing in every seat
+    seeds - the seeds of the games to play
+    replayDir - an optional directory where the replays of the games are written
+    openingBook - the optional path of an OpeningBook the agents place from
+    details - whether the layout hash of the board and the (VICTORY_POINTS,
+      SETTLEMENTS, CITIES, ROADS) of every seat are added to the results
+  Returns: a list of (SEED, WINNER, TURN_NUMBER, MARGIN) tuples, or of
+    (SEED, WINNER, TURN_NUMBER, MARGIN, LAYOUT_HASH, SEATS) with details
+
+  Plays the given games one after the other with the same agents.
+  ----------------------
+  """
+  agents = [agentClass("Player " + str(i), i) for i, agentClass in enumerate(agentClasses)]
+  if openingBook is not None:
+    book = getOpeningBook(openingBook)
+    for agent in agents:
+      agent.openingBook = book
+  replayWriter = None
+  if replayDir is not None:
+    replayWriter = ReplayWriter(os.path.join(replayDir, "games-" + str(seeds[0]) + ".ctr"))
+  engine = GameEngine(agents, replayWriter=replayWriter)
+  results = []
+  for seed in seeds:
+    for agent in agents:
+      agent.seed(seed * len(agents) + agent.agentIndex)
+    result = (seed,) + engine.run(seed)
+    if details:
+      state = engine.gameState
+      result += (getLayoutKey(getLayout(state.board), len(agents)),
+                 [(agent.victoryPoints, len(agent.settlements), len(agent.cities), len(agent.roads))
+                  for agent in state.playerAgents])
+    results.append(result)
+  if replayWriter is not None:
+    replayWriter.close()
+  return results
+
+
+def runBatch(numGames, agentClasses=None, numWorkers=None, seed=0, chunkSize=None, replayDir=None, openingBook=None,
+             resultStore=None):
+  """
+  Method: runBatch
+  ----------------------
+  Parameters:
+    numGames - the number of games to play
+    agentClasses - the PlayerAgent subclass playing in every seat
+      (four RandomAgents by default)
+    numWorkers - the number of worker processes (one per core by default,
+      1 plays every game in this process)
+    seed - the seed of the first game; game i is played with seed + i
+    chunkSize - the number of games sent to a worker at once
+    replayDir - an optional directory where the replays are written, one
+      file per chunk of games
+    openingBook - the optional path of an OpeningBook the agents take
+      their initial placements from (shared by the workers)
+    resultStore - an optional ResultStore the run and its games are
+      added to as the chunks come back
+  Returns: a BatchResult with the aggregated results
+
+  Plays a batch of games over a pool of processes.  Games are sent to the
+  workers in chunks so that the cost of talking to the workers does not
+  grow with the number of games.
+  ----------------------
+  """
+  if agentClasses is None:
+    agentClasses = [RandomAgent] * 4
+  if numWorkers is None:
+    numWorkers = os.cpu_count() or 1
+  seeds = list(range(seed, seed + numGames))
+  details = resultStore is not None
+  if details:
+    agentNames = [agentClass.__name__ for agentClass in agentClasses]
+    runId = resultStore.addRun(agentNames, {"numGames": numGames, "seed": seed, "openingBook": openingBook})
+
+  start = time.time()
+  results = []
+  if numWorkers <= 1:
+    chunkResults = _runGames(agentClasses, seeds, replayDir, openingBook, details)
+    if details:
+      resultStore.addGames(runId, agentNames, chunkResults)
+    results = [result[:4] for result in chunkResults]
+  else:
+    if chunkSize is None:
+      chunkSize = max(1, numGames // (numWorkers * 4))
+    chunks = [seeds[i:i + chunkSize] for i in range(0, numGames, chunkSize)]
+    with ProcessPoolExecutor(max_workers=numWorkers, initializer=_initWorker) as executor:
+      for chunkResults in executor.map(_runGames, [agentClasses] * len(chunks), chunks, [replayDir] * len(chunks),
+                                       [openingBook] * len(chunks), [details] * len(chunks)):
+        if details:
+          resultStore.addGames(runId, agentNames, chunkResults)
+        results.extend(result[:4] for result in chunkResults)
+
+  return BatchResult(len(agentClasses), results, time.time() - start)
+
+
+if __name__ == "__main__":
+  numGames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+  numWorkers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+  print(runBatch(numGames, numWorkers=numWorkers))
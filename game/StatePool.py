@@ -0,0 +1,258 @@
+import struct
+from multiprocessing import shared_memory
+from Game import *
+
+POOL_MAGIC = b"CTSP"
+
+# Header of the shared memory block: magic, number of slots and size of
+# the state area of every slot, padded so the slots are 8 byte aligned
+POOL_HEADER = struct.Struct("<4sII4x")
+
+class StatePool:
+  """
+  Class: StatePool
+  ---------------------------
+  A pool of GameStates in shared memory, so search workers in other
+  processes can read root positions and write back their evaluations
+  without pickling anything.  Every slot holds:
+
+    generation      uint32, even while the slot is stable, odd while the
+                    state is being written
+    evalGeneration  uint32, the generation the evaluation belongs to
+    values          float64 per player, the evaluation of the state
+    state           the state as written by GameState.toBytes (cell
+                    planes, production table and player vectors)
+
+  put returns a (slot, generation) handle, which is all a worker needs.
+  Writing or freeing a slot moves its generation on, so a handle to a
+  recycled slot is stale: reads return None and evaluations are ignored
+  instead of being mixed with another position.
+
+  The process that creates the pool owns it: only that one allocates,
+  frees and unlinks slots.  Workers attach by name (see attachStatePool).
+  ---------------------------
+  """
+
+  def __init__(self, numSlots=0, name=None, create=True, size_x=6, size_y=11):
+    """
+    Method: __init__
+    ---------------------------
+    Parameters:
+      numSlots: the number of slots of a new pool
+      name: the name of the shared memory block (a new unique one if
+        None)
+      create: False to attach to an existing pool, whose size is read
+        from its header
+      size_x, size_y: the size of the boards of a new pool
+    Returns: NA
+    ---------------------------
+    """
+    if create:
+      numCells = getTopology(size_x, size_y).numCells
+      stateSize = getStateSize(numCells, MAX_PLAYERS)
+      slotType = self.getSlotType(stateSize)
+      self.memory = shared_memory.SharedMemory(name=name, create=True, size=POOL_HEADER.size + numSlots * slotType.itemsize)
+      POOL_HEADER.pack_into(self.memory.buf, 0, POOL_MAGIC, numSlots, stateSize)
+    else:
+      self.memory = shared_memory.SharedMemory(name=name)
+      magic, numSlots, stateSize = POOL_HEADER.unpack_from(self.memory.buf, 0)
+      if magic != POOL_MAGIC:
+        raise Exception("StatePool - " + str(name) + " is not a state pool!")
+      slotType = self.getSlotType(stateSize)
+
+    self.name = self.memory.name
+    self.owner = create
+    self.numSlots = numSlots
+    self.stateSize = stateSize
+    self.slots = np.ndarray(numSlots, dtype=slotType, buffer=self.memory.buf, offset=POOL_HEADER.size)
+    self.generations = self.slots["generation"]
+    self.evalGenerations = self.slots["evalGeneration"]
+    self.values = self.slots["values"]
+    self.states = self.slots["state"]
+
+    # Free slots, lowest first (only used by the owner)
+    self.freeSlots = list(range(numSlots - 1, -1, -1))
+    self.staleReads = 0
+
+
+  @staticmethod
+  def getSlotType(stateSize):
+    return np.dtype([("generation", "<u4"), ("evalGeneration", "<u4"),
+                     ("values", "<f8", (MAX_PLAYERS,)), ("state", "u1", (stateSize,))], align=True)
+
+
+  def allocate(self):
+    """
+    Method: allocate
+    ---------------------------
+    Parameters: NA
+    Returns: the index of a free slot
+    ---------------------------
+    """
+    if not self.owner:
+      raise Exception("allocate - only the process that created the pool can allocate slots!")
+    if not self.freeSlots:
+      raise Exception("allocate - all " + str(self.numSlots) + " slots of the pool are in use!")
+    return self.freeSlots.pop()
+
+
+  def free(self, slot):
+    """
+    Method: free
+    ---------------------------
+    Parameters:
+      slot: a slot returned by allocate or put
+    Returns: NA
+
+    Recycles the slot.  Handles to it become stale.
+    ---------------------------
+    """
+    if not self.owner:
+      raise Exception("free - only the process that created the pool can free slots!")
+    self.generations[slot] += 2
+    self.freeSlots.append(slot)
+
+
+  def put(self, state, slot=None):
+    """
+    Method: put
+    ---------------------------
+    Parameters:
+      state: the GameState to write
+      slot: the slot to write it to (a newly allocated one if None)
+    Returns: the (slot, generation) handle of the written state
+
+    The previous evaluation of the slot is dropped.
+    ---------------------------
+    """
+    if slot is None:
+      slot = self.allocate()
+    data = state.toBytes()
+    if len(data) > self.stateSize:
+      raise Exception("put - the state does not fit in a slot of the pool!")
+
+    generation = int(self.generations[slot])
+    self.generations[slot] = generation + 1
+    self.states[slot, :len(data)] = np.frombuffer(data, dtype=np.uint8)
+    self.generations[slot] = generation + 2
+    return (slot, generation + 2)
+
+
+  def getBytes(self, slot, generation):
+    """
+    Method: getBytes
+    ---------------------------
+    Parameters:
+      slot, generation: a handle returned by put
+    Returns: a copy of the serialized state, or None if the slot was
+      recycled or is being written
+    ---------------------------
+    """
+    if self.generations[slot] != generation:
+      self.staleReads += 1
+      return None
+    data = self.states[slot].tobytes()
+    if self.generations[slot] != generation:
+      self.staleReads += 1
+      return None
+    return data
+
+
+  def getState(self, slot, generation, boardClass=Board, seed=None):
+    """
+    Method: getState
+    ---------------------------
+    Parameters:
+      slot, generation: a handle returned by put
+      boardClass: the Board class (e.g. ArrayBoard) of the new state
+      seed: an optional seed (or NumPy Generator) for the dice of the
+        new state
+    Returns: a new GameState (see GameState.fromBytes), or None if the
+      handle is stale
+    ---------------------------
+    """
+    data = self.getBytes(slot, generation)
+    if data is None:
+      return None
+    return GameState.fromBytes(data, boardClass, seed)
+
+
+  def putEvaluation(self, slot, generation, values):
+    """
+    Method: putEvaluation
+    ---------------------------
+    Parameters:
+      slot, generation: a handle returned by put
+      values: the value of the state for every player
+    Returns: True if the evaluation was written, False if the handle is
+      stale
+
+    A slot holds a single evaluation; the last one written is kept.
+    ---------------------------
+    """
+    if self.generations[slot] != generation:
+      return False
+    self.evalGenerations[slot] = 0
+    self.values[slot, :len(values)] = values
+    self.evalGenerations[slot] = generation
+    return bool(self.generations[slot] == generation)
+
+
+  def getEvaluation(self, slot, generation):
+    """
+    Method: getEvaluation
+    ---------------------------
+    Parameters:
+      slot, generation: a handle returned by put
+    Returns: a copy of the values written for the state, or None if there
+      are none yet or the handle is stale
+    ---------------------------
+    """
+    if self.evalGenerations[slot] != generation or self.generations[slot] != generation:
+      return None
+    values = self.values[slot].copy()
+    if self.evalGenerations[slot] != generation:
+      return None
+    return values
+
+
+  def close(self):
+    """
+    Method: close
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Detaches from the shared memory.  The owner also unlinks it, so the
+    pool should be closed by the workers first.
+    ---------------------------
+    """
+    if self.memory is None:
+      return
+    self.slots = self.generations = self.evalGenerations = self.values = self.states = None
+    self.memory.close()
+    if self.owner:
+      self.memory.unlink()
+    self.memory = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    self.close()
+
+
+_attachedPools = {}
+
+def attachStatePool(name):
+  """
+  Method: attachStatePool
+  ---------------------------
+  Parameters:
+    name: the name of a StatePool created by another process
+  Returns: the pool, attached once per process and reused after that
+  ---------------------------
+  """
+  if name not in _attachedPools:
+    _attachedPools[name] = StatePool(name=name, create=False)
+  return _attachedPools[name]
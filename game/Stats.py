@@ -0,0 +1,124 @@
+from collections import Counter
+
+class BatchResult:
+  """
+  Class: BatchResult
+  ------------------------
+  Aggregated results of a batch of games: wins and win rate of every seat,
+  a histogram of the number of turns the games lasted, the victory point
+  margins of the winners and how many games were played per second.
+
+  Instance Variables:
+  ---
+  results = the list of (SEED, WINNER, TURN_NUMBER, MARGIN) tuples of every game
+  wins = a Counter with the number of games won by each seat (-1 = nobody won)
+  turnHistogram = a Counter with the number of games that lasted each number of turns
+  margins = a list with the margin of every game that had a winner
+  elapsed = the wall-clock seconds the batch took
+  ------------------------
+  """
+
+  def __init__(self, numPlayers, results, elapsed):
+    self.numPlayers = numPlayers
+    self.results = results
+    self.elapsed = elapsed
+
+    self.wins = Counter()
+    self.turnHistogram = Counter()
+    self.margins = []
+    for seed, winner, turnNumber, margin in results:
+      self.wins[winner] += 1
+      self.turnHistogram[turnNumber] += 1
+      if winner >= 0:
+        self.margins.append(margin)
+
+  def getNumGames(self):
+    return len(self.results)
+
+  def getWinRates(self):
+    """
+    Method: getWinRates
+    ----------------------
+    Parameters: NA
+    Returns: a list with the fraction of games won by every seat
+    ----------------------
+    """
+    numGames = max(self.getNumGames(), 1)
+    return [self.wins[seat] / float(numGames) for seat in range(self.numPlayers)]
+
+  def getGamesPerSecond(self):
+    return self.getNumGames() / self.elapsed if self.elapsed > 0 else 0.0
+
+  def getAverageMargin(self):
+    return sum(self.margins) / float(len(self.margins)) if self.margins else 0.0
+
+  def getTurnHistogram(self, binSize=25):
+    """
+    Method: getTurnHistogram
+    ----------------------
+    Parameters:
+      binSize - the number of turns grouped in every bin
+    Returns: a sorted list of (FIRST_TURN_OF_BIN, NUMBER_OF_GAMES) tuples
+    ----------------------
+    """
+    bins = Counter()
+    for turnNumber, count in self.turnHistogram.items():
+      bins[(turnNumber // binSize) * binSize] += count
+    return sorted(bins.items())
+
+  def __repr__(self):
+    s = "---------- BATCH OF " + str(self.getNumGames()) + " GAMES ----------\n"
+    s += "Games per second: " + "%.1f" % self.getGamesPerSecond() + "\n"
+    for seat, winRate in enumerate(self.getWinRates()):
+      s += "Seat " + str(seat) + " win rate: " + "%.3f" % winRate + "\n"
+    s += "No winner (cutoff): " + str(self.wins[-1]) + "\n"
+    s += "Average margin: " + "%.2f" % self.getAverageMargin() + "\n"
+    s += "Turns:\n"
+    for firstTurn, count in self.getTurnHistogram():
+      s += "  " + str(firstTurn).rjust(4) + "+ " + str(count) + "\n"
+    return s
+
+
+class LatencyStats:
+  """
+  Class: LatencyStats
+  ---------------------
+  Running count, mean and maximum of a latency, plus the last
+  maxSamples samples for the percentiles.
+  ---------------------
+  """
+
+  def __init__(self, maxSamples=1024):
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+    self.maxSamples = maxSamples
+    self.samples = []
+
+  def add(self, seconds):
+    self.count += 1
+    self.total += seconds
+    self.max = max(self.max, seconds)
+    if len(self.samples) < self.maxSamples:
+      self.samples.append(seconds)
+    else:
+      self.samples[self.count % self.maxSamples] = seconds
+
+  def getStats(self):
+    """
+    Method: getStats
+    ---------------------
+    Parameters: NA
+    Returns: a dict with the count and the mean, median, 95th percentile
+      and maximum latency in milliseconds
+    ---------------------
+    """
+    samples = sorted(self.samples)
+    percentile = lambda fraction: 1000 * samples[min(int(fraction * len(samples)), len(samples) - 1)] if samples else 0.0
+    return {
+      "count": self.count,
+      "meanMs": 1000 * self.total / self.count if self.count else 0.0,
+      "p50Ms": percentile(0.5),
+      "p95Ms": percentile(0.95),
+      "maxMs": 1000 * self.max
+    }
@@ -0,0 +1,156 @@
+from GameConstants import *
+
+# Classification of the cells of the grid
+CellTypes = {
+  "WATER": 0,
+  "COAST": 1,
+  "INLAND": 2
+}
+
+class BoardTopology:
+  """
+  Class: BoardTopology
+  ---------------------------
+  A BoardTopology holds everything about the board that never changes
+  during a game: which cells are water, which hexagons surround each cell
+  and which cells are neighbors of each other.  Cells are identified by
+  an integer id (x * size_y + y), so a tile at (x, y) and its neighbors can
+  be looked up without building any objects.
+
+  Topologies are built once per board geometry and shared by every Board
+  of that size (see getTopology).
+  ---------------------------
+  """
+
+  def __init__(self, size_x=6, size_y=11):
+    self.size_x = size_x
+    self.size_y = size_y
+    self.numCells = size_x * size_y
+
+    # Water mask and land cells
+    self.waterMask = tuple((x, y) in WATER_TILES for x in range(size_x) for y in range(size_y))
+    self.landCells = tuple(cell for cell in range(self.numCells) if not self.waterMask[cell])
+
+    # Cells of every hexagon and hexagons of every cell
+    self.hexagonCells = tuple(tuple(self.getCellId(x, y) for (x, y) in tiles) for tiles in HEXAGON_TILES)
+    cellHexagons = [[] for _ in range(self.numCells)]
+    for hexagonid, cells in enumerate(self.hexagonCells):
+      for cell in cells:
+        cellHexagons[cell].append(hexagonid)
+    self.cellHexagons = tuple(tuple(hexagonids) for hexagonids in cellHexagons)
+
+    # Coordinates of every cell
+    self.cellCoordinates = tuple(divmod(cell, size_y) for cell in range(self.numCells))
+
+    # Coastal cells touch less than 3 hexagons, inland cells touch 3
+    self.cellTypes = tuple(
+      CellTypes["WATER"] if self.waterMask[cell] else
+      CellTypes["INLAND"] if len(self.cellHexagons[cell]) == 3 else
+      CellTypes["COAST"]
+      for cell in range(self.numCells))
+
+    # Neighbor lists, with and without diagonals
+    self.orthogonalNeighbors = tuple(self._computeNeighbors(cell, False) for cell in range(self.numCells))
+    self.diagonalNeighbors = tuple(self._computeNeighbors(cell, True) for cell in range(self.numCells))
+
+    # Orthogonal links between cells (the edges of the board)
+    self.edges = tuple(sorted(set(
+      (min(cell, neighbor), max(cell, neighbor))
+      for cell in self.landCells for neighbor in self.orthogonalNeighbors[cell])))
+
+
+  """
+  Method: getCellId
+  ---------------------------
+  Parameters:
+    x: the x coordinate of the cell
+    y: the y coordinate of the cell
+  Returns: the id of the cell at (x, y), or -1 if the coordinates are out of bounds
+  ---------------------------
+  """
+  def getCellId(self, x, y):
+    if 0 <= x < self.size_x and 0 <= y < self.size_y:
+      return x * self.size_y + y
+    return -1
+
+
+  """
+  Method: getCoordinates
+  ---------------------------
+  Parameters:
+    cell: the id of a cell
+  Returns: the (x, y) coordinates of that cell
+  ---------------------------
+  """
+  def getCoordinates(self, cell):
+    return divmod(cell, self.size_y)
+
+
+  """
+  Method: getNeighbors
+  ---------------------------
+  Parameters:
+    cell: the id of a cell
+    diagonals: whether or not diagonal neighbors are included
+  Returns: a tuple with the ids of the neighbors of that cell
+  ---------------------------
+  """
+  def getNeighbors(self, cell, diagonals=False):
+    if diagonals:
+      return self.diagonalNeighbors[cell]
+    return self.orthogonalNeighbors[cell]
+
+
+  """
+  Method: _computeNeighbors
+  ---------------------------
+  Parameters:
+    cell: the id of a cell
+    diagonals: whether or not diagonal neighbors are included
+  Returns: a tuple with the ids of the neighbors of that cell
+
+  Walks the 3x3 square around the cell, skipping out of bounds cells,
+  water and the false neighbors of the even rows.  Only used while
+  building the topology.
+  ---------------------------
+  """
+  def _computeNeighbors(self, cell, diagonals):
+    x, y = self.getCoordinates(cell)
+    neighbors = []
+    for dx in range(-1, 2):
+      for dy in range(-1, 2):
+
+        # Ignore the original cell
+        if dx == 0 and dy == 0: continue
+
+        # Optionally ignore diagonals
+        if not diagonals and (dx != 0 and dy != 0): continue
+
+        neighbor = self.getCellId(x + dx, y + dy)
+        if neighbor < 0: continue
+
+        # Remove water and false neighbors
+        if self.waterMask[neighbor]: continue
+        if x % 2 == 0 and (y + dy) % 2 == 1: continue
+        neighbors.append(neighbor)
+
+    return tuple(neighbors)
+
+
+_topologies = {}
+
+def getTopology(size_x=6, size_y=11):
+  """
+  Method: getTopology
+  ---------------------------
+  Parameters:
+    size_x: the number of rows of the board
+    size_y: the number of columns of the board
+  Returns: the shared BoardTopology for a board of that size, built
+    the first time it is requested
+  ---------------------------
+  """
+  key = (size_x, size_y)
+  if key not in _topologies:
+    _topologies[key] = BoardTopology(size_x, size_y)
+  return _topologies[key]
@@ -0,0 +1,138 @@
+import numpy as np
+from GameConstants import *
+
+# What the stored value is with respect to the real value of the position
+BoundTypes = {
+  "EXACT": 0,
+  "LOWER": 1,
+  "UPPER": 2
+}
+
+class TranspositionTable:
+  """
+  Class: TranspositionTable
+  ---------------------------
+  A fixed-size table mapping GameState hashes to search results
+  (value, depth, bound type and best move).  Every hash has a single
+  slot (the low bits of the hash); a new entry replaces the one in its
+  slot when that entry comes from an older search or was searched to
+  a depth that is not deeper than the new one.
+
+  The memory is allocated up front: 2^sizeBits entries of 23 bytes.
+  Moves are stored as integers chosen by the caller (-1 for none).
+  ---------------------------
+  """
+
+  def __init__(self, sizeBits=20):
+    self.size = 1 << sizeBits
+    self.mask = self.size - 1
+
+    self.keys = np.zeros(self.size, dtype=np.uint64)
+    self.values = np.zeros(self.size, dtype=np.float64)
+    self.moves = np.full(self.size, -1, dtype=np.int32)
+    self.depths = np.full(self.size, -1, dtype=np.int8)
+    self.bounds = np.zeros(self.size, dtype=np.int8)
+    self.ages = np.zeros(self.size, dtype=np.uint8)
+
+    self.age = 0
+    self.hits = 0
+    self.misses = 0
+    self.stores = 0
+    self.replacements = 0
+
+
+  def newSearch(self):
+    """
+    Method: newSearch
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Starts a new search.  Entries stored by previous searches are
+    replaced first.
+    ---------------------------
+    """
+    self.age = (self.age + 1) & 0xFF
+
+
+  def probe(self, key):
+    """
+    Method: probe
+    ---------------------------
+    Parameters:
+      key: the hash of the position
+    Returns: a (VALUE, DEPTH, BOUND, MOVE) tuple if the position is in
+      the table, or None otherwise
+    ---------------------------
+    """
+    slot = key & self.mask
+    if self.depths[slot] >= 0 and self.keys[slot] == key:
+      self.hits += 1
+      return (float(self.values[slot]), int(self.depths[slot]), int(self.bounds[slot]), int(self.moves[slot]))
+    self.misses += 1
+    return None
+
+
+  def store(self, key, depth, value, bound=BoundTypes["EXACT"], move=-1):
+    """
+    Method: store
+    ---------------------------
+    Parameters:
+      key: the hash of the position
+      depth: the depth the position was searched to
+      value: the value found by the search
+      bound: whether the value is exact or a lower/upper bound
+      move: the best move found, encoded as an integer
+    Returns: True/False depending on whether or not the entry was stored
+    ---------------------------
+    """
+    slot = key & self.mask
+    storedDepth = self.depths[slot]
+    if storedDepth >= 0 and self.keys[slot] != key:
+      if self.ages[slot] == self.age and depth < storedDepth:
+        return False
+      self.replacements += 1
+
+    self.keys[slot] = key
+    self.values[slot] = value
+    self.depths[slot] = depth
+    self.bounds[slot] = bound
+    self.moves[slot] = move
+    self.ages[slot] = self.age
+    self.stores += 1
+    return True
+
+
+  def clear(self):
+    """
+    Method: clear
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Empties the table and resets the counters.
+    ---------------------------
+    """
+    self.depths[:] = -1
+    self.age = 0
+    self.hits = self.misses = self.stores = self.replacements = 0
+
+
+  def getStats(self):
+    """
+    Method: getStats
+    ---------------------------
+    Parameters: NA
+    Returns: a dict with the hit/miss counters, the hit rate and the
+      fraction of the table in use
+    ---------------------------
+    """
+    probes = self.hits + self.misses
+    return {
+      "hits": self.hits,
+      "misses": self.misses,
+      "hitRate": self.hits / probes if probes else 0.0,
+      "stores": self.stores,
+      "replacements": self.replacements,
+      "fill": float(np.count_nonzero(self.depths >= 0)) / self.size
+    }
@@ -0,0 +1,309 @@
+import numpy as np
+from GameConstants import *
+from Topology import getTopology
+from ActionSpace import getActionSpace
+from Agents import getAffordabilityMask
+
+class VectorCatanEnv:
+  """
+  Class: VectorCatanEnv
+  ---------------------------
+  K games of Catan stored as stacked arrays and stepped in lockstep, for
+  reinforcement learning.  Every step takes one action per game (an
+  integer in the action space below), and the dice rolls, the resource
+  distribution (through per-game production tables, as Board keeps them),
+  the affordability checks and the masks of legal actions are computed
+  for all the games at once with NumPy.
+
+  The rules are the ones of GameEngine: the initial pieces come from
+  LAYOUT, every turn the dice are rolled, resources are handed out and the
+  current player takes a single action (or passes), and a game ends when
+  a player reaches VICTORY_POINTS_TO_WIN or after CUTOFF_TURNS turns.
+  Games that end are reset automatically.
+
+  Actions are the integer ids of the ActionSpace of the board, and
+  actionMask has the same layout as GameState.getLegalActionMask.
+  ---------------------------
+  """
+
+  def __init__(self, numEnvs, numPlayers=4, seed=None):
+    self.numEnvs = numEnvs
+    self.numPlayers = numPlayers
+    self.topology = getTopology()
+    self.numCells = self.topology.numCells
+    self.numHexagons = len(self.topology.hexagonCells)
+    self.actionSpace = getActionSpace()
+    self.numActions = self.actionSpace.numActions
+    self.passAction = self.actionSpace.passAction
+    self.rng = np.random.default_rng(seed)
+
+    # adjacency[a, b] is 1 if b is an orthogonal neighbor of a (as in Board.getNeighborTiles)
+    self.adjacency = np.zeros((self.numCells, self.numCells), dtype=np.float32)
+    for cell in range(self.numCells):
+      for neighbor in self.topology.orthogonalNeighbors[cell]:
+        self.adjacency[cell, neighbor] = 1
+    self.adjacencyT = np.ascontiguousarray(self.adjacency.T)
+
+    # Hexagons of every cell, padded with -1
+    self.cellHexagons = np.full((self.numCells, 3), -1, dtype=np.int64)
+    for cell, hexagonids in enumerate(self.topology.cellHexagons):
+      self.cellHexagons[cell, :len(hexagonids)] = hexagonids
+
+    # Initial settlements and roads of every player
+    self.layoutSettlements = np.array([[self.topology.getCellId(*LAYOUT[i][p][0]) for i in range(NUM_INITIAL_SETTLEMENTS)]
+                                       for p in range(numPlayers)], dtype=np.int64)
+    self.layoutRoads = np.array([[self.topology.getCellId(*LAYOUT[i][p][1]) for i in range(NUM_INITIAL_SETTLEMENTS)]
+                                 for p in range(numPlayers)], dtype=np.int64)
+
+    # Victory points and structure added by every build action, in BUILD_ACTIONS order
+    self.actionPoints = np.array([SETTLEMENT_VICTORY_POINTS, CITY_VICTORY_POINTS, 0], dtype=np.int32)
+    self.actionStructures = np.array([Structure["SETTLEMENT"], Structure["CITY"], Structure["ROAD"]], dtype=np.int8)
+
+    # State of the games
+    K = numEnvs
+    self.structure = np.full((K, self.numCells), Structure["NONE"], dtype=np.int8)
+    self.owner = np.full((K, self.numCells), -1, dtype=np.int8)
+    self.resources = np.zeros((K, numPlayers, NUM_RESOURCES), dtype=np.int32)
+    self.victoryPoints = np.zeros((K, numPlayers), dtype=np.int32)
+    self.hexResources = np.zeros((K, self.numHexagons), dtype=np.int8)
+    self.hexNumbers = np.zeros((K, self.numHexagons), dtype=np.int8)
+    self.production = np.zeros((K, MAX_ROLL - MIN_ROLL + 1, numPlayers, NUM_RESOURCES), dtype=np.int32)
+    self.currentPlayer = np.zeros(K, dtype=np.int64)
+    self.turnNumber = np.zeros(K, dtype=np.int64)
+    self.diceRolls = np.zeros(K, dtype=np.int64)
+    self.actionMask = np.zeros((K, self.numActions), dtype=bool)
+
+    self.envIndices = np.arange(K)
+
+
+  def reset(self, envs=None):
+    """
+    Method: reset
+    ---------------------------
+    Parameters:
+      envs: an optional array with the indices of the games to reset
+        (all of them by default)
+    Returns: the observation dict (see getObservation)
+
+    Starts new games: shuffles the hexagons, places the initial pieces
+    from LAYOUT, hands out the initial resources and rolls the dice for
+    the first turn.
+    ---------------------------
+    """
+    if envs is None:
+      envs = self.envIndices
+    self._resetEnvs(envs)
+    self._beginTurn(envs)
+    self._updateActionMask()
+    return self.getObservation()
+
+
+  def _resetEnvs(self, envs):
+    n = len(envs)
+    if n == 0: return
+
+    # Shuffle the hexagons as createHexagons does: the desert is in the middle
+    # and the last hexagon takes the 10th resource and number
+    resources = self.rng.permuted(np.tile(np.array([4,4,4,4,1,1,1,1,3,3,3,3,2,2,2,0,0,0], dtype=np.int8), (n, 1)), axis=1)
+    numbers = self.rng.permuted(np.tile(np.array([2,3,3,4,4,5,5,5,6,6,8,8,9,9,10,10,11,11,12], dtype=np.int8), (n, 1)), axis=1)
+    order = list(range(9)) + [0] + list(range(10, 18)) + [9]
+    self.hexResources[envs] = resources[:, order]
+    self.hexNumbers[envs] = numbers[:, order]
+    self.hexResources[envs, 9] = -1
+    self.hexNumbers[envs, 9] = 7
+
+    self.structure[envs] = Structure["NONE"]
+    self.owner[envs] = -1
+    self.resources[envs] = 0
+    self.victoryPoints[envs] = 0
+    self.production[envs] = 0
+
+    players = np.repeat(np.arange(self.numPlayers), NUM_INITIAL_SETTLEMENTS)
+    settlements = self.layoutSettlements.reshape(-1)
+    roads = self.layoutRoads.reshape(-1)
+    self.structure[envs[:, None], settlements] = Structure["SETTLEMENT"]
+    self.owner[envs[:, None], settlements] = players
+    self.structure[envs[:, None], roads] = Structure["ROAD"]
+    self.owner[envs[:, None], roads] = players
+
+    # Production of the initial settlements, and one of each surrounding resource
+    pieceEnvs = np.repeat(envs, len(settlements))
+    self._addProduction(pieceEnvs, np.tile(settlements, n), np.tile(players, n), collect=True)
+
+    self.currentPlayer[envs] = 0
+    self.turnNumber[envs] = 1 + self.numPlayers * NUM_INITIAL_SETTLEMENTS
+
+
+  def _addProduction(self, envs, cells, players, collect=False):
+    """
+    Method: _addProduction
+    ---------------------------
+    Parameters:
+      envs, cells, players: arrays with the game, cell and player of every
+        settlement built or upgraded
+      collect: whether the players also receive one of each resource
+        surrounding the settlement (for the initial settlements)
+    Returns: NA
+    ---------------------------
+    """
+    hexagons = self.cellHexagons[cells]
+    envs = np.repeat(envs, 3)
+    players = np.repeat(players, 3)
+    hexagons = hexagons.reshape(-1)
+    valid = hexagons >= 0
+    envs, players, hexagons = envs[valid], players[valid], hexagons[valid]
+    resources = self.hexResources[envs, hexagons].astype(np.int64)
+    numbers = self.hexNumbers[envs, hexagons].astype(np.int64)
+    land = resources >= 0
+    envs, players, resources, numbers = envs[land], players[land], resources[land], numbers[land]
+    np.add.at(self.production, (envs, numbers - MIN_ROLL, players, resources), 1)
+    if collect:
+      np.add.at(self.resources, (envs, players, resources), 1)
+
+
+  def _beginTurn(self, envs):
+    # Roll the dice and hand out the resources of every player at once
+    rolls = self.rng.integers(1, 7, size=(len(envs), 2)).sum(axis=1)
+    self.diceRolls[envs] = rolls
+    self.resources[envs] += self.production[envs, rolls - MIN_ROLL]
+
+
+  def _updateActionMask(self):
+    """
+    Method: _updateActionMask
+    ---------------------------
+    Parameters: NA
+    Returns: NA
+
+    Computes the legal actions of the current player of every game, with
+    the same rules as GameState.getLegalActions.
+    ---------------------------
+    """
+    K, C = self.numEnvs, self.numCells
+    player = self.currentPlayer[:, None]
+    occupied = self.structure != Structure["NONE"]
+    settlements = self.structure == Structure["SETTLEMENT"]
+    own = (self.owner == player) & occupied
+    ownRoads = own & (self.structure == Structure["ROAD"])
+
+    affordable = getAffordabilityMask(self.resources[self.envIndices, self.currentPlayer])
+    free = ~occupied
+
+    # Roads next to any of the player's pieces
+    roads = ((own.astype(np.float32) @ self.adjacency) > 0) & free
+
+    # Settlements at the end of the player's roads, not next to another
+    # settlement nor next to a piece that is next to a settlement
+    nearSettlement = (settlements.astype(np.float32) @ self.adjacencyT) > 0
+    blocked = occupied & nearSettlement
+    valid = ~(nearSettlement | ((blocked.astype(np.float32) @ self.adjacencyT) > 0))
+    settles = ((ownRoads.astype(np.float32) @ self.adjacency) > 0) & free & valid
+
+    cities = own & settlements
+
+    mask = self.actionMask
+    mask[:, (Actions["SETTLE"] - 1) * C:Actions["SETTLE"] * C] = settles & affordable[:, Actions["SETTLE"] - 1, None]
+    mask[:, (Actions["CITY"] - 1) * C:Actions["CITY"] * C] = cities & affordable[:, Actions["CITY"] - 1, None]
+    mask[:, (Actions["ROAD"] - 1) * C:Actions["ROAD"] * C] = roads & affordable[:, Actions["ROAD"] - 1, None]
+    mask[:, self.passAction] = True
+
+
+  def step(self, actions):
+    """
+    Method: step
+    ---------------------------
+    Parameters:
+      actions: an integer array with the action of the current player of
+        every game
+    Returns: an (OBSERVATION, REWARDS, DONES, INFO) tuple
+      OBSERVATION: the observation dict of the next turn (see getObservation)
+      REWARDS: a [K, numPlayers] array, 1 for the winner of a game that
+        just ended and 0 otherwise
+      DONES: a boolean array marking the games that ended (and were reset)
+      INFO: a dict with the "results" (WINNER, TURN_NUMBER, MARGIN) of the
+        games that ended, as an array of shape [K, 3]
+
+    Applies the actions, ends the turns and starts the next ones.
+    ---------------------------
+    """
+    actions = np.asarray(actions, dtype=np.int64)
+    if not self.actionMask[self.envIndices, actions].all():
+      raise Exception("Illegal action for game(s) " + str(np.flatnonzero(~self.actionMask[self.envIndices, actions])))
+
+    # Build actions (everything but passing)
+    builds = np.flatnonzero(actions != self.passAction)
+    if len(builds) > 0:
+      actionRows = actions[builds] // self.numCells
+      cells = actions[builds] % self.numCells
+      players = self.currentPlayer[builds]
+      self.structure[builds, cells] = self.actionStructures[actionRows]
+      self.owner[builds, cells] = players
+      self.resources[builds, players] -= COST_MATRIX[actionRows]
+      self.victoryPoints[builds, players] += self.actionPoints[actionRows]
+      settled = actionRows != Actions["ROAD"] - 1
+      self._addProduction(builds[settled], cells[settled], players[settled])
+
+    # Next player/turn
+    self.currentPlayer = (self.currentPlayer + 1) % self.numPlayers
+    self.turnNumber += 1
+
+    maxPoints = self.victoryPoints.max(axis=1)
+    won = maxPoints >= VICTORY_POINTS_TO_WIN
+    dones = won | (self.turnNumber > CUTOFF_TURNS)
+    rewards = np.zeros((self.numEnvs, self.numPlayers), dtype=np.float32)
+    results = np.full((self.numEnvs, 3), -1, dtype=np.int64)
+
+    finished = np.flatnonzero(dones)
+    if len(finished) > 0:
+      points = self.victoryPoints[finished]
+      winners = np.where(won[finished], points.argmax(axis=1), -1)
+      ranked = np.sort(points, axis=1)
+      results[finished, 0] = winners
+      results[finished, 1] = self.turnNumber[finished]
+      results[finished, 2] = np.where(winners >= 0, ranked[:, -1] - ranked[:, -2], -1)
+      winning = finished[winners >= 0]
+      rewards[winning, winners[winners >= 0]] = 1.0
+      self._resetEnvs(finished)
+
+    self._beginTurn(self.envIndices)
+    self._updateActionMask()
+    return (self.getObservation(), rewards, dones, {"results": results})
+
+
+  def getObservation(self):
+    """
+    Method: getObservation
+    ---------------------------
+    Parameters: NA
+    Returns: a dict with the arrays of the state of every game (structure,
+      owner, resources, victoryPoints, hexResources, hexNumbers,
+      currentPlayer, diceRolls, turnNumber and actionMask).  They are the
+      environment's own buffers, so they must be copied to keep them past
+      the next step
+    ---------------------------
+    """
+    return {
+      "structure": self.structure,
+      "owner": self.owner,
+      "resources": self.resources,
+      "victoryPoints": self.victoryPoints,
+      "hexResources": self.hexResources,
+      "hexNumbers": self.hexNumbers,
+      "currentPlayer": self.currentPlayer,
+      "diceRolls": self.diceRolls,
+      "turnNumber": self.turnNumber,
+      "actionMask": self.actionMask
+    }
+
+
+  def sampleActions(self):
+    """
+    Method: sampleActions
+    ---------------------------
+    Parameters: NA
+    Returns: an array with a random legal action for every game
+    ---------------------------
+    """
+    scores = self.rng.random(self.actionMask.shape)
+    scores[~self.actionMask] = -1
+    return scores.argmax(axis=1)
@@ -0,0 +1,69 @@
+import random
+import numpy as np
+from GameConstants import *
+from Topology import getTopology
+
+# Hashes are 64 bit integers
+HASH_MASK = (1 << 64) - 1
+
+# The keys are drawn from a fixed seed so every process builds the same ones
+_keyGenerator = random.Random(0x5A0B1257)
+
+def _randomKey():
+  return _keyGenerator.getrandbits(64)
+
+NUM_HASHED_CELLS = getTopology().numCells
+
+# Keys XORed in and out as pieces are placed: STRUCTURE_KEYS[cell][structure][player]
+STRUCTURE_KEYS = [[[_randomKey() for player in range(MAX_PLAYERS)]
+                   for structure in (Structure["ROAD"], Structure["SETTLEMENT"], Structure["CITY"])]
+                  for cell in range(NUM_HASHED_CELLS)]
+
+# Keys added once per unit: RESOURCE_KEYS[player][resource] and VICTORY_POINT_KEYS[player].
+# Counts have no upper bound, so they are mixed in additively (mod 2^64)
+RESOURCE_KEYS = [[_randomKey() for resource in range(NUM_RESOURCES)] for player in range(MAX_PLAYERS)]
+VICTORY_POINT_KEYS = [_randomKey() for player in range(MAX_PLAYERS)]
+
+# Keys for the player to move
+SIDE_TO_MOVE_KEYS = [_randomKey() for player in range(MAX_PLAYERS)]
+
+# The structure keys as an array, to hash whole boards at once:
+# STRUCTURE_KEY_ARRAY[cell, structure, player], with zero keys for
+# Structure["NONE"]
+STRUCTURE_KEY_ARRAY = np.array([keys + [[0] * MAX_PLAYERS] for keys in STRUCTURE_KEYS], dtype=np.uint64)
+
+
+def hashPlayer(agentIndex, resources, victoryPoints):
+  """
+  Method: hashPlayer
+  ---------------------------
+  Parameters:
+    agentIndex: the index of the player
+    resources: the amount of each resource the player has
+    victoryPoints: the victory points of the player
+  Returns: the hash of the player's resources and victory points, as
+    PlayerAgent keeps it up to date incrementally
+  ---------------------------
+  """
+  h = int(victoryPoints) * VICTORY_POINT_KEYS[agentIndex]
+  for resource in range(NUM_RESOURCES):
+    h += int(resources[resource]) * RESOURCE_KEYS[agentIndex][resource]
+  return h & HASH_MASK
+
+
+def hashBoard(board):
+  """
+  Method: hashBoard
+  ---------------------------
+  Parameters:
+    board: a Board (or ArrayBoard)
+  Returns: the hash of the structures built on the board, as the board
+    keeps it up to date incrementally
+  ---------------------------
+  """
+  h = 0
+  for cell in board.topology.landCells:
+    tile = board.getTileById(cell)
+    if tile.structure != Structure["NONE"]:
+      h ^= STRUCTURE_KEYS[cell][tile.structure][tile.player]
+  return h
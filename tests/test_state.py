@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from Game import *
+from ArrayBoard import ArrayBoard
+
+BOARD_CLASSES = [Board, ArrayBoard]
+
+def playGame(boardClass, seed, maxSteps=80):
+  """
+  Plays a seeded game between RandomAgents and returns the states it went
+  through, copied.
+  """
+  agents = [RandomAgent("Random " + str(i), i, seed * 10 + i) for i in range(4)]
+  engine = GameEngine(agents, boardClass(rng=np.random.default_rng(seed)))
+  engine.reset(seed)
+  states = []
+  while not engine.isOver() and len(states) < maxSteps:
+    states.append(engine.gameState.deepCopy())
+    engine.step(engine.getCurrentAgent().getAction(engine.gameState))
+  return states
+
+def snapshot(state):
+  """
+  Everything makeMove changes, in comparable form.
+  """
+  return (state.getHash(), state.board.hash, state.currentAgentIndex, state.board.getCells(),
+          state.board.production.tolist(),
+          [([tile.id for tile in agent.roads], [tile.id for tile in agent.settlements],
+            [tile.id for tile in agent.cities], agent.resources.tolist(), agent.victoryPoints, agent.hash)
+           for agent in state.playerAgents])
+
+def legalActions(state):
+  # Decoded piece lists are in cell order, so the actions may come in another order
+  return sorted((int(action[0]), action[1].id) for action in state.getLegalActions(state.currentAgentIndex))
+
+
+@pytest.mark.parametrize("boardClass", BOARD_CLASSES)
+def testUnmakeMoveRestoresState(boardClass):
+  checked = 0
+  for seed in range(3):
+    for state in playGame(boardClass, seed):
+      before = snapshot(state)
+      agentIndex = state.currentAgentIndex
+      for action in state.getLegalActions(agentIndex) + [None]:
+        record = state.makeMove(agentIndex, action)
+        if action is not None:
+          assert state.board.hash == hashBoard(state.board)
+        state.unmakeMove(record)
+        assert snapshot(state) == before
+        checked += 1
+  assert checked > 100
+
+
+@pytest.mark.parametrize("boardClass", BOARD_CLASSES)
+@pytest.mark.parametrize("decodedClass", BOARD_CLASSES)
+def testBytesRoundTrip(boardClass, decodedClass):
+  for seed in range(3):
+    for state in playGame(boardClass, seed):
+      data = state.toBytes()
+      decoded = GameState.fromBytes(data, decodedClass, seed=1)
+      assert isinstance(decoded.board, decodedClass)
+      assert decoded.getHash() == state.getHash()
+      assert decoded.board.hash == hashBoard(decoded.board)
+      assert legalActions(decoded) == legalActions(state)
+      assert decoded.toBytes() == data
+
+
+def testFromBytesRejectsUnknownVersion():
+  data = GameState(seed=1).toBytes()
+  with pytest.raises(Exception, match="unknown state version"):
+    GameState.fromBytes(bytes([STATE_VERSION + 1]) + data[1:])